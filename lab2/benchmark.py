@@ -0,0 +1,142 @@
+"""Замер производительности ImageInfoWorker на наборе из make_corpus.py.
+
+Каждая конфигурация запускается в отдельном процессе, чтобы пиковое потребление
+памяти не смешивалось между запусками. Первый проход по набору прогревает
+файловый кеш ОС; для холодных замеров кеш нужно сбрасывать вручную.
+
+    python make_corpus.py corpus --count 2000
+    python benchmark.py corpus --repeat 3 --output bench.json
+    python benchmark.py corpus --config processes-1 --config processes-2 --config processes-4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CONFIGS = {
+    "threads-1": {"max_workers": 1},
+    "threads-4": {"max_workers": 4},
+    "threads-4-pil": {"max_workers": 4, "fast_headers": False},
+    "threads-8": {"max_workers": 8},
+    "threads-4-phash": {"max_workers": 4, "compute_phash": True},
+    "threads-4-duplicates": {"max_workers": 4, "find_duplicates": True},
+    # Масштабирование по процессам (ShardedScanWorker), по 4 потока в каждом
+    "processes-1": {"max_workers": 4, "processes": 1},
+    "processes-2": {"max_workers": 4, "processes": 2},
+    "processes-4": {"max_workers": 4, "processes": 4},
+    "processes-8": {"max_workers": 4, "processes": 8},
+    # asyncio (AsyncScanWorker): число одновременных чтений на устройство
+    "async-16": {"max_workers": 4, "io_concurrency": 16, "device_concurrency": 16},
+    "async-64": {"max_workers": 4, "io_concurrency": 64, "device_concurrency": 64},
+    "async-256": {"max_workers": 4, "io_concurrency": 256, "device_concurrency": 256},
+}
+
+
+def peak_rss_mb(who=None):
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # Linux сообщает килобайты, macOS - байты
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_config(corpus, options, trace_memory=False):
+    """Один прогон сканирования в текущем процессе; результаты собираются в ImageInfoStore"""
+    from PySide6.QtCore import QCoreApplication
+    from lab2 import AsyncScanWorker, ImageInfoStore, ImageInfoWorker, ShardedScanWorker
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    store = ImageInfoStore()
+    if "processes" in options:
+        worker_class = ShardedScanWorker
+    elif "io_concurrency" in options:
+        worker_class = AsyncScanWorker
+    else:
+        worker_class = ImageInfoWorker
+    worker = worker_class(corpus, **options)
+    worker.file_processed.connect(lambda filepath, info: store.append(info))
+
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    worker.run()  # синхронно в этом потоке
+    elapsed = time.perf_counter() - started
+    traced_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    if trace_memory:
+        tracemalloc.stop()
+
+    metrics = worker.metrics.summary()
+    return {
+        "options": options,
+        "files": len(store),
+        "errors": store.error_count(),
+        "seconds": elapsed,
+        "files_per_second": len(store) / elapsed if elapsed else 0.0,
+        "bytes_per_second": metrics["bytes_per_second"],
+        "utilization": metrics["utilization"],
+        "phases_seconds": metrics["phases_seconds"],
+        "peak_rss_mb": peak_rss_mb(),
+        # Для процессов-шардов - пик самого крупного из них
+        "shard_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource and "processes" in options else None,
+        "python_peak_mb": traced_peak / (1024 * 1024) if traced_peak is not None else None,
+        "latency": {name: stages.get("total") for name, stages in metrics["latency"].items()},
+    }
+
+
+def run_isolated(corpus, name, trace_memory):
+    command = [sys.executable, os.path.abspath(__file__), corpus, "--run-one", name]
+    if trace_memory:
+        command.append("--trace-memory")
+    completed = subprocess.run(command, capture_output=True, text=True, check=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сканера lab2")
+    parser.add_argument("corpus", help="папка с набором изображений")
+    parser.add_argument("--config", action="append", choices=sorted(CONFIGS),
+                        help="конфигурация (можно несколько; по умолчанию все)")
+    parser.add_argument("--repeat", type=int, default=1, help="повторов каждой конфигурации")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="дополнительно измерять пик памяти Python через tracemalloc (медленнее)")
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        print(json.dumps(run_config(args.corpus, CONFIGS[args.run_one], args.trace_memory)))
+        return
+
+    names = args.config or list(CONFIGS)
+    results = {}
+    print(f"{'конфигурация':<24}{'файлов':>8}{'с':>9}{'файлов/с':>11}{'МБ/с':>9}{'загрузка':>10}"
+          f"{'RSS, МБ':>10}{'ускорение':>11}")
+    baseline = None
+    for name in names:
+        runs = [run_isolated(args.corpus, name, args.trace_memory) for _ in range(args.repeat)]
+        best = min(runs, key=lambda run: run["seconds"])
+        results[name] = {"best": best, "runs": runs}
+        rss = f"{best['peak_rss_mb']:.0f}" if best["peak_rss_mb"] is not None else "-"
+        # Ускорение относительно первой выбранной конфигурации
+        baseline = baseline or best["seconds"]
+        print(f"{name:<24}{best['files']:>8}{best['seconds']:>9.2f}{best['files_per_second']:>11.1f}"
+              f"{best['bytes_per_second'] / (1024 * 1024):>9.1f}{best['utilization'] * 100:>9.0f}%{rss:>10}"
+              f"{baseline / best['seconds']:>10.2f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
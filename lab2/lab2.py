@@ -1,55 +1,1224 @@
 import sys
 import os
+import io
+import json
 import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import shlex
+import hashlib
+import sqlite3
+import tarfile
+import zipfile
+import threading
+import queue
+import asyncio
+import multiprocessing
+import bisect
+from array import array
+from collections import OrderedDict
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
 from PySide6.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, 
-                               QHBoxLayout, QWidget, QTableWidget, 
-                               QTableWidgetItem, QPushButton, QFileDialog, 
+                               QHBoxLayout, QWidget, QTableView, 
+                               QAbstractItemView, QPushButton, QFileDialog, 
                                QLabel, QProgressBar, QLineEdit, QMessageBox,
                                QHeaderView, QTabWidget, QTextEdit, QSplitter,
-                               QGroupBox, QFrame, QRadioButton, QButtonGroup)
-from PySide6.QtCore import Qt, QThread, Signal, QTimer
-from PySide6.QtGui import QFont, QPalette, QColor, QIcon, QPainter
+                               QGroupBox, QFrame, QRadioButton, QButtonGroup,
+                               QCheckBox, QComboBox)
+from PySide6.QtCore import (Qt, QThread, Signal, QTimer, QAbstractTableModel,
+                            QModelIndex, QObject, QSize)
+from PySide6.QtGui import QFont, QPalette, QColor, QIcon, QPainter, QImage, QPixmap
+import numpy as np
 import PIL.Image
+import PIL.ImageMode
 from PIL.ExifTags import TAGS
+from PIL.TiffImagePlugin import OPEN_INFO as TIFF_OPEN_INFO, COMPRESSION_INFO as TIFF_COMPRESSION_INFO
 import PIL.ExifTags
 
+NOT_AVAILABLE = "Н/Д"
+
+
+class CodeTable:
+    """Кодирование повторяющихся строковых значений небольшими целыми числами"""
+    def __init__(self, *values):
+        self.values = [NOT_AVAILABLE]  # код 0 - значение отсутствует
+        self.codes = {}
+        self.lock = threading.Lock()
+        for value in values:
+            self.code(value)
+
+    def code(self, value):
+        if not value or value == NOT_AVAILABLE:
+            return 0
+        code = self.codes.get(value)
+        if code is None:
+            with self.lock:
+                code = self.codes.get(value)
+                if code is None:
+                    code = len(self.values)
+                    self.values.append(value)
+                    self.codes[value] = code
+        return code
+
+    def name(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+
+FORMATS = CodeTable('JPEG', 'GIF', 'TIFF', 'BMP', 'PNG', 'PCX')
+MODES = CodeTable('1', 'L', 'P', 'RGB', 'RGBA', 'CMYK', 'YCbCr', 'LAB', 'HSV')
+COMPRESSIONS = CodeTable('Без сжатия', 'JPEG сжатие', 'LZW', 'JPEG', 'Deflate', 'RLE')
+
+
+def format_size(width, height):
+    return f"{width} × {height}" if width else NOT_AVAILABLE
+
+
+def format_resolution(dpi_x, dpi_y):
+    return f"{dpi_x} × {dpi_y} dpi" if dpi_x > 0 else NOT_AVAILABLE
+
+
+def format_color_depth(bits):
+    return f"{bits} бит" if bits else NOT_AVAILABLE
+
+
 class ImageInfo:
-    def __init__(self):
-        self.filename = ""
-        self.filepath = ""
-        self.size = "Н/Д"
-        self.resolution = "Н/Д"
-        self.color_depth = "Н/Д"
-        self.compression = "Н/Д"
-        self.format = "Н/Д"
-        self.mode = "Н/Д"
-        self.extra_info = ""
+    """Метаданные одного файла; строки формируются только при отображении"""
+    __slots__ = ('filepath', 'width', 'height', 'dpi_x', 'dpi_y', 'bits',
+                 'format_code', 'mode_code', 'compression_code', 'file_size',
+                 'phash', 'error')
+
+    def __init__(self, filepath=""):
+        self.filepath = filepath
+        self.width = 0
+        self.height = 0
+        self.dpi_x = 0
+        self.dpi_y = 0
+        self.bits = 0
+        self.format_code = 0
+        self.mode_code = 0
+        self.compression_code = 0
+        self.file_size = 0
+        self.phash = 0
         self.error = ""
 
+    @property
+    def filename(self):
+        return os.path.basename(self.filepath)
+
+    @property
+    def size(self):
+        return format_size(self.width, self.height)
+
+    @property
+    def resolution(self):
+        return format_resolution(self.dpi_x, self.dpi_y)
+
+    @property
+    def color_depth(self):
+        return format_color_depth(self.bits)
+
+    @property
+    def format(self):
+        return FORMATS.name(self.format_code)
+
+    @property
+    def mode(self):
+        return MODES.name(self.mode_code)
+
+    @property
+    def compression(self):
+        return COMPRESSIONS.name(self.compression_code)
+
+
+class ImageInfoStore:
+    """Колоночное хранилище результатов сканирования с типизированными столбцами"""
+    COLUMNS = (
+        ('width', 'I'), ('height', 'I'), ('dpi_x', 'I'), ('dpi_y', 'I'),
+        ('bits', 'B'), ('format_code', 'H'), ('mode_code', 'H'),
+        ('compression_code', 'H'), ('file_size', 'Q'), ('phash', 'Q'),
+    )
+
+    def __init__(self):
+        self.filepaths = []
+        self.errors = {}
+        self.removed = set()  # удаленные строки не переиспользуются, номера строк стабильны
+        self.format_totals = {}
+        self.version = 0
+        self.columns = {name: array(typecode) for name, typecode in self.COLUMNS}
+
+    def __len__(self):
+        return len(self.filepaths)
+
+    def live_count(self):
+        return len(self.filepaths) - len(self.removed)
+
+    def live_rows(self):
+        if not self.removed:
+            return list(range(len(self.filepaths)))
+        return [row for row in range(len(self.filepaths)) if row not in self.removed]
+
+    def count_format(self, code, delta):
+        self.format_totals[code] = self.format_totals.get(code, 0) + delta
+
+    def append(self, info):
+        row = len(self.filepaths)
+        self.filepaths.append(info.filepath)
+        for name, column in self.columns.items():
+            column.append(getattr(info, name))
+        if info.error:
+            self.errors[row] = info.error
+        self.count_format(info.format_code, 1)
+        self.version += 1
+        return row
+
+    def update(self, row, info):
+        """Перезапись строки новыми метаданными того же файла"""
+        self.count_format(self.columns['format_code'][row], -1)
+        for name, column in self.columns.items():
+            column[row] = getattr(info, name)
+        self.errors.pop(row, None)
+        if info.error:
+            self.errors[row] = info.error
+        self.count_format(info.format_code, 1)
+        self.version += 1
+
+    def remove(self, row):
+        if row in self.removed:
+            return
+        self.removed.add(row)
+        self.errors.pop(row, None)
+        self.count_format(self.columns['format_code'][row], -1)
+        self.version += 1
+
+    def record(self, row):
+        info = ImageInfo(self.filepaths[row])
+        for name, column in self.columns.items():
+            setattr(info, name, column[row])
+        info.error = self.errors.get(row, "")
+        return info
+
+    def filename(self, row):
+        return os.path.basename(self.filepaths[row])
+
+    def sort_key(self, column):
+        """Ключ сортировки строк для столбца таблицы"""
+        c = self.columns
+        if column == 0:
+            return lambda row: os.path.basename(self.filepaths[row]).lower()
+        if column == 1:
+            width, height = c['width'], c['height']
+            return lambda row: (width[row] * height[row], width[row])
+        if column == 2:
+            return c['dpi_x'].__getitem__
+        if column == 3:
+            return c['bits'].__getitem__
+        if column == 4:
+            codes = c['compression_code']
+            return lambda row: COMPRESSIONS.name(codes[row])
+        if column == 5:
+            codes = c['format_code']
+            return lambda row: FORMATS.name(codes[row])
+        if column == 6:
+            codes = c['mode_code']
+            return lambda row: MODES.name(codes[row])
+        return lambda row: self.errors.get(row, "")
+
+    def sorted_rows(self, column, reverse=False, rows=None):
+        if rows is None:
+            rows = self.live_rows()
+        return sorted(rows, key=self.sort_key(column), reverse=reverse)
+
+    def filter_rows(self, predicate, rows=None):
+        """Отбор строк по условию над записью: predicate(store, row)"""
+        if rows is None:
+            rows = self.live_rows()
+        return [row for row in rows if predicate(self, row)]
+
+    def format_counts(self):
+        # Счетчики ведутся при добавлении/изменении/удалении строк
+        return {FORMATS.name(code): count for code, count in self.format_totals.items() if count}
+
+    def error_count(self):
+        return len(self.errors)
+
+
+class QueryError(ValueError):
+    pass
+
+
+class ScanIndex:
+    """Неизменяемый снимок хранилища с индексами для фильтрации и сортировки.
+
+    Для столбцов-кодов (формат, сжатие, режим) заранее построены битовые маски
+    (np.packbits) по каждому значению, для числовых - перестановка сортировки,
+    по которой диапазон находится двоичным поиском.
+    """
+    NUMERIC_FIELDS = {
+        'width': 'width', 'height': 'height', 'dpi': 'dpi_x',
+        'bits': 'bits', 'filesize': 'file_size',
+    }
+    CODE_FIELDS = {
+        'format': ('format_code', FORMATS),
+        'compression': ('compression_code', COMPRESSIONS),
+        'mode': ('mode_code', MODES),
+    }
+    OPERATORS = ('>=', '<=', '!=', '=', '>', '<', '~')
+
+    def __init__(self, store):
+        self.store = store
+        self.size = len(store)
+        self.version = store.version
+        self.columns = {name: np.array(column) for name, column in store.columns.items()}
+        self.sorted_orders = {}
+        self.sorted_values = {}
+        for field, column in self.NUMERIC_FIELDS.items():
+            values = self.columns[column]
+            order = np.argsort(values, kind='stable')
+            self.sorted_orders[field] = order
+            self.sorted_values[field] = values[order]
+        self.bitmaps = {}
+        for field, (column, table) in self.CODE_FIELDS.items():
+            codes = self.columns[column]
+            self.bitmaps[field] = {
+                int(code): np.packbits(codes == code) for code in np.unique(codes)
+            }
+        error_mask = np.zeros(self.size, dtype=bool)
+        error_mask[list(store.errors)] = True
+        self.error_bitmap = np.packbits(error_mask)
+        live_mask = np.ones(self.size, dtype=bool)
+        live_mask[list(store.removed)] = False
+        self.live_bitmap = np.packbits(live_mask)
+        self.name_ranks = None
+
+    def empty(self):
+        return np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def full(self):
+        return self.live_bitmap.copy()
+
+    def rows_from_bitmap(self, bitmap):
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.size))
+
+    def numeric_bitmap(self, field, operator, value):
+        values = self.sorted_values[field]
+        order = self.sorted_orders[field]
+        left = np.searchsorted(values, value, 'left')
+        right = np.searchsorted(values, value, 'right')
+        ranges = {
+            '=': [(left, right)], '!=': [(0, left), (right, self.size)],
+            '>': [(right, self.size)], '>=': [(left, self.size)],
+            '<': [(0, left)], '<=': [(0, right)],
+        }
+        if operator not in ranges:
+            raise QueryError(f"Оператор '{operator}' не применим к полю {field}")
+        mask = np.zeros(self.size, dtype=bool)
+        for start, stop in ranges[operator]:
+            mask[order[start:stop]] = True
+        return np.packbits(mask)
+
+    def code_bitmap(self, field, operator, value):
+        column, table = self.CODE_FIELDS[field]
+        wanted = {name.strip().lower() for name in value.split(',')}
+        if operator == '~':
+            codes = [code for code, name in enumerate(table.values)
+                     if any(part in name.lower() for part in wanted)]
+        elif operator in ('=', '!='):
+            codes = [code for code, name in enumerate(table.values) if name.lower() in wanted]
+        else:
+            raise QueryError(f"Оператор '{operator}' не применим к полю {field}")
+        bitmap = self.empty()
+        for code in codes:
+            code_bitmap = self.bitmaps[field].get(code)
+            if code_bitmap is not None:
+                bitmap |= code_bitmap
+        return ~bitmap & self.full() if operator == '!=' else bitmap
+
+    def status_bitmap(self, operator, value):
+        if operator not in ('=', '!='):
+            raise QueryError(f"Оператор '{operator}' не применим к полю status")
+        value = value.lower()
+        if value in ('error', 'ошибка'):
+            bitmap = self.error_bitmap
+        elif value in ('ok', 'успешно'):
+            bitmap = ~self.error_bitmap & self.full()
+        else:
+            raise QueryError(f"Неизвестное значение статуса: {value}")
+        return ~bitmap & self.full() if operator == '!=' else bitmap
+
+    def name_bitmap(self, operator, value):
+        # Подстрока в имени не индексируется - единственное условие с полным проходом
+        if operator not in ('~', '='):
+            raise QueryError(f"Оператор '{operator}' не применим к полю name")
+        value = value.lower()
+        names = (os.path.basename(path).lower() for path in self.store.filepaths[:self.size])
+        if operator == '~':
+            mask = np.fromiter((value in name for name in names), dtype=bool, count=self.size)
+        else:
+            mask = np.fromiter((value == name for name in names), dtype=bool, count=self.size)
+        return np.packbits(mask)
+
+    @classmethod
+    def parse_condition(cls, token):
+        for operator in cls.OPERATORS:
+            field, found, value = token.partition(operator)
+            if found and field:
+                return field.strip().lower(), operator, value.strip()
+        raise QueryError(f"Не удалось разобрать условие: {token}")
+
+    @classmethod
+    def check_condition(cls, field, operator, value):
+        """Поле, оператор и значение условия; ошибка - QueryError, как и при выполнении запроса"""
+        if field in cls.NUMERIC_FIELDS:
+            operators = ('=', '!=', '>', '>=', '<', '<=')
+        elif field in cls.CODE_FIELDS:
+            operators = ('=', '!=', '~')
+        elif field == 'status':
+            operators = ('=', '!=')
+        elif field == 'name':
+            operators = ('~', '=')
+        else:
+            raise QueryError(f"Неизвестное поле: {field}")
+        if operator not in operators:
+            raise QueryError(f"Оператор '{operator}' не применим к полю {field}")
+        if field in cls.NUMERIC_FIELDS:
+            try:
+                int(value)
+            except ValueError:
+                raise QueryError(f"Поле {field} требует целое число, получено: {value}")
+        if field == 'status' and value.lower() not in ('error', 'ошибка', 'ok', 'успешно'):
+            raise QueryError(f"Неизвестное значение статуса: {value.lower()}")
+
+    def query(self, text):
+        """Номера строк, удовлетворяющих всем условиям вида `format=TIFF dpi>300`"""
+        try:
+            tokens = shlex.split(text)
+        except ValueError as e:
+            raise QueryError(f"Ошибка в запросе: {e}")
+        bitmap = self.full()
+        for token in tokens:
+            field, operator, value = self.parse_condition(token)
+            self.check_condition(field, operator, value)
+            if field in self.NUMERIC_FIELDS:
+                bitmap &= self.numeric_bitmap(field, operator, int(value))
+            elif field in self.CODE_FIELDS:
+                bitmap &= self.code_bitmap(field, operator, value)
+            elif field == 'status':
+                bitmap &= self.status_bitmap(operator, value)
+            else:
+                bitmap &= self.name_bitmap(operator, value)
+        return self.rows_from_bitmap(bitmap)
+
+    @classmethod
+    def row_matches(cls, store, text, row):
+        """Проверка одной строки хранилища по запросу - для строк, появившихся после снимка"""
+        try:
+            tokens = shlex.split(text)
+        except ValueError as e:
+            raise QueryError(f"Ошибка в запросе: {e}")
+        conditions = [cls.parse_condition(token) for token in tokens]
+        for condition in conditions:
+            cls.check_condition(*condition)
+        if row in store.removed:
+            return False
+        for field, operator, value in conditions:
+            if field in cls.NUMERIC_FIELDS:
+                number = store.columns[cls.NUMERIC_FIELDS[field]][row]
+                value = int(value)
+                matched = {'=': number == value, '!=': number != value, '>': number > value,
+                           '>=': number >= value, '<': number < value, '<=': number <= value}[operator]
+            elif field in cls.CODE_FIELDS:
+                column, table = cls.CODE_FIELDS[field]
+                name = table.name(store.columns[column][row]).lower()
+                wanted = {part.strip().lower() for part in value.split(',')}
+                if operator == '~':
+                    matched = any(part in name for part in wanted)
+                else:
+                    matched = (name in wanted) == (operator == '=')
+            elif field == 'status':
+                failed = row in store.errors
+                matched = failed == (value.lower() in ('error', 'ошибка'))
+                if operator == '!=':
+                    matched = not matched
+            else:
+                name = os.path.basename(store.filepaths[row]).lower()
+                matched = value.lower() in name if operator == '~' else value.lower() == name
+            if not matched:
+                return False
+        return True
+
+    def sort_keys(self, column):
+        """Ключи сортировки (от младшего к старшему) для np.lexsort"""
+        c = self.columns
+        if column == 0:
+            if self.name_ranks is None:
+                names = [os.path.basename(path).lower() for path in self.store.filepaths[:self.size]]
+                self.name_ranks = np.empty(self.size, dtype=np.int64)
+                self.name_ranks[sorted(range(self.size), key=names.__getitem__)] = np.arange(self.size)
+            return (self.name_ranks,)
+        if column == 1:
+            return (c['width'], c['width'].astype(np.uint64) * c['height'])
+        if column == 2:
+            return (c['dpi_x'],)
+        if column == 3:
+            return (c['bits'],)
+        if column in (4, 5, 6):
+            field = {4: 'compression', 5: 'format', 6: 'mode'}[column]
+            name, table = self.CODE_FIELDS[field]
+            ranks = np.empty(len(table), dtype=np.int64)
+            ranks[sorted(range(len(table)), key=table.name)] = np.arange(len(table))
+            return (ranks[c[name]],)
+        return (np.unpackbits(self.error_bitmap, count=self.size),)
+
+    def sort_rows(self, rows, column, reverse=False):
+        rows = np.asarray(rows, dtype=np.int64)
+        keys = tuple(key[rows] for key in self.sort_keys(column))
+        order = np.lexsort(keys)
+        return rows[order[::-1]] if reverse else rows[order]
+
+
+ARCHIVE_SEPARATOR = '!'
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz')
+# Заголовки всех поддерживаемых форматов (включая EXIF в JPEG) помещаются в этот префикс
+ARCHIVE_HEADER_BYTES = 256 * 1024
+
+
+def is_archive(filepath):
+    return filepath.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def split_archive_path(filepath):
+    """`архив!элемент` -> (архив, элемент); для обычного файла -> (путь, None)"""
+    position = filepath.find(ARCHIVE_SEPARATOR)
+    while position >= 0:
+        archive_path = filepath[:position]
+        if is_archive(archive_path) and os.path.isfile(archive_path):
+            return archive_path, filepath[position + 1:]
+        position = filepath.find(ARCHIVE_SEPARATOR, position + 1)
+    return filepath, None
+
+
+def iter_archive_images(archive_path, suffixes):
+    """(имя, размер, поток) для изображений в архиве в порядке хранения.
+
+    TAR читается в потоковом режиме за один проход, так что .tar.gz не
+    распаковывается повторно для каждого элемента.
+    """
+    if archive_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                if not member.is_dir() and Path(member.filename).suffix.lower() in suffixes:
+                    with archive.open(member) as reader:
+                        yield member.filename, member.file_size, reader
+    else:
+        with tarfile.open(archive_path, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and Path(member.name).suffix.lower() in suffixes:
+                    yield member.name, member.size, archive.extractfile(member)
+
+
+def open_image_source(filepath):
+    """Путь для PIL.Image.open; элемент архива читается в память целиком"""
+    archive_path, member = split_archive_path(filepath)
+    if member is None:
+        return filepath
+    if archive_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as archive:
+            return io.BytesIO(archive.read(member))
+    with tarfile.open(archive_path) as archive:
+        return io.BytesIO(archive.extractfile(member).read())
+
+
+# Префикс файла, из которого разбираются заголовки; остальное дочитывается по требованию
+HEADER_PREFIX_BYTES = 16 * 1024
+# Палитра-градиент серого: PIL открывает такие GIF/PCX в режиме L, а не P
+GRAY_RAMP = bytes(value for value in range(256) for _ in range(3))
+
+
+def read_at(fd, length, offset):
+    if hasattr(os, 'pread'):
+        return os.pread(fd, length, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, length)
+
+
+def read_prefix(filepath, length):
+    """(размер файла, первые length байт) - один open, fstat и pread"""
+    fd = os.open(filepath, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        return os.fstat(fd).st_size, read_at(fd, length, 0)
+    finally:
+        os.close(fd)
+
+
+class ParsedHeader:
+    """Поля заголовка в том же виде, что у открытого PIL-изображения (format, size, mode, info)"""
+    __slots__ = ('format', 'width', 'height', 'mode', 'info', 'bits')
+
+    def __init__(self, format, width, height, mode, info):
+        self.format = format
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.info = info
+
+    def getbands(self):
+        return PIL.ImageMode.getmode(self.mode).bands
+
+
+class HeaderSource:
+    """Префикс файла (memoryview) и доступ к байтам за его пределами через pread"""
+    __slots__ = ('prefix', 'size', 'fd')
+
+    def __init__(self, prefix, size, fd=None):
+        self.prefix = prefix
+        self.size = size
+        self.fd = fd
+
+    def slice(self, offset, length):
+        """memoryview на байты [offset, offset + length) или None, если их нет"""
+        end = offset + length
+        if offset < 0 or end > self.size:
+            return None
+        if end <= len(self.prefix):
+            return self.prefix[offset:end]
+        if self.fd is None:
+            return None
+        data = read_at(self.fd, length, offset)
+        return memoryview(data) if len(data) == length else None
+
+
+def parse_png(source):
+    head = source.slice(0, 33)
+    if head is None or head[12:16] != b'IHDR':
+        return None
+    width, height, bit_depth, color_type, _, filter_method = struct.unpack_from('>IIBBBB', head, 16)
+    mode = PNG_MODES.get((bit_depth, color_type))
+    if mode is None or filter_method:
+        return None
+    info = {}
+    offset = 33
+    while True:
+        chunk = source.slice(offset, 8)
+        if chunk is None:
+            return None
+        length, kind = struct.unpack_from('>I4s', chunk)
+        if kind in (b'IDAT', b'IEND'):
+            break
+        if kind == b'pHYs':
+            data = source.slice(offset + 8, 9)
+            if data is None:
+                return None
+            px, py, unit = struct.unpack_from('>IIB', data)
+            if unit == 1:
+                info['dpi'] = (px * 0.0254, py * 0.0254)
+        offset += length + 12
+    return ParsedHeader('PNG', width, height, mode, info)
+
+
+def parse_jpeg(source):
+    info = {}
+    size = None
+    has_exif = False
+    offset = 2
+    while True:
+        marker = source.slice(offset, 4)
+        if marker is None or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        if code == 0xFF:
+            offset += 1
+            continue
+        if code == 0xDA:
+            break
+        length = (marker[2] << 8) | marker[3]
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            frame = source.slice(offset + 4, 6)
+            if frame is None:
+                return None
+            precision, height, width, layers = struct.unpack_from('>BHHB', frame)
+            if precision != 8 or layers not in JPEG_MODES:
+                return None
+            size = width, height, JPEG_MODES[layers]
+        elif code == 0xE0 and 'dpi' not in info:
+            app = source.slice(offset + 4, min(length - 2, 12))
+            if app is not None and app[:4] == b'JFIF' and len(app) >= 12:
+                unit, density_x, density_y = struct.unpack_from('>BHH', app, 7)
+                if unit == 1:
+                    info['dpi'] = (density_x, density_y)
+                elif unit == 2:
+                    info['dpi'] = (density_x * 2.54, density_y * 2.54)
+        elif code == 0xE1:
+            app = source.slice(offset + 4, 6)
+            has_exif = has_exif or (app is not None and app == b'Exif\0\0')
+        elif code == 0xE2:
+            app = source.slice(offset + 4, 4)
+            if app is None or app == b'MPF\0':
+                # Возможно, это MPO - формат определит PIL
+                return None
+        offset += 2 + length
+    # Без JFIF-плотности PIL берет разрешение из EXIF
+    if size is None or ('dpi' not in info and has_exif):
+        return None
+    header = ParsedHeader('JPEG', size[0], size[1], size[2], info)
+    header.bits = 8
+    return header
+
+
+def parse_gif(source):
+    head = source.slice(0, 13)
+    if head is None:
+        return None
+    width, height, flags = struct.unpack_from('<HHB', head, 6)
+    if not flags & 0x80:
+        return None
+    palette = source.slice(13, 3 << ((flags & 7) + 1))
+    if palette is None or palette == GRAY_RAMP[:len(palette)]:
+        return None
+    return ParsedHeader('GIF', width, height, 'P', {})
+
+
+def parse_bmp(source):
+    head = source.slice(0, 54)
+    if head is None:
+        return None
+    header_size, width, height, planes, bits, compression, _, ppm_x, ppm_y = \
+        struct.unpack_from('<IiiHHIIII', head, 14)
+    if header_size not in (40, 52, 56, 64, 108, 124) or compression != 0 or bits not in (24, 32):
+        return None
+    info = {'dpi': (ppm_x / 39.3701, ppm_y / 39.3701), 'compression': compression}
+    return ParsedHeader('BMP', width, abs(height), 'RGB', info)
+
+
+def parse_pcx(source):
+    head = source.slice(0, 128)
+    if head is None or head[1] not in (0, 2, 3, 5):
+        return None
+    version, bits, planes = head[1], head[3], head[65]
+    xmin, ymin, xmax, ymax, dpi_x, dpi_y = struct.unpack_from('<6H', head, 4)
+    if xmax < xmin or ymax < ymin:
+        return None
+    if bits == 1 and planes == 1:
+        mode = '1'
+    elif version == 5 and bits == 8 and planes == 3:
+        mode = 'RGB'
+    elif version == 5 and bits == 8 and planes == 1:
+        # Палитра хранится в конце файла
+        palette = source.slice(source.size - 769, 769)
+        if palette is None and source.fd is None:
+            return None
+        mode = 'L'
+        if palette is not None and palette[0] == 12 and palette[1:] != GRAY_RAMP:
+            mode = 'P'
+    else:
+        return None
+    return ParsedHeader('PCX', xmax - xmin + 1, ymax - ymin + 1, mode, {'dpi': (dpi_x, dpi_y)})
+
+
+def parse_tiff(source):
+    """Первый IFD; записи и значения за пределами префикса дочитываются по требованию"""
+    head = source.slice(0, 8)
+    order = {b'II': '<', b'MM': '>'}.get(bytes(head[:2])) if head is not None else None
+    if order is None or struct.unpack_from(order + 'H', head, 2)[0] != 42:
+        return None
+    ifd_offset = struct.unpack_from(order + 'I', head, 4)[0]
+    count_data = source.slice(ifd_offset, 2)
+    if count_data is None:
+        return None
+    count = struct.unpack_from(order + 'H', count_data)[0]
+    entries = source.slice(ifd_offset + 2, count * 12)
+    if entries is None:
+        return None
+
+    tags = {}
+    for index in range(count):
+        tag, kind, values, field = struct.unpack_from(order + 'HHI4s', entries, index * 12)
+        if tag not in TIFF_TAGS:
+            continue
+        if kind not in TIFF_TYPES:
+            return None
+        item_format, item_size = TIFF_TYPES[kind]
+        total = item_size * values
+        if total <= 4:
+            data = field
+        else:
+            data = source.slice(struct.unpack(order + 'I', field)[0], total)
+            if data is None:
+                return None
+        numbers = struct.unpack_from(f"{order}{values * len(item_format)}{item_format[0]}", data)
+        if kind == 5:
+            if 0 in numbers[1::2]:
+                return None
+            numbers = tuple(n / d for n, d in zip(numbers[::2], numbers[1::2]))
+        tags[tag] = numbers
+
+    compression = tags.get(259, (1,))[0]
+    photometric = tags.get(262, (0,))[0]
+    if (256 not in tags or 257 not in tags or compression not in TIFF_COMPRESSION_INFO
+            or compression in (6, 7) or photometric == 6 or tags.get(284, (1,))[0] != 1):
+        return None
+
+    sample_format = tags.get(339, (1,))
+    if len(sample_format) > 1 and max(sample_format) == min(sample_format):
+        sample_format = sample_format[:1]
+    bps = tags.get(258, (1,))
+    samples = tags.get(277, (1,))[0]
+    if samples < len(bps):
+        bps = bps[:samples]
+    elif samples > len(bps) and len(bps) == 1:
+        bps = bps * samples
+    key = (bytes(head[:2]), photometric, sample_format, tags.get(266, (1,))[0], bps, tags.get(338, ()))
+    if len(bps) != samples or key not in TIFF_OPEN_INFO:
+        return None
+
+    width, height = tags[256][0], tags[257][0]
+    if tags.get(274, (1,))[0] in (5, 6, 7, 8):
+        width, height = height, width
+    info = {'compression': TIFF_COMPRESSION_INFO[compression]}
+    xres, yres = tags.get(282, (1,))[0], tags.get(283, (1,))[0]
+    unit = tags.get(296, (None,))[0]
+    if xres and yres:
+        if unit in (2, None):
+            info['dpi'] = (xres, yres)
+        elif unit == 3:
+            info['dpi'] = (xres * 2.54, yres * 2.54)
+    return ParsedHeader('TIFF', width, height, TIFF_OPEN_INFO[key][0], info)
+
+
+PNG_MODES = {
+    (1, 0): '1', (2, 0): 'L', (4, 0): 'L', (8, 0): 'L',
+    (8, 2): 'RGB', (16, 2): 'RGB',
+    (1, 3): 'P', (2, 3): 'P', (4, 3): 'P', (8, 3): 'P',
+    (8, 4): 'LA', (8, 6): 'RGBA', (16, 6): 'RGBA',
+}
+JPEG_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+# Теги TIFF, влияющие на размер, режим, сжатие и разрешение
+TIFF_TAGS = {256, 257, 258, 259, 262, 266, 274, 277, 282, 283, 284, 296, 338, 339}
+# Тип поля TIFF -> (формат struct, размер значения)
+TIFF_TYPES = {1: ('B', 1), 3: ('H', 2), 4: ('I', 4), 5: ('II', 8)}
+HEADER_PARSERS = (
+    (b'\x89PNG\r\n\x1a\n', parse_png),
+    (b'\xff\xd8\xff', parse_jpeg),
+    (b'GIF87a', parse_gif),
+    (b'GIF89a', parse_gif),
+    (b'BM', parse_bmp),
+    (b'II*\0', parse_tiff),
+    (b'MM\0*', parse_tiff),
+    (b'\x0a', parse_pcx),
+)
+
+
+def parse_header(source):
+    """ParsedHeader для распространенных вариантов форматов, иначе None (читать через PIL)"""
+    for magic, parser in HEADER_PARSERS:
+        if source.prefix[:len(magic)] == magic:
+            try:
+                return parser(source)
+            except (struct.error, ValueError, OSError):
+                return None
+    return None
+
+
+class HeaderReader:
+    """Чтение заголовков без PIL: один pread префикса в буфер, переиспользуемый потоком.
+
+    Разбор идет по срезам memoryview без копирования; форматы и варианты, которые
+    здесь не поддержаны, возвращают None, и файл открывается через PIL как раньше.
+    """
+    def __init__(self, prefix_bytes=HEADER_PREFIX_BYTES):
+        self.prefix_bytes = prefix_bytes
+        self.local = threading.local()
+
+    def buffer(self):
+        view = getattr(self.local, 'view', None)
+        if view is None:
+            view = self.local.view = memoryview(bytearray(self.prefix_bytes))
+        return view
+
+    def read(self, filepath):
+        """(размер файла, ParsedHeader или None)"""
+        view = self.buffer()
+        fd = os.open(filepath, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            file_size = os.fstat(fd).st_size
+            if hasattr(os, 'preadv'):
+                length = os.preadv(fd, [view], 0)
+            else:
+                data = os.read(fd, self.prefix_bytes)
+                length = len(data)
+                view[:length] = data
+            return file_size, parse_header(HeaderSource(view[:length], file_size, fd))
+        finally:
+            os.close(fd)
+
+
+def perceptual_hash(image):
+    """dHash: 64 бита - сравнение соседних пикселей уменьшенной до 9×8 копии.
+
+    JPEG декодируется в режиме draft (масштаб 1/2..1/8 прямо в декодере),
+    остальные форматы уменьшаются через reduce() до точной интерполяции.
+    """
+    if image.format == 'JPEG':
+        image.draft('L', (64, 64))
+    small = image.convert('L').resize((9, 8), PIL.Image.BILINEAR, reducing_gap=2.0)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class PHashIndex:
+    """Индекс перцептивных хешей для поиска похожих изображений (multi-index hashing).
+
+    Хеш делится на max_distance + 1 частей: у двух хешей на расстоянии не больше
+    max_distance хотя бы одна часть совпадает полностью. Поэтому кандидаты
+    берутся только из корзин с теми же частями, а не из всего набора.
+    """
+    def __init__(self, max_distance=4):
+        self.max_distance = max_distance
+        parts = max_distance + 1
+        bounds = [64 * i // parts for i in range(parts + 1)]
+        self.parts = [(start, (1 << (stop - start)) - 1) for start, stop in zip(bounds, bounds[1:])]
+        self.tables = [{} for _ in self.parts]
+        self.hashes = {}
+
+    @classmethod
+    def from_store(cls, store, max_distance=4):
+        index = cls(max_distance)
+        for row, value in enumerate(store.columns['phash']):
+            if row not in store.errors:
+                index.add(row, value)
+        return index
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, row, value):
+        self.hashes[row] = value
+        for table, (shift, mask) in zip(self.tables, self.parts):
+            table.setdefault((value >> shift) & mask, []).append(row)
+
+    def remove(self, row):
+        value = self.hashes.pop(row, None)
+        if value is None:
+            return
+        for table, (shift, mask) in zip(self.tables, self.parts):
+            table[(value >> shift) & mask].remove(row)
+
+    def query(self, value, max_distance=None):
+        """Список (расстояние, строка) для хешей не дальше max_distance"""
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        seen = set()
+        found = []
+        for table, (shift, mask) in zip(self.tables, self.parts):
+            for row in table.get((value >> shift) & mask, ()):
+                if row in seen:
+                    continue
+                seen.add(row)
+                distance = hamming_distance(value, self.hashes[row])
+                if distance <= max_distance:
+                    found.append((distance, row))
+        return sorted(found)
+
+    def similar(self, row, max_distance=None):
+        return [(distance, other) for distance, other in self.query(self.hashes[row], max_distance)
+                if other != row]
+
+    def groups(self, max_distance=None):
+        """Группы похожих изображений (связные компоненты по порогу расстояния)"""
+        parent = {row: row for row in self.hashes}
+
+        def find(row):
+            while parent[row] != row:
+                parent[row] = parent[parent[row]]
+                row = parent[row]
+            return row
+
+        for row in self.hashes:
+            for _, other in self.similar(row, max_distance):
+                root_a, root_b = find(row), find(other)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        components = {}
+        for row in self.hashes:
+            components.setdefault(find(row), []).append(row)
+        return [rows for rows in components.values() if len(rows) > 1]
+
+
+class DuplicateFinder:
+    """Поиск точных дубликатов: размер файла -> хеш первого и последнего блоков -> полный хеш.
+
+    Каждый следующий этап читает только файлы, совпавшие на предыдущем.
+    """
+    BLOCK_SIZE = 64 * 1024
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, executor=None, should_stop=None):
+        self.executor = executor
+        self.should_stop = should_stop or (lambda: False)
+
+    def edge_hash(self, filepath, size):
+        digest = hashlib.blake2b(digest_size=16)
+        with open(filepath, 'rb') as f:
+            digest.update(f.read(self.BLOCK_SIZE))
+            if size > self.BLOCK_SIZE:
+                f.seek(max(size - self.BLOCK_SIZE, self.BLOCK_SIZE))
+                digest.update(f.read(self.BLOCK_SIZE))
+        return digest.digest()
+
+    def full_hash(self, filepath):
+        digest = hashlib.blake2b(digest_size=32)
+        with open(filepath, 'rb') as f:
+            while not self.should_stop():
+                chunk = f.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        return digest.digest()
+
+    def map(self, function, items):
+        if self.executor is None:
+            return [function(item) for item in items]
+        return list(self.executor.map(function, items))
+
+    def refine(self, groups, hash_function):
+        """Разбиение групп-кандидатов по значению хеша; одиночки отбрасываются"""
+        candidates = [path for group in groups for path in group]
+
+        def safe_hash(path):
+            try:
+                return hash_function(path)
+            except OSError:
+                return None
+
+        hashes = dict(zip(candidates, self.map(safe_hash, candidates)))
+        refined = []
+        for group in groups:
+            by_hash = {}
+            for path in group:
+                if hashes[path] is not None:
+                    by_hash.setdefault(hashes[path], []).append(path)
+            refined.extend(paths for paths in by_hash.values() if len(paths) > 1)
+        return refined
+
+    def find(self, file_sizes):
+        """file_sizes: {путь: размер}. Возвращает список групп одинаковых файлов"""
+        by_size = {}
+        for filepath, size in file_sizes.items():
+            if size > 0:
+                by_size.setdefault(size, []).append(filepath)
+
+        duplicates = []
+        for size, paths in sorted(by_size.items()):
+            if len(paths) < 2 or self.should_stop():
+                continue
+            groups = self.refine([paths], lambda path: self.edge_hash(path, size))
+            # Файл не длиннее двух блоков уже прочитан целиком
+            if groups and size > 2 * self.BLOCK_SIZE and not self.should_stop():
+                groups = self.refine(groups, self.full_hash)
+            duplicates.extend(sorted(group) for group in groups)
+        return duplicates
+
+
+class ScanMetrics:
+    """Измерения сканирования: пропускная способность, задержки по форматам и этапам,
+    очередь задач и загрузка пула потоков. Методы вызываются из любых потоков."""
+    SAMPLE_INTERVAL = 0.5
+    LIVE_WINDOW = 10000  # перцентили в живой сводке - по последним измерениям
+
+    def __init__(self, workers, max_samples=None):
+        self.workers = workers
+        # Без ограничения хранятся все задержки; иначе - не меньше max_samples последних
+        self.max_samples = max_samples
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.latencies = {}  # (формат, этап) -> array('d') секунд
+        self.phases = {}
+        self.files = 0
+        self.bytes = 0
+        self.submitted = 0
+        self.running = 0
+        self.completed = 0
+        self.busy_time = 0.0
+        self.series = []
+        self.last_sample = (0.0, 0, 0, 0.0)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def task_submitted(self):
+        with self.lock:
+            self.submitted += 1
+
+    def task_started(self):
+        with self.lock:
+            self.running += 1
+        return time.perf_counter()
+
+    def task_finished(self, started):
+        duration = time.perf_counter() - started
+        with self.lock:
+            self.running -= 1
+            self.completed += 1
+            self.busy_time += duration
+
+    def file_done(self, format_name, size, timings):
+        with self.lock:
+            self.files += 1
+            self.bytes += size
+            for stage, seconds in timings.items():
+                key = (format_name, stage)
+                values = self.latencies.get(key)
+                if values is None:
+                    values = self.latencies[key] = array('d')
+                values.append(seconds)
+                if self.max_samples and len(values) > 2 * self.max_samples:
+                    del values[:-self.max_samples]
+
+    def phase(self, name, seconds):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def take_delta(self):
+        """Измерения, накопленные с прошлого вызова (передаются из процесса-шарда)"""
+        with self.lock:
+            delta = {
+                'files': self.files, 'bytes': self.bytes, 'submitted': self.submitted,
+                'completed': self.completed, 'busy_time': self.busy_time,
+                'latencies': {key: values.tolist() for key, values in self.latencies.items()},
+            }
+            self.files = self.bytes = self.submitted = self.completed = 0
+            self.busy_time = 0.0
+            self.latencies = {}
+        return delta
+
+    def merge(self, delta):
+        with self.lock:
+            self.files += delta['files']
+            self.bytes += delta['bytes']
+            self.submitted += delta['submitted']
+            self.completed += delta['completed']
+            self.busy_time += delta['busy_time']
+            for key, values in delta['latencies'].items():
+                self.latencies.setdefault(key, array('d')).extend(values)
+
+    def sample(self):
+        """Точка временного ряда и живая сводка"""
+        with self.lock:
+            now = self.elapsed()
+            last_time, last_files, last_bytes, last_busy = self.last_sample
+            interval = max(now - last_time, 1e-9)
+            point = {
+                'time': round(now, 3),
+                'files_per_second': (self.files - last_files) / interval,
+                'bytes_per_second': (self.bytes - last_bytes) / interval,
+                'queue_depth': self.submitted - self.running - self.completed,
+                'utilization': min((self.busy_time - last_busy) / (interval * self.workers), 1.0),
+            }
+            self.series.append(point)
+            self.last_sample = (now, self.files, self.bytes, self.busy_time)
+        summary = self.summary(self.LIVE_WINDOW)
+        summary['current'] = point
+        return summary
+
+    @staticmethod
+    def latency_stats(values):
+        data = np.array(values) * 1000
+        p50, p95, p99 = np.percentile(data, [50, 95, 99])
+        return {'count': len(values), 'mean_ms': float(data.mean()),
+                'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+    def summary(self, window=None):
+        with self.lock:
+            elapsed = max(self.elapsed(), 1e-9)
+            latencies = {key: values[-window:] if window else values[:]
+                         for key, values in self.latencies.items()}
+            result = {
+                'elapsed_seconds': elapsed,
+                'workers': self.workers,
+                'files': self.files,
+                'bytes': self.bytes,
+                'files_per_second': self.files / elapsed,
+                'bytes_per_second': self.bytes / elapsed,
+                'utilization': min(self.busy_time / (elapsed * self.workers), 1.0),
+                'queue_depth': self.submitted - self.running - self.completed,
+                'phases_seconds': dict(self.phases),
+                'series': list(self.series),
+            }
+        by_format = {}
+        for (format_name, stage), values in sorted(latencies.items()):
+            if values:
+                by_format.setdefault(format_name, {})[stage] = self.latency_stats(values)
+        result['latency'] = by_format
+        return result
+
+    def dump(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+
+
 class ImageInfoWorker(QThread):
     progress = Signal(int)
     file_processed = Signal(str, ImageInfo)
+    stage_changed = Signal(str)
+    # Группы одинаковых файлов и размер файла в каждой группе (известен по этапу сравнения размеров)
+    duplicates_found = Signal(list, list)
+    # Индекс перцептивных хешей (строки - в порядке file_processed) и группы похожих строк
+    similar_found = Signal(object, list)
+    metrics_updated = Signal(dict)
     finished = Signal()
     
-    def __init__(self, folder_path, single_file_mode=False, single_file_path=""):
+    def __init__(self, folder_path, single_file_mode=False, single_file_path="",
+                 find_duplicates=False, compute_phash=False, max_workers=4,
+                 metrics_path=None, fast_headers=True):
         super().__init__()
         self.folder_path = folder_path
         self.single_file_mode = single_file_mode
         self.single_file_path = single_file_path
+        self.find_duplicates = find_duplicates
+        self.compute_phash = compute_phash
+        self.max_workers = max_workers
+        self.metrics_path = metrics_path
+        self.fast_headers = fast_headers
+        # Перцептивному хешу нужны пиксели, поэтому с ним файлы всегда открывает PIL
+        self.header_reader = HeaderReader() if fast_headers and not compute_phash else None
+        self.metrics = ScanMetrics(max_workers)
         self.image_files = []
+        self.archive_files = []
+        self.file_sizes = {}
+        # Строка хранилища в интерфейсе - порядковый номер результата в file_processed
+        self.phash_index = PHashIndex() if compute_phash else None
+        self.emitted = 0
         self.stop_requested = False
         
     def get_supported_formats(self):
         return {'.jpg', '.jpeg', '.gif', '.tif', '.tiff', '.bmp', '.png', '.pcx'}
     
     def find_image_files(self):
+        """Список изображений; найденные архивы складываются в self.archive_files"""
+        self.archive_files = []
         if self.single_file_mode:
-            if os.path.exists(self.single_file_path):
-                return [self.single_file_path]
-            else:
+            if not os.path.exists(self.single_file_path):
                 return []
+            if is_archive(self.single_file_path):
+                self.archive_files.append(self.single_file_path)
+                return []
+            return [self.single_file_path]
                 
         if not os.path.exists(self.folder_path):
             return []
@@ -59,6 +1228,8 @@ class ImageInfoWorker(QThread):
             for file in files:
                 if Path(file).suffix.lower() in self.get_supported_formats():
                     image_files.append(os.path.join(root, file))
+                elif is_archive(file):
+                    self.archive_files.append(os.path.join(root, file))
                 if len(image_files) >= 100000:
                     break
             if len(image_files) >= 100000:
@@ -69,10 +1240,10 @@ class ImageInfoWorker(QThread):
         try:
             dpi = image.info.get('dpi', (72, 72))
             if dpi and dpi[0] > 0:
-                return f"{dpi[0]} × {dpi[1]} dpi"
+                return int(round(dpi[0])), int(round(dpi[1]))
         except:
             pass
-        return "Н/Д"
+        return 0, 0
     
     def get_compression_info(self, image, format):
         try:
@@ -85,7 +1256,17 @@ class ImageInfoWorker(QThread):
                     5: 'LZW',
                     6: 'JPEG',
                     7: 'JPEG',
-                    8: 'Deflate'
+                    8: 'Deflate',
+                    # Pillow сообщает сжатие TIFF по имени кодека
+                    'raw': 'Без сжатия',
+                    'tiff_lzw': 'LZW',
+                    'jpeg': 'JPEG',
+                    'tiff_jpeg': 'JPEG',
+                    'tiff_adobe_deflate': 'Deflate',
+                    'tiff_deflate': 'Deflate',
+                    'packbits': 'PackBits',
+                    'group3': 'CCITT G3',
+                    'group4': 'CCITT G4'
                 }
                 return compression_names.get(compression, f'Неизвестно ({compression})')
             elif format.upper() == 'PNG':
@@ -103,18 +1284,18 @@ class ImageInfoWorker(QThread):
     def get_color_depth(self, image):
         try:
             if hasattr(image, 'bits'):
-                return f"{image.bits} бит"
+                return image.bits
             else:
                 mode_bits = {
                     '1': 1, 'L': 8, 'P': 8, 'RGB': 24, 'RGBA': 32,
                     'CMYK': 32, 'YCbCr': 24, 'LAB': 24, 'HSV': 24
                 }
-                bits = mode_bits.get(image.mode, len(image.getbands()) * 8)
-                return f"{bits} бит"
+                return mode_bits.get(image.mode, len(image.getbands()) * 8)
         except:
-            return "Н/Д"
+            return 0
     
-    def get_extra_info(self, image, format):
+    @staticmethod
+    def get_extra_info(image, format):
         extra_info = []
         
         try:
@@ -150,91 +1331,1197 @@ class ImageInfoWorker(QThread):
         
         return "\n".join(extra_info) if extra_info else "Дополнительная информация отсутствует"
     
+    def fill_image_info(self, info, img, timings):
+        # Основная информация; EXIF читается только по запросу (read_extra_info)
+        started = time.perf_counter()
+        info.width, info.height = img.width, img.height
+        info.dpi_x, info.dpi_y = self.get_resolution_dpi(img)
+        info.bits = self.get_color_depth(img)
+        info.format_code = FORMATS.code(img.format)
+        info.mode_code = MODES.code(img.mode)
+        info.compression_code = COMPRESSIONS.code(
+            self.get_compression_info(img, img.format))
+        timings['header'] = time.perf_counter() - started
+        if self.compute_phash:
+            started = time.perf_counter()
+            info.phash = perceptual_hash(img)
+            timings['phash'] = time.perf_counter() - started
+    
+    def file_done(self, info, started, timings):
+        timings['total'] = time.perf_counter() - started
+        format_name = info.format if not info.error else "Ошибка"
+        self.metrics.file_done(format_name, info.file_size, timings)
+    
     def get_image_info(self, filepath):
-        info = ImageInfo()
-        info.filepath = filepath
-        info.filename = os.path.basename(filepath)
+        info = ImageInfo(filepath)
+        started = time.perf_counter()
+        timings = {}
         
         try:
-            with PIL.Image.open(filepath) as img:
-                # Основная информация
-                info.size = f"{img.width} × {img.height}"
-                info.resolution = self.get_resolution_dpi(img)
-                info.color_depth = self.get_color_depth(img)
-                info.format = img.format
-                info.mode = img.mode
-                info.compression = self.get_compression_info(img, img.format)
-                info.extra_info = self.get_extra_info(img, img.format)
+            header = None
+            if self.header_reader is not None:
+                info.file_size, header = self.header_reader.read(filepath)
+            if header is not None:
+                timings['open'] = time.perf_counter() - started
+                self.fill_image_info(info, header, timings)
+            else:
+                info.file_size = os.path.getsize(filepath)
+                with PIL.Image.open(filepath) as img:
+                    timings['open'] = time.perf_counter() - started
+                    self.fill_image_info(info, img, timings)
                 
         except Exception as e:
             info.error = f"Ошибка: {str(e)}"
         
+        self.file_done(info, started, timings)
         return info
     
+    def emit_info(self, filepath, info):
+        if self.phash_index is not None and not info.error:
+            self.phash_index.add(self.emitted, info.phash)
+        self.emitted += 1
+        self.file_processed.emit(filepath, info)
+    
+    def run_task(self, function, *args):
+        """Задача пула с учетом времени работы потока"""
+        started = self.metrics.task_started()
+        try:
+            return function(*args)
+        finally:
+            self.metrics.task_finished(started)
+    
+    def submit(self, executor, function, *args):
+        self.metrics.task_submitted()
+        return executor.submit(self.run_task, function, *args)
+    
+    def get_archive_infos(self, archive_path):
+        """Метаданные изображений внутри ZIP/TAR без распаковки на диск.
+
+        Из потока каждого элемента читается только префикс с заголовком; элемент
+        дочитывается целиком, лишь если заголовок не поместился в префикс или
+        нужен перцептивный хеш (он требует декодирования пикселей).
+        """
+        infos = []
+        try:
+            members = iter_archive_images(archive_path, self.get_supported_formats())
+            for member_name, member_size, reader in members:
+                if self.stop_requested:
+                    break
+                info = ImageInfo(f"{archive_path}{ARCHIVE_SEPARATOR}{member_name}")
+                info.file_size = member_size
+                started = time.perf_counter()
+                timings = {}
+                try:
+                    data = reader.read() if self.compute_phash else reader.read(ARCHIVE_HEADER_BYTES)
+                    header = None
+                    if self.header_reader is not None:
+                        header = parse_header(HeaderSource(memoryview(data), member_size))
+                    if header is not None:
+                        timings['open'] = time.perf_counter() - started
+                        self.fill_image_info(info, header, timings)
+                    else:
+                        try:
+                            img = PIL.Image.open(io.BytesIO(data))
+                        except (OSError, SyntaxError):
+                            if len(data) >= member_size:
+                                raise
+                            data += reader.read()
+                            img = PIL.Image.open(io.BytesIO(data))
+                        timings['open'] = time.perf_counter() - started
+                        with img:
+                            self.fill_image_info(info, img, timings)
+                except Exception as e:
+                    info.error = f"Ошибка: {str(e)}"
+                self.file_done(info, started, timings)
+                infos.append(info)
+        except Exception as e:
+            info = ImageInfo(archive_path)
+            info.error = f"Ошибка чтения архива: {str(e)}"
+            infos.append(info)
+        return infos
+    
+    def publish_metrics(self, final=False):
+        metrics = self.metrics.sample()
+        if final and self.metrics_path:
+            try:
+                self.metrics.dump(self.metrics_path)
+                metrics['report_path'] = self.metrics_path
+            except OSError as e:
+                metrics['report_error'] = str(e)
+        self.metrics_updated.emit(metrics)
+    
     def run(self):
+        self.metrics = ScanMetrics(self.max_workers)
+        started = time.perf_counter()
         self.image_files = self.find_image_files()
-        total_files = len(self.image_files)
+        self.metrics.phase('walk', time.perf_counter() - started)
+        total_files = len(self.image_files) + len(self.archive_files)
         
         if total_files == 0:
             self.finished.emit()
             return
         
-        if self.single_file_mode and total_files == 1:
+        if self.single_file_mode and len(self.image_files) == 1:
             try:
                 info = self.get_image_info(self.image_files[0])
-                self.file_processed.emit(self.image_files[0], info)
+                self.emit_info(self.image_files[0], info)
                 self.progress.emit(100)
             except Exception as e:
-                info = ImageInfo()
-                info.filepath = self.image_files[0]
-                info.filename = os.path.basename(self.image_files[0])
+                info = ImageInfo(self.image_files[0])
                 info.error = f"Ошибка обработки: {str(e)}"
-                self.file_processed.emit(self.image_files[0], info)
+                self.emit_info(self.image_files[0], info)
         else:
-            with ThreadPoolExecutor(max_workers=4) as executor:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
                 futures = []
                 for i, filepath in enumerate(self.image_files):
                     if self.stop_requested:
                         break
-                    future = executor.submit(self.get_image_info, filepath)
-                    futures.append((filepath, future))
-                    
-                for i, (filepath, future) in enumerate(futures):
+                    future = self.submit(executor, self.get_image_info, filepath)
+                    futures.append((filepath, future, False))
+                # Архив обрабатывается одной задачей: элементы читаются последовательно
+                for archive_path in self.archive_files:
+                    future = self.submit(executor, self.get_archive_infos, archive_path)
+                    futures.append((archive_path, future, True))
+                
+                last_sample = time.perf_counter()
+                for i, (filepath, future, archive) in enumerate(futures):
                     if self.stop_requested:
                         break
+                    if time.perf_counter() - last_sample >= ScanMetrics.SAMPLE_INTERVAL:
+                        self.publish_metrics()
+                        last_sample = time.perf_counter()
                     try:
-                        info = future.result(timeout=10)
-                        self.file_processed.emit(filepath, info)
+                        if archive:
+                            for info in future.result():
+                                self.emit_info(info.filepath, info)
+                        else:
+                            info = future.result(timeout=10)
+                            self.file_sizes[filepath] = info.file_size
+                            self.emit_info(filepath, info)
                         progress = int((i + 1) / total_files * 100)
                         self.progress.emit(progress)
                     except Exception as e:
-                        info = ImageInfo()
-                        info.filepath = filepath
-                        info.filename = os.path.basename(filepath)
+                        info = ImageInfo(filepath)
                         info.error = f"Ошибка обработки: {str(e)}"
-                        self.file_processed.emit(filepath, info)
+                        self.emit_info(filepath, info)
+                
+                self.metrics.phase('metadata', time.perf_counter() - started)
+                
+                if self.find_duplicates and not self.stop_requested:
+                    self.find_duplicate_files(executor)
         
+        self.find_similar_images()
+        self.publish_metrics(final=True)
         self.finished.emit()
     
+    def find_duplicate_files(self, executor):
+        self.stage_changed.emit("Поиск дубликатов...")
+        started = time.perf_counter()
+        finder = DuplicateFinder(executor, lambda: self.stop_requested)
+        duplicates = finder.find(self.file_sizes)
+        self.metrics.phase('duplicates', time.perf_counter() - started)
+        if not self.stop_requested:
+            self.duplicates_found.emit(duplicates, [self.file_sizes[group[0]] for group in duplicates])
+    
+    def find_similar_images(self):
+        """Группы похожих изображений; на большом наборе это долго, поэтому не в потоке интерфейса"""
+        if self.phash_index is None or self.stop_requested:
+            return
+        self.stage_changed.emit("Поиск похожих изображений...")
+        started = time.perf_counter()
+        groups = self.phash_index.groups()
+        self.metrics.phase('similar', time.perf_counter() - started)
+        if not self.stop_requested:
+            self.similar_found.emit(self.phash_index, groups)
+    
     def stop(self):
         self.stop_requested = True
 
-class StyledTableWidget(QTableWidget):
+
+# Файлы большой папки делятся на задачи такого размера, чтобы ее могли разбирать несколько процессов
+SHARD_FILE_CHUNK = 256
+
+
+def list_shard_directory(directory, formats, with_devices=False):
+    """(изображения, архивы, подпапки) одной папки без рекурсии.
+
+    С with_devices подпапки - пары (путь, st_dev): в подпапке может быть смонтировано другое устройство.
+    """
+    files, archives, subdirs = [], [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if with_devices:
+                        try:
+                            subdirs.append((entry.path, entry.stat(follow_symlinks=False).st_dev))
+                        except OSError:
+                            continue
+                    else:
+                        subdirs.append(entry.path)
+                elif Path(entry.name).suffix.lower() in formats:
+                    files.append(entry.path)
+                elif is_archive(entry.name):
+                    archives.append(entry.path)
+    except OSError:
+        pass
+    return files, archives, subdirs
+
+
+def scan_shard(options, tasks, results, pending, idle, discovered, stop_event):
+    """Процесс-шард: обходит поддеревья из общей очереди и разбирает файлы своим пулом потоков.
+
+    Новые задачи (подпапки, части больших папок, архивы) кладутся в локальный стек.
+    Пока другие процессы простаивают, шард отдает им в общую очередь самые старые
+    задачи стека - верхние, то есть самые крупные поддеревья. pending - число
+    задач, еще не выполненных ни одним процессом; шард завершается, когда оно
+    обнуляется, а своих задач нет.
+    """
+    scanner = ImageInfoWorker("", **options)
+    formats = scanner.get_supported_formats()
+    stack = []
+    waiting = False
+    try:
+        with ThreadPoolExecutor(max_workers=scanner.max_workers) as executor:
+            while not stop_event.is_set():
+                if not stack:
+                    if not waiting:
+                        with idle.get_lock():
+                            idle.value += 1
+                        waiting = True
+                    try:
+                        stack.append(tasks.get(timeout=0.05))
+                    except queue.Empty:
+                        if pending.value == 0:
+                            break
+                        continue
+                    with idle.get_lock():
+                        idle.value -= 1
+                    waiting = False
+
+                donate = idle.value
+                while donate > 0 and len(stack) > 1 and tasks.empty():
+                    tasks.put(stack.pop(0))
+                    donate -= 1
+
+                kind, payload = stack.pop()
+                if kind == 'dir':
+                    files, archives, subdirs = list_shard_directory(payload, formats)
+                    new_tasks = [('dir', path) for path in subdirs]
+                    new_tasks += [('archive', path) for path in archives]
+                    new_tasks += [('files', files[i:i + SHARD_FILE_CHUNK])
+                                  for i in range(0, len(files), SHARD_FILE_CHUNK)]
+                    with discovered.get_lock():
+                        discovered.value += len(files) + len(archives)
+                    with pending.get_lock():
+                        pending.value += len(new_tasks) - 1
+                    stack.extend(new_tasks)
+                    continue
+
+                if kind == 'files':
+                    futures = [scanner.submit(executor, scanner.get_image_info, path) for path in payload]
+                    infos = []
+                    for path, future in zip(payload, futures):
+                        try:
+                            infos.append(future.result())
+                        except Exception as e:
+                            info = ImageInfo(path)
+                            info.error = f"Ошибка обработки: {str(e)}"
+                            infos.append(info)
+                    results.put((infos, [], len(payload), scanner.metrics.take_delta()))
+                else:
+                    archive_infos = scanner.submit(executor, scanner.get_archive_infos, payload).result()
+                    results.put(([], archive_infos, 1, scanner.metrics.take_delta()))
+                with pending.get_lock():
+                    pending.value -= 1
+    finally:
+        results.put(None)
+
+
+class ShardedScanWorker(ImageInfoWorker):
+    """Сканирование большого дерева несколькими процессами со своими пулами потоков.
+
+    Дерево делится на поддеревья динамически (scan_shard), результаты всех процессов
+    сливаются в один поток сигналов file_processed, как у ImageInfoWorker.
+    """
+    def __init__(self, folder_path, processes=None, **kwargs):
+        super().__init__(folder_path, **kwargs)
+        self.processes = processes or os.cpu_count() or 1
+        self.stop_event = None
+
+    def shard_options(self):
+        return {'compute_phash': self.compute_phash, 'max_workers': self.max_workers,
+                'fast_headers': self.fast_headers}
+
+    def run(self):
+        if self.single_file_mode:
+            super().run()
+            return
+        self.metrics = ScanMetrics(self.max_workers * self.processes)
+        if not os.path.isdir(self.folder_path):
+            self.finished.emit()
+            return
+
+        started = time.perf_counter()
+        context = multiprocessing.get_context('spawn')
+        tasks = context.Queue()
+        results = context.Queue()
+        pending = context.Value('q', 1)
+        idle = context.Value('i', 0)
+        discovered = context.Value('q', 0)
+        self.stop_event = context.Event()
+        if self.stop_requested:
+            self.stop_event.set()
+        tasks.put(('dir', self.folder_path))
+        shards = [context.Process(target=scan_shard, daemon=True,
+                                  args=(self.shard_options(), tasks, results, pending,
+                                        idle, discovered, self.stop_event))
+                  for _ in range(self.processes)]
+        for shard in shards:
+            shard.start()
+
+        running = len(shards)
+        processed = 0
+        progress = 0
+        last_sample = time.perf_counter()
+        while running:
+            if time.perf_counter() - last_sample >= ScanMetrics.SAMPLE_INTERVAL:
+                self.publish_metrics()
+                last_sample = time.perf_counter()
+            try:
+                message = results.get(timeout=0.1)
+            except queue.Empty:
+                # Задачи со стека аварийно завершенного шарда потеряны, и pending
+                # уже не обнулится: остальные шарды ждали бы новых задач вечно
+                failed = [shard.exitcode for shard in shards if shard.exitcode]
+                if failed:
+                    self.stop_event.set()
+                    info = ImageInfo(self.folder_path)
+                    info.error = (f"Процесс сканирования завершился аварийно (код {failed[0]}), "
+                                  f"часть файлов не обработана")
+                    self.emit_info(self.folder_path, info)
+                    break
+                if not any(shard.is_alive() for shard in shards):
+                    break
+                continue
+            if message is None:
+                running -= 1
+                continue
+            infos, archive_infos, done, delta = message
+            self.metrics.merge(delta)
+            if self.stop_requested:
+                continue
+            for info in infos:
+                self.file_sizes[info.filepath] = info.file_size
+                self.emit_info(info.filepath, info)
+            for info in archive_infos:
+                self.emit_info(info.filepath, info)
+            processed += done
+            value = min(int(processed / max(discovered.value, 1) * 100), 100)
+            if value > progress:
+                progress = value
+                self.progress.emit(progress)
+        # Очередь результатов вычитывается до конца: шард не завершится,
+        # пока не передаст все, что успел в нее положить
+        while any(shard.is_alive() for shard in shards):
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for shard in shards:
+            shard.join()
+        self.metrics.phase('metadata', time.perf_counter() - started)
+
+        if self.find_duplicates and not self.stop_requested:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                self.find_duplicate_files(executor)
+
+        self.find_similar_images()
+        self.publish_metrics(final=True)
+        self.finished.emit()
+
+    def stop(self):
+        super().stop()
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+
+class AsyncScanWorker(ImageInfoWorker):
+    """Сканирование на asyncio: много одновременных операций ввода-вывода при малом числе потоков разбора.
+
+    Чтение каталогов и префиксов файлов идет в пуле из io_concurrency потоков, и
+    на каждое устройство (st_dev каталога) одновременно приходится не больше
+    device_concurrency из них: медленный сетевой диск не занимает весь пул.
+    Разбор заголовков - в пуле из max_workers потоков. Цикл событий работает в потоке самого QThread, так что
+    сигналы уходят в интерфейс как у ImageInfoWorker. Полезно на сетевых и других
+    медленных дисках, где задержка каждого чтения велика.
+    """
+    def __init__(self, folder_path, io_concurrency=64, device_concurrency=16, **kwargs):
+        super().__init__(folder_path, **kwargs)
+        self.io_concurrency = io_concurrency
+        self.device_concurrency = device_concurrency
+        self.loop = None
+        self.device_limits = {}
+
+    def run(self):
+        if self.single_file_mode:
+            super().run()
+            return
+        self.metrics = ScanMetrics(self.max_workers)
+        if not os.path.isdir(self.folder_path):
+            self.finished.emit()
+            return
+
+        started = time.perf_counter()
+        asyncio.run(self.scan())
+        self.metrics.phase('metadata', time.perf_counter() - started)
+
+        if self.find_duplicates and not self.stop_requested:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                self.find_duplicate_files(executor)
+
+        self.find_similar_images()
+        self.publish_metrics(final=True)
+        self.finished.emit()
+
+    def device_semaphore(self, device):
+        semaphore = self.device_limits.get(device)
+        if semaphore is None:
+            semaphore = self.device_limits[device] = asyncio.Semaphore(self.device_concurrency)
+        return semaphore
+
+    async def io_call(self, device, function, *args):
+        async with self.device_semaphore(device):
+            return await self.loop.run_in_executor(self.io_executor, function, *args)
+
+    async def cpu_call(self, function, *args):
+        self.metrics.task_submitted()
+        return await self.loop.run_in_executor(self.cpu_executor, self.run_task, function, *args)
+
+    async def scan(self):
+        self.loop = asyncio.get_running_loop()
+        self.device_limits = {}
+        self.discovered = self.processed = self.progress_value = 0
+        # Ограничивает число файлов в работе (и префиксов в памяти), пока обход идет дальше
+        self.file_slots = asyncio.Semaphore(self.io_concurrency * 4)
+        self.file_tasks = set()
+        sampler = asyncio.create_task(self.sample_metrics())
+        with ThreadPoolExecutor(max_workers=self.io_concurrency) as self.io_executor, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as self.cpu_executor:
+            try:
+                device = os.stat(self.folder_path).st_dev
+                await self.walk(self.folder_path, device)
+                while self.file_tasks:
+                    await asyncio.gather(*list(self.file_tasks))
+            finally:
+                sampler.cancel()
+
+    async def sample_metrics(self):
+        while True:
+            await asyncio.sleep(ScanMetrics.SAMPLE_INTERVAL)
+            self.publish_metrics()
+
+    async def walk(self, directory, device):
+        """Обход каталога; подкаталоги обходятся параллельно"""
+        if self.stop_requested:
+            return
+        files, archives, subdirs = await self.io_call(
+            device, list_shard_directory, directory, self.get_supported_formats(), True)
+        self.discovered += len(files) + len(archives)
+        for filepath in files:
+            if self.stop_requested:
+                return
+            await self.file_slots.acquire()
+            self.start_task(self.process_file(filepath, device))
+        for archive_path in archives:
+            self.start_task(self.process_archive(archive_path))
+        await asyncio.gather(*(self.walk(subdir, subdir_device) for subdir, subdir_device in subdirs))
+
+    def start_task(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.file_tasks.add(task)
+        task.add_done_callback(self.file_tasks.discard)
+
+    def get_prefix_info(self, filepath, file_size, data, started):
+        """Метаданные по уже прочитанному префиксу; если его не хватило - через PIL"""
+        header = parse_header(HeaderSource(memoryview(data), file_size))
+        if header is None:
+            return self.get_image_info(filepath)
+        info = ImageInfo(filepath)
+        info.file_size = file_size
+        timings = {'open': time.perf_counter() - started}
+        self.fill_image_info(info, header, timings)
+        self.file_done(info, started, timings)
+        return info
+
+    async def process_file(self, filepath, device):
+        try:
+            if self.header_reader is not None:
+                started = time.perf_counter()
+                file_size, data = await self.io_call(device, read_prefix, filepath, HEADER_PREFIX_BYTES)
+                info = await self.cpu_call(self.get_prefix_info, filepath, file_size, data, started)
+            else:
+                info = await self.cpu_call(self.get_image_info, filepath)
+        except Exception as e:
+            info = ImageInfo(filepath)
+            info.error = f"Ошибка: {str(e)}"
+        finally:
+            self.file_slots.release()
+        if not self.stop_requested:
+            self.file_sizes[filepath] = info.file_size
+            self.emit_info(filepath, info)
+            self.file_finished()
+
+    async def process_archive(self, archive_path):
+        infos = await self.cpu_call(self.get_archive_infos, archive_path)
+        if not self.stop_requested:
+            for info in infos:
+                self.emit_info(info.filepath, info)
+            self.file_finished()
+
+    def file_finished(self):
+        self.processed += 1
+        value = min(int(self.processed / max(self.discovered, 1) * 100), 100)
+        if value > self.progress_value:
+            self.progress_value = value
+            self.progress.emit(value)
+
+
+def read_extra_info(filepath):
+    """Дополнительная информация (EXIF, палитра) читается при выборе файла"""
+    try:
+        with PIL.Image.open(open_image_source(filepath)) as img:
+            return ImageInfoWorker.get_extra_info(img, img.format)
+    except Exception as e:
+        return f"Ошибка получения доп. информации: {str(e)}"
+
+class InotifyBackend:
+    """Уведомления inotify (Linux) через ctypes: события по каждому файлу в наблюдаемых папках"""
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.watches = {}
+
+    @classmethod
+    def create(cls):
+        """Экземпляр или None, если inotify недоступен на этой системе"""
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            return cls()
+        except (OSError, AttributeError):
+            return None
+
+    def add(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch", directory)
+        self.watches[wd] = directory
+
+    def read(self, timeout):
+        """Список событий (папка, имя, маска), пришедших за timeout секунд"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                events.append((None, "", mask))
+            elif wd in self.watches:
+                events.append((self.watches[wd], name, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher(QThread):
+    """Отслеживание изменений папки после сканирования.
+
+    Метаданные перечитываются только для добавленных и измененных файлов. С inotify
+    известно, какие файлы затронуты; без него раз в POLL_INTERVAL секунд
+    сравниваются время изменения и размер файлов (stat без открытия файлов).
+    """
+    file_changed = Signal(str, ImageInfo)
+    file_removed = Signal(str)
+    backend_selected = Signal(str)
+    POLL_INTERVAL = 2.0
+    DEBOUNCE = 0.3
+
+    def __init__(self, folder_path, reader):
+        super().__init__()
+        self.folder_path = folder_path
+        self.reader = reader  # ImageInfoWorker с параметрами завершенного сканирования
+        # Отчет сканирования уже сохранен; при наблюдении задержки копятся бесконечно,
+        # поэтому у него свои измерения с ограниченным числом последних значений
+        reader.metrics = ScanMetrics(1, max_samples=ScanMetrics.LIVE_WINDOW)
+        self.formats = reader.get_supported_formats()
+        self.known = {}
+        self.stop_event = threading.Event()
+
+    def scan_tree(self, top):
+        """({путь: (mtime_ns, размер)}, [папки]) для поддерева"""
+        files = {}
+        directories = []
+        stack = [top]
+        while stack:
+            directory = stack.pop()
+            directories.append(directory)
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif Path(entry.name).suffix.lower() in self.formats:
+                            stat = entry.stat()
+                            files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                    except OSError:
+                        pass
+        return files, directories
+
+    def apply_changes(self, current, scope):
+        """current - актуальное состояние файлов, scope - пути, которые могли исчезнуть"""
+        for filepath in scope:
+            if filepath in self.known and filepath not in current:
+                del self.known[filepath]
+                self.file_removed.emit(filepath)
+        for filepath, stat in current.items():
+            if self.stop_event.is_set():
+                return
+            if self.known.get(filepath) != stat:
+                self.known[filepath] = stat
+                self.file_changed.emit(filepath, self.reader.get_image_info(filepath))
+
+    def run(self):
+        self.known, directories = self.scan_tree(self.folder_path)
+        backend = InotifyBackend.create()
+        if backend is not None:
+            try:
+                for directory in directories:
+                    backend.add(directory)
+            except OSError:
+                # Например, исчерпан лимит max_user_watches
+                backend.close()
+                backend = None
+        
+        if backend is not None:
+            self.backend_selected.emit("inotify")
+            try:
+                self.watch_inotify(backend)
+            finally:
+                backend.close()
+        else:
+            self.backend_selected.emit("опрос")
+            self.watch_polling()
+
+    def watch_polling(self):
+        while not self.stop_event.wait(self.POLL_INTERVAL):
+            current, _ = self.scan_tree(self.folder_path)
+            self.apply_changes(current, list(self.known))
+
+    def watch_inotify(self, backend):
+        while not self.stop_event.is_set():
+            events = backend.read(0.5)
+            if not events:
+                continue
+            # Запись файла порождает несколько событий - собираем их в одну пачку
+            deadline = time.monotonic() + self.DEBOUNCE
+            while not self.stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                events.extend(backend.read(remaining))
+            self.handle_events(backend, events)
+
+    def handle_events(self, backend, events):
+        if any(directory is None for directory, _, _ in events):
+            # Очередь событий переполнена - полная сверка
+            current, directories = self.scan_tree(self.folder_path)
+            for directory in directories:
+                try:
+                    backend.add(directory)
+                except OSError:
+                    pass
+            self.apply_changes(current, list(self.known))
+            return
+        
+        paths = set()
+        created_dirs = []
+        removed_dirs = []
+        for directory, name, mask in events:
+            path = os.path.join(directory, name)
+            if mask & InotifyBackend.IN_ISDIR:
+                if mask & (InotifyBackend.IN_CREATE | InotifyBackend.IN_MOVED_TO):
+                    created_dirs.append(path)
+                elif mask & (InotifyBackend.IN_DELETE | InotifyBackend.IN_MOVED_FROM):
+                    removed_dirs.append(path)
+            elif name and Path(name).suffix.lower() in self.formats:
+                paths.add(path)
+        
+        current = {}
+        scope = set(paths)
+        for directory in removed_dirs:
+            prefix = directory + os.sep
+            scope.update(filepath for filepath in self.known if filepath.startswith(prefix))
+        for directory in created_dirs:
+            files, directories = self.scan_tree(directory)
+            current.update(files)
+            for subdirectory in directories:
+                try:
+                    backend.add(subdirectory)
+                except OSError:
+                    pass
+        for filepath in paths:
+            try:
+                stat = os.stat(filepath)
+                current[filepath] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        self.apply_changes(current, scope)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pcg-lab2')
+
+
+def thumbnail_cache_path():
+    return os.path.join(cache_dir(), 'thumbnails.sqlite')
+
+
+def metrics_report_path():
+    return os.path.join(cache_dir(), 'scan_metrics.json')
+
+
+class ThumbnailCache:
+    """Дисковый кеш миниатюр: одна база SQLite, ключ - размер миниатюры,
+    размер и время изменения файла и путь, так что изменённый файл получит новую запись.
+
+    Объем данных ограничен max_bytes: при переполнении удаляются записи, к которым
+    дольше всего не обращались (last_access обновляется при каждом попадании).
+    """
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.connection = None
+
+    def open(self):
+        # Соединение создается в потоке, который с ним работает
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS thumbnails (key TEXT PRIMARY KEY, data BLOB, "
+            "last_access REAL NOT NULL DEFAULT 0)")
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(thumbnails)")]
+        if 'last_access' not in columns:
+            # База от прежней версии без учета обращений
+            self.connection.execute(
+                "ALTER TABLE thumbnails ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS thumbnails_last_access ON thumbnails (last_access)")
+        self.total_bytes = self.connection.execute(
+            "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM thumbnails").fetchone()[0]
+        self.evict()
+
+    @staticmethod
+    def key(filepath, size):
+        stat = os.stat(split_archive_path(filepath)[0])
+        return f"{size}:{stat.st_size}:{stat.st_mtime_ns}:{filepath}"
+
+    def get(self, key):
+        row = self.connection.execute(
+            "SELECT data FROM thumbnails WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.connection.execute(
+            "UPDATE thumbnails SET last_access = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key, data):
+        row = self.connection.execute(
+            "SELECT LENGTH(data) FROM thumbnails WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self.total_bytes -= row[0]
+        self.connection.execute(
+            "INSERT OR REPLACE INTO thumbnails (key, data, last_access) VALUES (?, ?, ?)",
+            (key, data, time.time()))
+        self.total_bytes += len(data)
+        self.evict()
+
+    def evict(self):
+        """Удаляет самые давно использованные записи, пока объем не станет меньше 90% лимита"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = self.total_bytes - int(self.max_bytes * 0.9)
+        keys = []
+        freed = 0
+        rows = self.connection.execute(
+            "SELECT key, LENGTH(data) FROM thumbnails ORDER BY last_access")
+        for key, size in rows:
+            if freed >= target:
+                break
+            keys.append((key,))
+            freed += size
+        self.connection.executemany("DELETE FROM thumbnails WHERE key = ?", keys)
+        self.total_bytes -= freed
+
+    def flush(self):
+        if self.connection is not None:
+            self.connection.commit()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+
+def make_thumbnail(filepath, size):
+    """JPEG-миниатюра не больше size×size; для JPEG thumbnail() сам включает draft-декодирование"""
+    with PIL.Image.open(open_image_source(filepath)) as img:
+        img.thumbnail((size, size), PIL.Image.BILINEAR)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=85)
+        return buffer.getvalue()
+
+
+class ThumbnailLoader(QThread):
+    """Фоновая загрузка миниатюр: сначала кеш, затем декодирование файла.
+
+    Запросы обслуживаются в обратном порядке (последние - это строки, на которые
+    пользователь смотрит сейчас), ушедшие из области просмотра отбрасываются.
+    """
+    thumbnail_ready = Signal(str, int, QImage)
+
+    def __init__(self, cache):
+        super().__init__()
+        self.cache = cache
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.stop_requested = False
+
+    def request(self, filepath, size):
+        with self.condition:
+            key = (filepath, size)
+            self.pending.pop(key, None)
+            self.pending[key] = None
+            self.condition.notify()
+
+    def retain(self, filepaths, size):
+        """Оставляет в очереди запросы размера size только для переданных путей"""
+        with self.condition:
+            for key in list(self.pending):
+                if key[1] == size and key[0] not in filepaths:
+                    del self.pending[key]
+
+    def load(self, filepath, size):
+        try:
+            key = ThumbnailCache.key(filepath, size)
+            data = self.cache.get(key)
+            if data is None:
+                data = make_thumbnail(filepath, size)
+                self.cache.put(key, data)
+            image = QImage()
+            image.loadFromData(data, "JPEG")
+            return image
+        except Exception:
+            return QImage()
+
+    def run(self):
+        self.cache.open()
+        while True:
+            with self.condition:
+                while not self.pending and not self.stop_requested:
+                    self.condition.wait()
+                if self.stop_requested:
+                    break
+                (filepath, size), _ = self.pending.popitem(last=True)
+                queue_empty = not self.pending
+            self.thumbnail_ready.emit(filepath, size, self.load(filepath, size))
+            if queue_empty:
+                self.cache.flush()
+        self.cache.close()
+
+    def stop(self):
+        with self.condition:
+            self.stop_requested = True
+            self.condition.notify()
+
+
+class ExtraInfoLoader(QThread):
+    """Фоновое чтение доп. информации (EXIF, палитра) для выбранного файла.
+
+    Хранится только последний запрос: пока файл читается, выбор мог смениться,
+    и более ранние запросы уже не нужны.
+    """
+    extra_info_ready = Signal(int, str, str)
+
     def __init__(self):
         super().__init__()
+        self.pending = None
+        self.condition = threading.Condition()
+        self.stop_requested = False
+
+    def request(self, row, filepath):
+        with self.condition:
+            self.pending = (row, filepath)
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stop_requested:
+                    self.condition.wait()
+                if self.stop_requested:
+                    break
+                row, filepath = self.pending
+                self.pending = None
+            self.extra_info_ready.emit(row, filepath, read_extra_info(filepath))
+
+    def stop(self):
+        with self.condition:
+            self.stop_requested = True
+            self.condition.notify()
+
+
+class ThumbnailProvider(QObject):
+    """Миниатюры для интерфейса: готовые QPixmap в памяти, недостающие - через загрузчик"""
+    updated = Signal(str, int)
+
+    def __init__(self, loader, limit=4000):
+        super().__init__()
+        self.loader = loader
+        self.limit = limit
+        self.pixmaps = OrderedDict()
+        loader.thumbnail_ready.connect(self.on_thumbnail_ready)
+
+    def pixmap(self, filepath, size):
+        """QPixmap из памяти; если его нет - ставит загрузку в очередь и возвращает None"""
+        key = (filepath, size)
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+            return None if pixmap.isNull() else pixmap
+        self.loader.request(filepath, size)
+        return None
+
+    def on_thumbnail_ready(self, filepath, size, image):
+        key = (filepath, size)
+        # QPixmap из уже декодированного QImage - без повторного декодирования
+        self.pixmaps[key] = QPixmap.fromImage(image)
+        while len(self.pixmaps) > self.limit:
+            self.pixmaps.popitem(last=False)
+        self.updated.emit(filepath, size)
+
+    def forget(self, filepath):
+        for key in [key for key in self.pixmaps if key[0] == filepath]:
+            del self.pixmaps[key]
+
+    def clear(self):
+        self.pixmaps.clear()
+
+
+class ImageInfoTableModel(QAbstractTableModel):
+    """Модель таблицы поверх ImageInfoStore: текст ячеек формируется при отрисовке"""
+    HEADERS = [
+        "Имя файла", "Размер (пикс.)", "Разрешение", "Глубина цвета", 
+        "Сжатие", "Формат", "Режим", "Статус", "Миниатюра"
+    ]
+    STATUS_COLUMN = 7
+    THUMBNAIL_COLUMN = 8
+    THUMBNAIL_SIZE = 48
+    CENTERED_COLUMNS = {1, 2, 3, 5, 6}
+
+    def __init__(self, store, thumbnails=None):
+        super().__init__()
+        self.store = store
+        self.thumbnails = thumbnails
+        self.scan_index = None  # ScanIndex после завершения сканирования
+        self.rows = []  # номера строк хранилища в порядке отображения
+        # Строка хранилища -> индекс в rows на момент перестроения и отсортированные
+        # индексы строк, удаленных после него: позиция ищется без обхода rows
+        self.positions = None
+        self.removed_positions = []
+        self.thumbnail_timer = QTimer()
+        self.thumbnail_timer.setSingleShot(True)
+        self.thumbnail_timer.setInterval(50)
+        self.thumbnail_timer.timeout.connect(self.refresh_thumbnails)
+        if thumbnails is not None:
+            thumbnails.updated.connect(self.on_thumbnail_updated)
+
+    def on_thumbnail_updated(self, filepath, size):
+        # Готовые миниатюры приходят пачками - перерисовка столбца не чаще раза в 50 мс
+        if size == self.THUMBNAIL_SIZE and not self.thumbnail_timer.isActive():
+            self.thumbnail_timer.start()
+
+    def refresh_thumbnails(self):
+        if self.rows is not None and len(self.rows):
+            self.dataChanged.emit(self.index(0, self.THUMBNAIL_COLUMN),
+                                  self.index(len(self.rows) - 1, self.THUMBNAIL_COLUMN),
+                                  [Qt.DecorationRole])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def display_text(self, row, column):
+        store = self.store
+        c = store.columns
+        if column == 0:
+            return store.filename(row)
+        if column == 1:
+            return format_size(c['width'][row], c['height'][row])
+        if column == 2:
+            return format_resolution(c['dpi_x'][row], c['dpi_y'][row])
+        if column == 3:
+            return format_color_depth(c['bits'][row])
+        if column == 4:
+            return COMPRESSIONS.name(c['compression_code'][row])
+        if column == 5:
+            return FORMATS.name(c['format_code'][row])
+        if column == 6:
+            return MODES.name(c['mode_code'][row])
+        if column == self.THUMBNAIL_COLUMN:
+            return None
+        error = store.errors.get(row)
+        return "✓ Успешно" if not error else f"✗ {error}"
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        column = index.column()
+        
+        if role == Qt.DisplayRole:
+            return self.display_text(row, column)
+        if column == self.THUMBNAIL_COLUMN:
+            # data() вызывается только для видимых строк - загрузка идет лишь для них
+            if (role == Qt.DecorationRole and self.thumbnails is not None
+                    and row not in self.store.errors):
+                return self.thumbnails.pixmap(self.store.filepaths[row], self.THUMBNAIL_SIZE)
+            return None
+        if column == self.STATUS_COLUMN:
+            failed = row in self.store.errors
+            if role == Qt.ForegroundRole:
+                return QColor(220, 53, 69) if failed else QColor(40, 167, 69)
+            if role == Qt.BackgroundRole:
+                return QColor(255, 240, 240) if failed else QColor(240, 255, 240)
+        if role == Qt.TextAlignmentRole and column in self.CENTERED_COLUMNS:
+            return Qt.AlignCenter
+        return None
+
+    def store_row(self, view_row):
+        return self.rows[view_row]
+
+    def append_row(self, row):
+        position = len(self.rows)
+        self.beginInsertRows(QModelIndex(), position, position)
+        if not isinstance(self.rows, list):
+            self.rows = list(self.rows)
+        self.rows.append(row)
+        if self.positions is not None:
+            self.positions[row] = position + len(self.removed_positions)
+        self.endInsertRows()
+
+    def remove_store_row(self, row):
+        position = self.view_position(row)
+        if position is None:
+            return
+        self.beginRemoveRows(QModelIndex(), position, position)
+        del self.rows[position]
+        bisect.insort(self.removed_positions, self.positions.pop(row))
+        # Перестроение за O(n) не чаще, чем раз в n/16 удалений
+        if len(self.removed_positions) > 64 + len(self.rows) // 16:
+            self.positions = None
+        self.endRemoveRows()
+
+    def view_position(self, row):
+        """Позиция строки хранилища в таблице или None, если она не показана"""
+        if self.positions is None:
+            if not isinstance(self.rows, list):
+                self.rows = list(self.rows)
+            self.positions = {shown: index for index, shown in enumerate(self.rows)}
+            self.removed_positions = []
+        index = self.positions.get(row)
+        if index is None:
+            return None
+        return index - bisect.bisect_left(self.removed_positions, index)
+
+    def refresh_store_row(self, row):
+        position = self.view_position(row)
+        if position is not None:
+            self.dataChanged.emit(self.index(position, 0),
+                                  self.index(position, self.columnCount() - 1))
+
+    def set_rows(self, rows):
+        """Замена отображаемых строк, например результатом ScanIndex.query"""
+        self.beginResetModel()
+        self.rows = rows
+        self.positions = None
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column == self.THUMBNAIL_COLUMN:
+            return
+        reverse = order == Qt.DescendingOrder
+        self.layoutAboutToBeChanged.emit()
+        if self.scan_index is not None and self.scan_index.version == self.store.version:
+            self.rows = self.scan_index.sort_rows(self.rows, column, reverse)
+        else:
+            self.rows = self.store.sorted_rows(column, reverse, self.rows)
+        self.positions = None
+        self.layoutChanged.emit()
+
+
+class StyledTableView(QTableView):
+    def __init__(self, model):
+        super().__init__()
+        self.setModel(model)
         self.setup_table()
         
     def setup_table(self):
-        headers = [
-            "Имя файла", "Размер (пикс.)", "Разрешение", "Глубина цвета", 
-            "Сжатие", "Формат", "Режим", "Статус"
-        ]
-        self.setColumnCount(len(headers))
-        self.setHorizontalHeaderLabels(headers)
-        
         # Настройка внешнего вида
         self.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: white;
                 alternate-background-color: #f8f9fa;
                 gridline-color: #dee2e6;
@@ -242,12 +2529,12 @@ class StyledTableWidget(QTableWidget):
                 border-radius: 5px;
                 color: #212529;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
                 border-bottom: 1px solid #dee2e6;
                 color: #212529;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #007bff;
                 color: white;
             }
@@ -262,9 +2549,13 @@ class StyledTableWidget(QTableWidget):
         
         self.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.setAlternatingRowColors(True)
-        self.setSelectionBehavior(QTableWidget.SelectRows)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.setSortingEnabled(True)
         self.setShowGrid(True)
+        # Фиксированная высота строк: представление не измеряет каждую строку
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         
         self.setColumnWidth(0, 250)  # Имя файла
         self.setColumnWidth(1, 120)  # Размер
@@ -275,47 +2566,60 @@ class StyledTableWidget(QTableWidget):
         self.setColumnWidth(6, 80)   # Режим
         self.setColumnWidth(7, 150)  # Статус
         
+        # Миниатюры - первым столбцом на экране, номера столбцов модели не меняются
+        thumbnail_size = ImageInfoTableModel.THUMBNAIL_SIZE
+        self.horizontalHeader().moveSection(ImageInfoTableModel.THUMBNAIL_COLUMN, 0)
+        self.setColumnWidth(ImageInfoTableModel.THUMBNAIL_COLUMN, thumbnail_size + 12)
+        self.setIconSize(QSize(thumbnail_size, thumbnail_size))
+        self.verticalHeader().setDefaultSectionSize(thumbnail_size + 6)
+        self.verticalScrollBar().valueChanged.connect(self.prune_thumbnail_requests)
+        
         self.setMinimumHeight(400)
-    
-    def add_image_info(self, info):
-        """Добавляет информацию об изображении в таблицу"""
-        row = self.rowCount()
-        self.insertRow(row)
-        
-        items = [
-            info.filename,
-            info.size,
-            info.resolution,
-            info.color_depth,
-            info.compression,
-            info.format,
-            info.mode,
-            "✓ Успешно" if not info.error else f"✗ {info.error}"
-        ]
-        
-        for col, text in enumerate(items):
-            item = QTableWidgetItem(text)
-            item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-            
-            if info.error:
-                if col == 7:
-                    item.setForeground(QColor(220, 53, 69))
-                    item.setBackground(QColor(255, 240, 240))
-            else:
-                if col == 7:
-                    item.setForeground(QColor(40, 167, 69))
-                    item.setBackground(QColor(240, 255, 240))
-            
-            if col in [1, 2, 3, 5, 6]:
-                item.setTextAlignment(Qt.AlignCenter)
-                
-            self.setItem(row, col, item)
+
+    def visible_store_rows(self):
+        model = self.model()
+        first = self.rowAt(0)
+        if first < 0:
+            return []
+        last = self.rowAt(self.viewport().height() - 1)
+        if last < 0:
+            last = model.rowCount() - 1
+        return [model.store_row(view_row) for view_row in range(first, last + 1)]
+
+    def prune_thumbnail_requests(self):
+        model = self.model()
+        if model.thumbnails is None:
+            return
+        visible = {model.store.filepaths[row] for row in self.visible_store_rows()}
+        model.thumbnails.loader.retain(visible, model.THUMBNAIL_SIZE)
+
+    def selected_store_row(self):
+        """Номер строки хранилища для выделенной строки таблицы или None"""
+        indexes = self.selectionModel().selectedRows()
+        if not indexes:
+            return None
+        return self.model().store_row(indexes[0].row())
 
 class MainWindow(QMainWindow):
+    PREVIEW_SIZE = 256
+    
     def __init__(self):
         super().__init__()
         self.worker = None
-        self.image_info_dict = {}
+        self.watcher = None
+        self.path_rows = {}
+        self.duplicate_groups = []
+        self.phash_index = None
+        self.active_query = None  # текст примененного запроса к таблице
+        self.store = ImageInfoStore()
+        self.thumbnail_loader = ThumbnailLoader(ThumbnailCache(thumbnail_cache_path()))
+        self.thumbnails = ThumbnailProvider(self.thumbnail_loader)
+        self.thumbnails.updated.connect(self.on_thumbnail_updated)
+        self.thumbnail_loader.start()
+        self.extra_info_loader = ExtraInfoLoader()
+        self.extra_info_loader.extra_info_ready.connect(self.on_extra_info_ready)
+        self.extra_info_loader.start()
+        self.table_model = ImageInfoTableModel(self.store, self.thumbnails)
         self.scan_mode = "folder"  # "folder" или "file"
         self.init_ui()
         
@@ -487,8 +2791,23 @@ class MainWindow(QMainWindow):
         self.stop_btn.setEnabled(False)
         self.stop_btn.setObjectName("stopBtn")
         
+        self.duplicates_check = QCheckBox("Искать дубликаты")
+        self.phash_check = QCheckBox("Искать похожие (перцептивный хеш)")
+        self.watch_check = QCheckBox("Следить за изменениями")
+        self.engine_combo = QComboBox()
+        self.engine_combo.addItem("Пул потоков", ImageInfoWorker)
+        self.engine_combo.addItem(f"Процессы ({os.cpu_count() or 1})", ShardedScanWorker)
+        self.engine_combo.addItem("asyncio", AsyncScanWorker)
+        self.engine_combo.setToolTip("Процессы - для очень больших деревьев на быстрых дисках; "
+                                     "asyncio - для сетевых дисков с большой задержкой чтения")
+        
         buttons_layout.addWidget(self.scan_btn)
         buttons_layout.addWidget(self.stop_btn)
+        buttons_layout.addWidget(self.duplicates_check)
+        buttons_layout.addWidget(self.phash_check)
+        buttons_layout.addWidget(self.watch_check)
+        buttons_layout.addWidget(QLabel("Движок:"))
+        buttons_layout.addWidget(self.engine_combo)
         buttons_layout.addStretch()
         
         control_layout.addLayout(path_layout)
@@ -506,8 +2825,39 @@ class MainWindow(QMainWindow):
 
         self.tabs = QTabWidget()
         
-        self.table_widget = StyledTableWidget()
-        self.tabs.addTab(self.table_widget, "Основная информация")
+        table_page = QWidget()
+        table_layout = QVBoxLayout(table_page)
+        table_layout.setContentsMargins(0, 5, 0, 0)
+        
+        query_layout = QHBoxLayout()
+        self.query_input = QLineEdit()
+        self.query_input.setPlaceholderText(
+            "Фильтр: format=TIFF dpi>300 compression=LZW, width>8000, status=error")
+        self.query_input.returnPressed.connect(self.apply_query)
+        self.query_btn = QPushButton("Фильтровать")
+        self.query_btn.clicked.connect(self.apply_query)
+        self.query_reset_btn = QPushButton("Сбросить")
+        self.query_reset_btn.clicked.connect(self.reset_query)
+        query_layout.addWidget(self.query_input, 1)
+        query_layout.addWidget(self.query_btn)
+        query_layout.addWidget(self.query_reset_btn)
+        
+        self.table_widget = StyledTableView(self.table_model)
+        
+        self.preview_label = QLabel("Предпросмотр")
+        self.preview_label.setAlignment(Qt.AlignCenter)
+        self.preview_label.setMinimumWidth(self.PREVIEW_SIZE + 20)
+        self.preview_label.setStyleSheet(
+            "background-color: white; border: 1px solid #ced4da; border-radius: 5px; color: #6c757d;")
+        
+        table_splitter = QSplitter(Qt.Horizontal)
+        table_splitter.addWidget(self.table_widget)
+        table_splitter.addWidget(self.preview_label)
+        table_splitter.setStretchFactor(0, 1)
+        
+        table_layout.addLayout(query_layout)
+        table_layout.addWidget(table_splitter)
+        self.tabs.addTab(table_page, "Основная информация")
         
         self.extra_info_text = QTextEdit()
         self.extra_info_text.setReadOnly(True)
@@ -538,12 +2888,25 @@ class MainWindow(QMainWindow):
         """)
         self.tabs.addTab(self.stats_text, "Статистика")
         
+        self.duplicates_text = QTextEdit()
+        self.duplicates_text.setReadOnly(True)
+        self.duplicates_text.setPlaceholderText("Включите «Искать дубликаты» перед сканированием папки...")
+        self.duplicates_text.setStyleSheet(self.extra_info_text.styleSheet())
+        self.tabs.addTab(self.duplicates_text, "Дубликаты")
+        
+        self.metrics_text = QTextEdit()
+        self.metrics_text.setReadOnly(True)
+        self.metrics_text.setPlaceholderText("Показатели появятся во время сканирования...")
+        self.metrics_text.setStyleSheet(self.extra_info_text.styleSheet())
+        self.tabs.addTab(self.metrics_text, "Производительность")
+        
         layout.addWidget(self.tabs, 1)
         
-        self.table_widget.itemSelectionChanged.connect(self.show_extra_info)
+        self.table_widget.selectionModel().selectionChanged.connect(self.show_extra_info)
         
         self.status_bar = self.statusBar()
         self.status_bar.showMessage("Готов к работе")
+        self.set_query_enabled(False)
         self.update_stats()
     
     def on_mode_changed(self):
@@ -569,18 +2932,27 @@ class MainWindow(QMainWindow):
                 self.scan_btn.setEnabled(True)
                 
                 supported_formats = {'.jpg', '.jpeg', '.gif', '.tif', '.tiff', '.bmp', '.png', '.pcx'}
-                image_count = sum(1 for f in Path(path).rglob('*') 
-                                if f.suffix.lower() in supported_formats)
-                self.status_bar.showMessage(f"Найдено {image_count} поддерживаемых графических файлов")
+                image_count = 0
+                archive_count = 0
+                for f in Path(path).rglob('*'):
+                    if f.suffix.lower() in supported_formats:
+                        image_count += 1
+                    elif is_archive(f.name):
+                        archive_count += 1
+                message = f"Найдено {image_count} поддерживаемых графических файлов"
+                if archive_count:
+                    message += f" и {archive_count} архивов"
+                self.status_bar.showMessage(message)
         else:
-            file_filter = "Графические файлы (*.jpg *.jpeg *.png *.gif *.bmp *.tif *.tiff *.pcx);;Все файлы (*)"
+            file_filter = ("Графические файлы (*.jpg *.jpeg *.png *.gif *.bmp *.tif *.tiff *.pcx);;"
+                           "Архивы (*.zip *.tar *.tar.gz *.tgz);;Все файлы (*)")
             file_path, _ = QFileDialog.getOpenFileName(self, "Выберите графический файл", "", file_filter)
             if file_path:
                 self.path_input.setText(file_path)
                 self.scan_btn.setEnabled(True)
                 file_ext = Path(file_path).suffix.lower()
                 supported_formats = {'.jpg', '.jpeg', '.gif', '.tif', '.tiff', '.bmp', '.png', '.pcx'}
-                if file_ext in supported_formats:
+                if file_ext in supported_formats or is_archive(file_path):
                     self.status_bar.showMessage(f"Выбран файл: {os.path.basename(file_path)}")
                 else:
                     self.status_bar.showMessage(f"Внимание: выбранный файл может не поддерживаться")
@@ -595,9 +2967,20 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Выбранный путь не существует!")
             return
         
-        self.table_widget.setRowCount(0)
+        self.stop_watching()
+        self.store = ImageInfoStore()
+        self.path_rows = {}
+        self.table_model.store = self.store
+        self.table_model.scan_index = None
+        self.table_model.set_rows([])
         self.extra_info_text.clear()
-        self.image_info_dict = {}
+        self.show_preview(None)
+        self.duplicates_text.clear()
+        self.metrics_text.clear()
+        self.duplicate_groups = []
+        self.phash_index = None
+        self.active_query = None
+        self.set_query_enabled(False)
         
         self.scan_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
@@ -612,24 +2995,150 @@ class MainWindow(QMainWindow):
         self.progress_label.setStyleSheet("font-weight: bold; color: #007bff;")
 
         if self.scan_mode == "folder":
-            self.worker = ImageInfoWorker(path)
+            worker_class = self.engine_combo.currentData()
+            self.worker = worker_class(path, find_duplicates=self.duplicates_check.isChecked(),
+                                       compute_phash=self.phash_check.isChecked(),
+                                       metrics_path=metrics_report_path())
         else:
-            self.worker = ImageInfoWorker("", single_file_mode=True, single_file_path=path)
+            self.worker = ImageInfoWorker("", single_file_mode=True, single_file_path=path,
+                                          compute_phash=self.phash_check.isChecked())
             
         self.worker.file_processed.connect(self.on_file_processed)
         self.worker.progress.connect(self.on_progress)
+        self.worker.stage_changed.connect(self.progress_label.setText)
+        self.worker.duplicates_found.connect(self.on_duplicates_found)
+        self.worker.similar_found.connect(self.on_similar_found)
+        self.worker.metrics_updated.connect(self.on_metrics_updated)
         self.worker.finished.connect(self.on_scan_finished)
         self.worker.start()
     
     def stop_scanning(self):
+        if self.watcher is not None and not (self.worker and self.worker.isRunning()):
+            self.stop_watching()
+            self.stop_btn.setEnabled(False)
+            self.progress_label.setText("Отслеживание изменений остановлено.")
+            return
         if self.worker and self.worker.isRunning():
             self.worker.stop()
             self.worker.wait(5000)
         self.on_scan_finished()
     
+    def start_watching(self):
+        self.watcher = FolderWatcher(self.worker.folder_path, self.worker)
+        self.watcher.file_changed.connect(self.on_watched_file_changed)
+        self.watcher.file_removed.connect(self.on_watched_file_removed)
+        self.watcher.backend_selected.connect(
+            lambda backend: self.progress_label.setText(
+                f"Отслеживание изменений ({backend}). Файлов: {self.store.live_count()}"))
+        self.watcher.start()
+        self.stop_btn.setEnabled(True)
+    
+    def stop_watching(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher.wait(5000)
+            self.watcher = None
+    
+    def on_watched_file_changed(self, filepath, info):
+        row = self.path_rows.get(filepath)
+        if row is None:
+            self.on_file_processed(filepath, info)
+            row = self.path_rows[filepath]
+        else:
+            self.store.update(row, info)
+            self.thumbnails.forget(filepath)
+            # После изменения файл может начать или перестать подходить под запрос
+            shown = self.table_model.view_position(row) is not None
+            if self.matches_query(row) != shown:
+                if shown:
+                    self.table_model.remove_store_row(row)
+                else:
+                    self.table_model.append_row(row)
+            else:
+                self.table_model.refresh_store_row(row)
+        if self.phash_index is not None:
+            self.phash_index.remove(row)
+            if not info.error:
+                self.phash_index.add(row, info.phash)
+        self.update_stats()
+    
+    def on_watched_file_removed(self, filepath):
+        row = self.path_rows.pop(filepath, None)
+        if row is None:
+            return
+        self.store.remove(row)
+        self.table_model.remove_store_row(row)
+        self.thumbnails.forget(filepath)
+        if self.phash_index is not None:
+            self.phash_index.remove(row)
+        self.update_stats()
+    
     def on_file_processed(self, filepath, info):
-        self.image_info_dict[filepath] = info
-        self.table_widget.add_image_info(info)
+        row = self.store.append(info)
+        self.path_rows[filepath] = row
+        if self.matches_query(row):
+            self.table_model.append_row(row)
+    
+    def matches_query(self, row):
+        # Новые файлы режима наблюдения показываются, только если подходят под текущий запрос
+        return not self.active_query or ScanIndex.row_matches(self.store, self.active_query, row)
+    
+    def on_duplicates_found(self, groups, sizes):
+        self.duplicate_groups = groups
+        if not groups:
+            self.duplicates_text.setText("Точных дубликатов не найдено.")
+            return
+        
+        wasted = sum(size * (len(group) - 1) for group, size in zip(groups, sizes))
+        text = f"НАЙДЕНО ГРУПП ДУБЛИКАТОВ: {len(groups)}\n"
+        text += f"Лишних копий: {sum(len(group) - 1 for group in groups)}, "
+        text += f"занимают {wasted / (1024 * 1024):.1f} МБ\n"
+        text += "="*50 + "\n"
+        for number, group in enumerate(groups, 1):
+            text += f"\nГруппа {number} ({len(group)} файлов):\n"
+            for filepath in group:
+                text += f"  {filepath}\n"
+        self.duplicates_text.setText(text)
+    
+    def on_metrics_updated(self, metrics):
+        megabyte = 1024 * 1024
+        current = metrics['current']
+        text = "ПРОИЗВОДИТЕЛЬНОСТЬ СКАНИРОВАНИЯ\n"
+        text += "="*50 + "\n\n"
+        text += f"Время: {metrics['elapsed_seconds']:.1f} с   Файлов: {metrics['files']}   "
+        text += f"Объем: {metrics['bytes'] / megabyte:.1f} МБ\n"
+        text += f"Сейчас: {current['files_per_second']:.1f} файлов/с, "
+        text += f"{current['bytes_per_second'] / megabyte:.1f} МБ/с\n"
+        text += f"В среднем: {metrics['files_per_second']:.1f} файлов/с, "
+        text += f"{metrics['bytes_per_second'] / megabyte:.1f} МБ/с\n"
+        text += f"Очередь задач: {current['queue_depth']}   "
+        text += f"Загрузка потоков: {current['utilization'] * 100:.0f}% "
+        text += f"(в среднем {metrics['utilization'] * 100:.0f}%, потоков: {metrics['workers']})\n"
+        if metrics['phases_seconds']:
+            phases = ", ".join(f"{name} {seconds:.2f} с"
+                               for name, seconds in metrics['phases_seconds'].items())
+            text += f"Фазы: {phases}\n"
+        
+        text += "\nЗАДЕРЖКА НА ФАЙЛ, мс (p50 / p95 / p99):\n"
+        text += "-"*50 + "\n"
+        by_total = sorted(metrics['latency'].items(),
+                          key=lambda item: -item[1].get('total', {}).get('mean_ms', 0) *
+                          item[1].get('total', {}).get('count', 0))
+        for format_name, stages in by_total:
+            count = stages.get('total', {}).get('count', 0)
+            text += f"{format_name} ({count} файлов):\n"
+            for stage in ('open', 'header', 'phash', 'total'):
+                if stage in stages:
+                    stat = stages[stage]
+                    text += (f"    {stage:<7} {stat['p50_ms']:8.2f} / {stat['p95_ms']:8.2f} / "
+                             f"{stat['p99_ms']:8.2f}\n")
+        
+        if 'report_path' in metrics:
+            text += f"\nОтчет JSON: {metrics['report_path']}\n"
+        if 'report_error' in metrics:
+            text += f"\nНе удалось сохранить отчет JSON: {metrics['report_error']}\n"
+            self.status_bar.showMessage("Не удалось сохранить отчет о производительности")
+        self.metrics_text.setText(text)
     
     def on_progress(self, value):
         self.progress_bar.setValue(value)
@@ -643,60 +3152,159 @@ class MainWindow(QMainWindow):
         self.stop_btn.setEnabled(False)
         
         if self.scan_mode == "folder":
-            self.progress_label.setText(f"Сканирование завершено. Обработано {self.table_widget.rowCount()} файлов.")
+            self.progress_label.setText(f"Сканирование завершено. Обработано {len(self.store)} файлов.")
         else:
             self.progress_label.setText("Анализ файла завершен.")
             
         self.progress_label.setStyleSheet("font-weight: bold; color: #28a745;")
         
+        self.table_model.scan_index = ScanIndex(self.store)
+        self.set_query_enabled(True)
         self.update_stats()
+        
+        if (self.watch_check.isChecked() and self.scan_mode == "folder" and self.watcher is None
+                and self.worker is not None and not self.worker.stop_requested):
+            self.start_watching()
+    
+    def on_similar_found(self, phash_index, groups):
+        self.phash_index = phash_index
+        text = self.duplicates_text.toPlainText()
+        if text:
+            text += "\n\n"
+        text += f"ПОХОЖИЕ ИЗОБРАЖЕНИЯ (расстояние dHash ≤ {self.phash_index.max_distance}): "
+        text += f"{len(groups)} групп\n"
+        text += "="*50 + "\n"
+        for number, rows in enumerate(groups, 1):
+            text += f"\nГруппа {number} ({len(rows)} файлов):\n"
+            for row in rows:
+                text += f"  {self.store.filepaths[row]}\n"
+        self.duplicates_text.setText(text)
+    
+    def set_query_enabled(self, enabled):
+        self.query_input.setEnabled(enabled)
+        self.query_btn.setEnabled(enabled)
+        self.query_reset_btn.setEnabled(enabled)
+    
+    def apply_query(self):
+        index = self.table_model.scan_index
+        if index is None:
+            return
+        if index.version != self.store.version:
+            # После изменений в режиме наблюдения снимок пересобирается по запросу
+            index = self.table_model.scan_index = ScanIndex(self.store)
+        text = self.query_input.text().strip()
+        if not text:
+            self.reset_query()
+            return
+        
+        started = time.perf_counter()
+        try:
+            rows = index.query(text)
+        except QueryError as e:
+            QMessageBox.warning(self, "Ошибка запроса", str(e))
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        
+        self.table_model.set_rows(rows)
+        self.active_query = text
+        self.status_bar.showMessage(
+            f"Найдено {len(rows)} из {index.size} файлов за {elapsed:.1f} мс")
+    
+    def reset_query(self):
+        self.query_input.clear()
+        self.active_query = None
+        if self.table_model.scan_index is not None:
+            self.table_model.set_rows(self.store.live_rows())
+            self.status_bar.showMessage(f"Показаны все файлы: {self.store.live_count()}")
+    
+    def show_preview(self, row):
+        if row is None or row in self.store.errors:
+            self.preview_label.clear()
+            self.preview_label.setText("Предпросмотр недоступен" if row is not None else "Предпросмотр")
+            return
+        pixmap = self.thumbnails.pixmap(self.store.filepaths[row], self.PREVIEW_SIZE)
+        if pixmap is not None:
+            self.preview_label.setPixmap(pixmap)
+        else:
+            self.preview_label.clear()
+            self.preview_label.setText("Загрузка...")
+    
+    def on_thumbnail_updated(self, filepath, size):
+        if size != self.PREVIEW_SIZE:
+            return
+        row = self.table_widget.selected_store_row()
+        if row is not None and self.store.filepaths[row] == filepath:
+            self.show_preview(row)
+    
+    def closeEvent(self, event):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.worker.wait(5000)
+        self.stop_watching()
+        self.thumbnail_loader.stop()
+        self.thumbnail_loader.wait(5000)
+        self.extra_info_loader.stop()
+        self.extra_info_loader.wait(5000)
+        super().closeEvent(event)
     
     def show_extra_info(self):
-        selected_items = self.table_widget.selectedItems()
-        if not selected_items:
+        row = self.table_widget.selected_store_row()
+        self.show_preview(row)
+        if row is None:
             return
-            
-        row = selected_items[0].row()
-        filename_item = self.table_widget.item(row, 0)
-        if not filename_item:
+        
+        info = self.store.record(row)
+        if info.error:
+            self.extra_info_text.setText(self.format_extra_info(row, ""))
             return
-            
-        filename = filename_item.text()
-        
-        for filepath, info in self.image_info_dict.items():
-            if info.filename == filename:
-                extra_text = f"ФАЙЛ: {info.filename}\n"
-                extra_text += f"ПУТЬ: {info.filepath}\n"
-                extra_text += "="*50 + "\n\n"
-                extra_text += f"РАЗМЕР: {info.size} пикселей\n"
-                extra_text += f"РАЗРЕШЕНИЕ: {info.resolution}\n"
-                extra_text += f"ГЛУБИНА ЦВЕТА: {info.color_depth}\n"
-                extra_text += f"СЖАТИЕ: {info.compression}\n"
-                extra_text += f"ФОРМАТ: {info.format}\n"
-                extra_text += f"РЕЖИМ: {info.mode}\n\n"
-                
-                if info.extra_info:
-                    extra_text += "ДОПОЛНИТЕЛЬНАЯ ИНФОРМАЦИЯ:\n" + "="*30 + "\n"
-                    extra_text += info.extra_info
-                else:
-                    extra_text += "Дополнительная информация отсутствует."
-                
-                self.extra_info_text.setText(extra_text)
-                break
+        # EXIF и палитра читаются в фоне: архивы и большие GIF не блокируют интерфейс
+        self.extra_info_text.setText(self.format_extra_info(row, None))
+        self.extra_info_loader.request(row, info.filepath)
+    
+    def on_extra_info_ready(self, row, filepath, extra_info):
+        # Результат для строки, которая уже не выбрана, отбрасывается
+        if row != self.table_widget.selected_store_row() or self.store.filepaths[row] != filepath:
+            return
+        self.extra_info_text.setText(self.format_extra_info(row, extra_info))
+    
+    def format_extra_info(self, row, extra_info):
+        info = self.store.record(row)
+        extra_text = f"ФАЙЛ: {info.filename}\n"
+        extra_text += f"ПУТЬ: {info.filepath}\n"
+        extra_text += "="*50 + "\n\n"
+        extra_text += f"РАЗМЕР: {info.size} пикселей\n"
+        extra_text += f"РАЗРЕШЕНИЕ: {info.resolution}\n"
+        extra_text += f"ГЛУБИНА ЦВЕТА: {info.color_depth}\n"
+        extra_text += f"СЖАТИЕ: {info.compression}\n"
+        extra_text += f"ФОРМАТ: {info.format}\n"
+        extra_text += f"РЕЖИМ: {info.mode}\n\n"
+        
+        if extra_info is None:
+            extra_text += "Загрузка дополнительной информации..."
+        elif extra_info:
+            extra_text += "ДОПОЛНИТЕЛЬНАЯ ИНФОРМАЦИЯ:\n" + "="*30 + "\n"
+            extra_text += extra_info
+        else:
+            extra_text += "Дополнительная информация отсутствует."
+        
+        if self.phash_index is not None and row in self.phash_index.hashes:
+            extra_text += "\n\nПОХОЖИЕ ИЗОБРАЖЕНИЯ:\n" + "="*30 + "\n"
+            similar = self.phash_index.similar(row)
+            for distance, other in similar:
+                extra_text += f"{self.store.filepaths[other]} (расстояние {distance})\n"
+            if not similar:
+                extra_text += "Не найдено.\n"
+        
+        return extra_text
     
     def update_stats(self):
-        total_files = self.table_widget.rowCount()
+        total_files = self.store.live_count()
         if total_files == 0:
             self.stats_text.setText("Файлы еще не обработаны.")
             return
         
         # Подсчет по форматам
-        format_count = {}
-        for row in range(total_files):
-            format_item = self.table_widget.item(row, 5)
-            if format_item:
-                format_name = format_item.text()
-                format_count[format_name] = format_count.get(format_name, 0) + 1
+        format_count = self.store.format_counts()
         
         stats_text = "СТАТИСТИКА ОБРАБОТКИ\n"
         stats_text += "="*30 + "\n\n"
@@ -715,9 +3323,7 @@ class MainWindow(QMainWindow):
             else:
                 stats_text += f"  {format_name}: 1 файл\n"
         
-        error_count = sum(1 for row in range(total_files) 
-                         if self.table_widget.item(row, 7) and 
-                         "✗" in self.table_widget.item(row, 7).text())
+        error_count = self.store.error_count()
         
         if self.scan_mode == "folder":
             stats_text += f"\nФайлов с ошибками: {error_count}\n"
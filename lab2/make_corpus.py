@@ -0,0 +1,135 @@
+"""Генератор воспроизводимого набора изображений для нагрузочного тестирования lab2.
+
+Содержимое каждого файла зависит только от seed и номера файла, поэтому
+одинаковые параметры всегда дают побайтно одинаковый набор.
+
+    python make_corpus.py corpus --count 2000 --min-size 64 --max-size 2048 --depth 3
+"""
+import argparse
+import os
+import random
+import shutil
+
+import PIL.Image
+import PIL.ImageDraw
+
+
+def draw_image(rng, width, height):
+    """RGB-изображение из случайных фигур поверх градиентного фона"""
+    image = PIL.Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = PIL.ImageDraw.Draw(image)
+    for _ in range(rng.randint(3, 12)):
+        x1, x2 = sorted(rng.randrange(width) for _ in range(2))
+        y1, y2 = sorted(rng.randrange(height) for _ in range(2))
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.rectangle((x1, y1, x2, y2), fill=color)
+        else:
+            draw.ellipse((x1, y1, x2, y2), fill=color)
+    return image
+
+
+def save_jpeg(image, path, rng):
+    exif = PIL.Image.Exif()
+    exif[0x010F] = "PCG-labs"  # Make
+    exif[0x0110] = f"Synthetic {rng.randrange(1000)}"  # Model
+    exif[0x0131] = "make_corpus.py"  # Software
+    exif[0x0132] = f"2024:{rng.randint(1, 12):02d}:{rng.randint(1, 28):02d} 12:00:00"  # DateTime
+    dpi = rng.choice([72, 96, 300])
+    image.save(path, 'JPEG', quality=rng.choice([70, 85, 95]), dpi=(dpi, dpi), exif=exif.tobytes())
+
+
+def save_gif(image, path, rng):
+    colors = rng.choice([16, 64, 256])
+    image.convert('P', palette=PIL.Image.ADAPTIVE, colors=colors).save(path, 'GIF')
+
+
+def save_tiff_lzw(image, path, rng):
+    dpi = rng.choice([150, 300, 600])
+    image.save(path, 'TIFF', compression='tiff_lzw', dpi=(dpi, dpi))
+
+
+def save_tiff_deflate(image, path, rng):
+    dpi = rng.choice([150, 300, 600])
+    image.save(path, 'TIFF', compression='tiff_adobe_deflate', dpi=(dpi, dpi))
+
+
+def save_bmp(image, path, rng):
+    image.save(path, 'BMP')
+
+
+def save_pcx(image, path, rng):
+    if rng.random() < 0.5:
+        image = image.convert('P', palette=PIL.Image.ADAPTIVE, colors=256)
+    image.save(path, 'PCX')
+
+
+def save_png(image, path, rng):
+    # dpi записывается в блок pHYs
+    dpi = rng.choice([72, 96, 300])
+    if rng.random() < 0.3:
+        image = image.convert('RGBA')
+    image.save(path, 'PNG', dpi=(dpi, dpi))
+
+
+# Все расширения из ImageInfoWorker.get_supported_formats
+WRITERS = [
+    ('.jpg', save_jpeg),
+    ('.jpeg', save_jpeg),
+    ('.gif', save_gif),
+    ('.tif', save_tiff_lzw),
+    ('.tiff', save_tiff_deflate),
+    ('.bmp', save_bmp),
+    ('.pcx', save_pcx),
+    ('.png', save_png),
+]
+
+
+def file_directory(rng, output, depth, fanout):
+    levels = rng.randint(0, depth)
+    parts = [f"d{rng.randrange(fanout)}" for _ in range(levels)]
+    return os.path.join(output, *parts)
+
+
+def generate(output, count, min_size, max_size, depth, fanout, seed, duplicates=0.0):
+    """Создает count файлов; доля duplicates - точные копии ранее созданных файлов"""
+    created = []
+    for index in range(count):
+        rng = random.Random(f"{seed}:{index}")
+        directory = file_directory(rng, output, depth, fanout)
+        os.makedirs(directory, exist_ok=True)
+        extension, writer = WRITERS[index % len(WRITERS)]
+
+        if created and rng.random() < duplicates:
+            source = created[rng.randrange(len(created))]
+            path = os.path.join(directory, f"copy_{index:07d}{os.path.splitext(source)[1]}")
+            shutil.copyfile(source, path)
+        else:
+            width = rng.randint(min_size, max_size)
+            height = rng.randint(min_size, max_size)
+            path = os.path.join(directory, f"img_{index:07d}{extension}")
+            writer(draw_image(rng, width, height), path, rng)
+        created.append(path)
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация тестового набора изображений для lab2")
+    parser.add_argument("output", help="папка для набора")
+    parser.add_argument("--count", type=int, default=1000, help="количество файлов")
+    parser.add_argument("--min-size", type=int, default=64, help="минимальная сторона, пикс.")
+    parser.add_argument("--max-size", type=int, default=1024, help="максимальная сторона, пикс.")
+    parser.add_argument("--depth", type=int, default=3, help="максимальная глубина вложенности папок")
+    parser.add_argument("--fanout", type=int, default=4, help="подпапок на каждом уровне")
+    parser.add_argument("--duplicates", type=float, default=0.0, help="доля точных копий (0..1)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    files = generate(args.output, args.count, args.min_size, args.max_size,
+                     args.depth, args.fanout, args.seed, args.duplicates)
+    total = sum(os.path.getsize(path) for path in files)
+    print(f"Создано {len(files)} файлов, {total / (1024 * 1024):.1f} МБ в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
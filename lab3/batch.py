@@ -0,0 +1,240 @@
+"""Пакетная обработка изображений lab3 без интерфейса (PySide6 не нужен).
+
+Конвейер - стадии через "+", параметры стадии - после ":" через запятую; можно
+также передать JSON-файл или строку вида [["gray", {}], ["global_otsu", {}]].
+
+    python batch.py "scans/**/*.png" -o out --pipeline "gray+adaptive_mean:block_size=51,C=10"
+    python batch.py "scans/*.jpg" -o out --pipeline "gray+global_otsu" --processes 4
+    python batch.py "scans/*.tif" -o out --pipeline "sharpen_laplacian:strength=0.3" --format jpg
+
+Файлы раздаются процессам порциями. Внутри процесса следующие файлы
+декодируются заранее, а запись результата идет в отдельном потоке, пока
+считается следующий файл. Файлы, для которых уже есть результат новее
+исходника, пропускаются (если не указан --overwrite).
+"""
+import argparse
+import ast
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from image_processing import ImageProcessor, Pipeline
+
+
+def parse_value(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_pipeline(spec):
+    """Список стадий (имя, параметры) из строки, JSON-строки или JSON-файла"""
+    if os.path.isfile(spec):
+        with open(spec, encoding="utf-8") as f:
+            stages = json.load(f)
+    elif spec.lstrip().startswith("["):
+        stages = json.loads(spec)
+    else:
+        stages = []
+        for part in spec.split("+"):
+            name, _, params = part.strip().partition(":")
+            values = {}
+            for item in filter(None, params.split(",")):
+                key, _, value = item.partition("=")
+                values[key.strip()] = parse_value(value.strip())
+            stages.append((name, values))
+
+    stages = [(name, dict(params)) for name, params in stages]
+    for name, _ in stages:
+        if name not in Pipeline.OPERATIONS:
+            raise ValueError(f"неизвестная стадия {name!r}; доступны: {', '.join(Pipeline.OPERATIONS)}")
+    return stages
+
+
+def collect_inputs(patterns):
+    files = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        files.update(os.path.abspath(path) for path in matches if os.path.isfile(path))
+    return sorted(files)
+
+
+def plan_outputs(files, output, extension, overwrite):
+    """Пары (исходник, результат) и число пропущенных: структура папок повторяет исходную.
+
+    Исходники, отличающиеся только расширением (a.png и a.jpg), сохраняют его в
+    имени результата (a.png.png, a.jpg.png), чтобы не записать один поверх другого.
+    """
+    base = os.path.commonpath([os.path.dirname(path) for path in files])
+    stems = {}
+    for path in files:
+        relative = os.path.splitext(os.path.relpath(path, base))[0]
+        stems.setdefault(os.path.normcase(relative), []).append(path)
+
+    items, skipped, sources = [], 0, {}
+    for path in files:
+        relative, source_extension = os.path.splitext(os.path.relpath(path, base))
+        if len(stems[os.path.normcase(relative)]) > 1:
+            relative += source_extension
+        target = os.path.join(output, f"{relative}.{extension}")
+        # Совпадение возможно и после добавления расширения (a.jpg.png рядом с a.jpg и a.png)
+        other = sources.setdefault(os.path.normcase(target), path)
+        if other != path:
+            raise ValueError(f"{other} и {path} дают один и тот же результат {target}")
+        if not overwrite and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+            skipped += 1
+            continue
+        items.append((path, target))
+    return items, skipped
+
+
+def read_file(path):
+    started = time.perf_counter()
+    image = ImageProcessor.read_image(path)
+    return image, time.perf_counter() - started
+
+
+def write_file(path, image):
+    """Запись через временный файл: прерванный запуск не оставит результат, который сочтут готовым"""
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    root, extension = os.path.splitext(path)
+    temporary = f"{root}.part{extension}"
+    if not ImageProcessor.save_image(temporary, image):
+        raise OSError(f"не удалось записать {path}")
+    os.replace(temporary, path)
+    return time.perf_counter() - started
+
+
+def init_worker(tile_workers):
+    # Параллельность дают процессы; потоков для плиток в каждом - сколько задано
+    ImageProcessor.TILE_WORKERS = tile_workers
+
+
+def process_chunk(items, stages, prefetch):
+    """Обработка порции файлов: (исходник, результат) -> статистика по каждому файлу"""
+    pipeline = Pipeline(stages)
+    results, writes = [], []
+    with ThreadPoolExecutor(max_workers=1) as decoder, ThreadPoolExecutor(max_workers=1) as encoder:
+        reads = deque(decoder.submit(read_file, path) for path, _ in items[:prefetch])
+        for index, (path, target) in enumerate(items):
+            read = reads.popleft()
+            if index + prefetch < len(items):
+                reads.append(decoder.submit(read_file, items[index + prefetch][0]))
+
+            stat = {"path": path}
+            results.append(stat)
+            try:
+                stat["input_bytes"] = os.path.getsize(path)
+                image, stat["decode"] = read.result()
+                stat["pixels"] = image.shape[0] * image.shape[1]
+                started = time.perf_counter()
+                result = pipeline.run(image)
+                stat["compute"] = time.perf_counter() - started
+                writes.append((stat, encoder.submit(write_file, target, result)))
+            except Exception as e:
+                stat["error"] = f"{type(e).__name__}: {e}"
+
+        for stat, write in writes:
+            try:
+                stat["encode"] = write.result()
+            except Exception as e:
+                stat["error"] = f"{type(e).__name__}: {e}"
+    return results
+
+
+def chunks(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def run_batch(items, stages, processes, tile_workers, chunk_size, prefetch):
+    """Генератор статистики по файлам в порядке готовности порций"""
+    if processes <= 1:
+        init_worker(tile_workers)
+        for chunk in chunks(items, chunk_size):
+            yield from process_chunk(chunk, stages, prefetch)
+        return
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                             initializer=init_worker, initargs=(tile_workers,)) as pool:
+        futures = [pool.submit(process_chunk, chunk, stages, prefetch) for chunk in chunks(items, chunk_size)]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def print_report(stats, skipped, elapsed):
+    done = [stat for stat in stats if "error" not in stat]
+    errors = [stat for stat in stats if "error" in stat]
+    megapixels = sum(stat["pixels"] for stat in done) / 1e6
+    megabytes = sum(stat["input_bytes"] for stat in done) / (1024 * 1024)
+    print(f"Обработано: {len(done)}, пропущено готовых: {skipped}, ошибок: {len(errors)}, "
+          f"время: {elapsed:.1f} с")
+    if done and elapsed > 0:
+        print(f"Пропускная способность: {len(done) / elapsed:.2f} файлов/с, "
+              f"{megapixels / elapsed:.1f} Мпикс/с, {megabytes / elapsed:.1f} МБ/с")
+        # Время этапов суммируется по всем процессам и потокам
+        for phase, title in (("decode", "декодирование"), ("compute", "обработка"), ("encode", "запись")):
+            mean = sum(stat[phase] for stat in done) / len(done)
+            print(f"  {title}: {mean * 1000:.1f} мс на файл")
+    for stat in errors[:20]:
+        print(f"Ошибка: {stat['path']}: {stat['error']}")
+    if len(errors) > 20:
+        print(f"... и еще {len(errors) - 20}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная обработка изображений lab3")
+    parser.add_argument("inputs", nargs="+", help="файлы или шаблоны (** - с подпапками)")
+    parser.add_argument("-o", "--output", required=True, help="папка для результатов")
+    parser.add_argument("--pipeline", required=True,
+                        help='стадии, например "gray+adaptive_mean:block_size=51,C=10", или JSON-файл')
+    parser.add_argument("--format", default="png", help="расширение результатов (по умолчанию png)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="число процессов")
+    parser.add_argument("--threads", type=int, default=1, help="потоков для плиток в каждом процессе")
+    parser.add_argument("--chunk", type=int, default=8, help="файлов в одной порции для процесса")
+    parser.add_argument("--prefetch", type=int, default=2, help="сколько файлов декодировать заранее")
+    parser.add_argument("--overwrite", action="store_true", help="обрабатывать и уже готовые файлы")
+    args = parser.parse_args()
+
+    try:
+        import PIL.Image  # noqa: F401
+    except ImportError:
+        # Без Pillow read_image возвращает заглушку, а не содержимое файла
+        parser.error("для пакетной обработки нужен Pillow")
+    try:
+        stages = parse_pipeline(args.pipeline)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    files = collect_inputs(args.inputs)
+    if not files:
+        parser.error("не найдено ни одного файла")
+    try:
+        items, skipped = plan_outputs(files, args.output, args.format.lstrip("."), args.overwrite)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Файлов: {len(files)}, к обработке: {len(items)}, конвейер: "
+          + " -> ".join(name for name, _ in stages))
+
+    started = time.perf_counter()
+    last_report = started
+    stats = []
+    for stat in run_batch(items, stages, args.processes, args.threads, args.chunk, max(1, args.prefetch)):
+        stats.append(stat)
+        now = time.perf_counter()
+        if now - last_report >= 2:
+            print(f"  {len(stats)}/{len(items)}, {len(stats) / (now - started):.2f} файлов/с")
+            last_report = now
+
+    print_report(stats, skipped, time.perf_counter() - started)
+    sys.exit(1 if any("error" in stat for stat in stats) else 0)
+
+
+if __name__ == "__main__":
+    main()
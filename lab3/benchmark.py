@@ -0,0 +1,691 @@
+"""Сравнение реализаций ImageProcessor с прежними (по времени и по результату).
+
+Прежние реализации сохранены здесь без изменений. Для операций, которые
+обязаны совпадать с прежними побитово, расхождение считается ошибкой, и
+скрипт завершается с ненулевым кодом.
+
+    python benchmark.py
+    python benchmark.py --only resize --size 1600x1200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from image_processing import ImageData, ImageProcessor, Job, JobCancelled, Pipeline, StageCache
+
+
+def legacy_resize_image(image, new_size):
+    h, w = image.shape[:2]
+    new_h, new_w = new_size
+
+    if len(image.shape) == 3:
+        resized = np.zeros((new_h, new_w, image.shape[2]), dtype=image.dtype)
+        for y in range(new_h):
+            for x in range(new_w):
+                src_y = y * (h - 1) / (new_h - 1) if new_h > 1 else 0
+                src_x = x * (w - 1) / (new_w - 1) if new_w > 1 else 0
+
+                y1 = int(src_y)
+                x1 = int(src_x)
+
+                dy = src_y - y1
+                dx = src_x - x1
+
+                y1 = min(y1, h - 1)
+                x1 = min(x1, w - 1)
+                y2 = min(y1 + 1, h - 1)
+                x2 = min(x1 + 1, w - 1)
+
+                for c in range(image.shape[2]):
+                    value = (image[y1, x1, c] * (1 - dx) * (1 - dy) +
+                            image[y1, x2, c] * dx * (1 - dy) +
+                            image[y2, x1, c] * (1 - dx) * dy +
+                            image[y2, x2, c] * dx * dy)
+                    resized[y, x, c] = int(np.clip(value, 0, 255))
+    else:
+        resized = np.zeros((new_h, new_w), dtype=image.dtype)
+        for y in range(new_h):
+            for x in range(new_w):
+                src_y = y * (h - 1) / (new_h - 1) if new_h > 1 else 0
+                src_x = x * (w - 1) / (new_w - 1) if new_w > 1 else 0
+
+                y1 = int(src_y)
+                x1 = int(src_x)
+
+                dy = src_y - y1
+                dx = src_x - x1
+
+                y1 = min(y1, h - 1)
+                x1 = min(x1, w - 1)
+                y2 = min(y1 + 1, h - 1)
+                x2 = min(x1 + 1, w - 1)
+
+                value = (image[y1, x1] * (1 - dx) * (1 - dy) +
+                        image[y1, x2] * dx * (1 - dy) +
+                        image[y2, x1] * (1 - dx) * dy +
+                        image[y2, x2] * dx * dy)
+                resized[y, x] = int(np.clip(value, 0, 255))
+
+    return resized
+
+
+def legacy_adaptive_threshold_mean(image, block_size=11, C=2):
+    if len(image.shape) == 3:
+        gray = ImageProcessor.convert_color(image, "BGR2GRAY")
+    else:
+        gray = image.copy()
+
+    if block_size % 2 == 0:
+        block_size += 1
+
+    height, width = gray.shape
+    half_block = block_size // 2
+
+    result = np.zeros_like(gray)
+
+    padded = np.zeros((height + 2 * half_block, width + 2 * half_block), dtype=gray.dtype)
+
+    padded[half_block:half_block+height, half_block:half_block+width] = gray
+
+    for i in range(half_block):
+        padded[i, half_block:half_block+width] = gray[half_block-i, :]
+
+    for i in range(half_block):
+        padded[height+half_block+i, half_block:half_block+width] = gray[height-2-i, :]
+
+    for i in range(half_block):
+        padded[:, i] = padded[:, 2*half_block - i]
+
+    for i in range(half_block):
+        padded[:, width+half_block+i] = padded[:, width+half_block-i-2]
+
+    for y in range(height):
+        for x in range(width):
+            window = padded[y:y+block_size, x:x+block_size]
+
+            mean_value = np.mean(window)
+
+            if gray[y, x] > (mean_value - C):
+                result[y, x] = 255
+
+    return result
+
+
+def legacy_global_threshold_otsu(image):
+    if len(image.shape) == 3:
+        gray = ImageProcessor.convert_color(image, "BGR2GRAY")
+    else:
+        gray = image.copy()
+
+    histogram = np.zeros(256, dtype=np.float32)
+    total_pixels = gray.size
+
+    for i in range(gray.shape[0]):
+        for j in range(gray.shape[1]):
+            histogram[gray[i, j]] += 1
+
+    histogram /= total_pixels
+
+    best_threshold = 0
+    best_variance = 0.0
+
+    for threshold in range(1, 256):
+        w0 = np.sum(histogram[:threshold])
+        w1 = np.sum(histogram[threshold:])
+
+        if w0 < 1e-10 or w1 < 1e-10:
+            continue
+
+        mean0 = np.sum(np.arange(threshold) * histogram[:threshold]) / w0
+        mean1 = np.sum(np.arange(threshold, 256) * histogram[threshold:]) / w1
+
+        variance = w0 * w1 * (mean0 - mean1) ** 2
+
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = threshold
+
+    result = np.zeros_like(gray)
+    result[gray > best_threshold] = 255
+
+    return result
+
+
+def legacy_global_threshold_iterative(image, max_iterations=100, tolerance=1, progress_callback=None):
+    if len(image.shape) == 3:
+        gray = ImageProcessor.convert_color(image, "BGR2GRAY")
+    else:
+        gray = image.copy()
+
+    threshold = np.mean(gray)
+
+    for i in range(max_iterations):
+        if progress_callback:
+            progress_callback(int((i / max_iterations) * 100))
+
+        foreground = gray[gray > threshold]
+        background = gray[gray <= threshold]
+
+        if foreground.size == 0 or background.size == 0:
+            break
+
+        mean_foreground = np.mean(foreground)
+        mean_background = np.mean(background)
+
+        new_threshold = (mean_foreground + mean_background) / 2
+
+        if abs(new_threshold - threshold) < tolerance:
+            break
+
+        threshold = new_threshold
+
+    result = np.zeros_like(gray)
+    result[gray > threshold] = 255
+
+    return result, threshold
+
+
+def legacy_sharpen_filter_laplacian(image, strength=1.0):
+    strength = float(np.clip(strength, 0.01, 1.0))
+
+    base_kernel = np.array([[0, -1, 0],
+                            [-1, 5, -1],
+                            [0, -1, 0]], dtype=np.float32)
+
+    identity_kernel = np.array([[0, 0, 0],
+                                [0, 1, 0],
+                                [0, 0, 0]], dtype=np.float32)
+
+    kernel = (1.0 - strength) * identity_kernel + strength * base_kernel
+
+    if len(image.shape) == 3:
+        h, w, ch = image.shape
+
+        padded = np.zeros((h + 2, w + 2, ch), dtype=np.float32)
+        padded[1:-1, 1:-1, :] = image.astype(np.float32)
+
+        padded[0, 1:-1, :] = image[1, :, :]
+        padded[-1, 1:-1, :] = image[-2, :, :]
+        padded[1:-1, 0, :] = image[:, 1, :]
+        padded[1:-1, -1, :] = image[:, -2, :]
+        padded[0, 0, :] = image[1, 1, :]
+        padded[0, -1, :] = image[1, -2, :]
+        padded[-1, 0, :] = image[-2, 1, :]
+        padded[-1, -1, :] = image[-2, -2, :]
+
+        dst = np.zeros((h, w, ch), dtype=np.float32)
+
+        for c in range(ch):
+            channel = padded[:, :, c]
+            dst[:, :, c] = (
+                kernel[0, 0] * channel[0:-2, 0:-2] +
+                kernel[0, 1] * channel[0:-2, 1:-1] +
+                kernel[0, 2] * channel[0:-2, 2:] +
+                kernel[1, 0] * channel[1:-1, 0:-2] +
+                kernel[1, 1] * channel[1:-1, 1:-1] +
+                kernel[1, 2] * channel[1:-1, 2:] +
+                kernel[2, 0] * channel[2:, 0:-2] +
+                kernel[2, 1] * channel[2:, 1:-1] +
+                kernel[2, 2] * channel[2:, 2:]
+            )
+
+        dst = np.clip(dst, 0, 255).astype(np.uint8)
+        return dst
+    else:
+        h, w = image.shape
+        gray = image.astype(np.float32)
+
+        padded = np.zeros((h + 2, w + 2), dtype=np.float32)
+        padded[1:-1, 1:-1] = gray
+
+        padded[0, 1:-1] = gray[1, :]
+        padded[-1, 1:-1] = gray[-2, :]
+        padded[1:-1, 0] = gray[:, 1]
+        padded[1:-1, -1] = gray[:, -2]
+        padded[0, 0] = gray[1, 1]
+        padded[0, -1] = gray[1, -2]
+        padded[-1, 0] = gray[-2, 1]
+        padded[-1, -1] = gray[-2, -2]
+
+        dst = (
+            kernel[0, 0] * padded[0:-2, 0:-2] +
+            kernel[0, 1] * padded[0:-2, 1:-1] +
+            kernel[0, 2] * padded[0:-2, 2:] +
+            kernel[1, 0] * padded[1:-1, 0:-2] +
+            kernel[1, 1] * padded[1:-1, 1:-1] +
+            kernel[1, 2] * padded[1:-1, 2:] +
+            kernel[2, 0] * padded[2:, 0:-2] +
+            kernel[2, 1] * padded[2:, 1:-1] +
+            kernel[2, 2] * padded[2:, 2:]
+        )
+
+        dst = np.clip(dst, 0, 255).astype(np.uint8)
+        return dst
+
+
+def test_image(width, height, seed=0):
+    """Воспроизводимое BGR-изображение: неравномерная освещенность, текстура и шум"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    light = 90 + 110 * np.exp(-((x - width * 0.3) ** 2 + (y - height * 0.4) ** 2) / (0.5 * width * height))
+    stripes = 40 * (np.sin(x / 7.0) * np.cos(y / 11.0) > 0.3)
+    noise = rng.normal(0, 12, (height, width, 3))
+    image = light[..., None] - stripes[..., None] + noise + np.array([0, 10, -10])
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def timed(function, *args, repeat=1):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def compare(name, legacy, current, args, exact=False, repeat=1):
+    """Строка отчета; при exact расхождение с прежней реализацией - ошибка"""
+    old, old_time = timed(legacy, *args)
+    new, new_time = timed(current, *args, repeat=repeat)
+    old_array, new_array = np.asarray(old), np.asarray(new)
+    if old_array.shape != new_array.shape:
+        raise AssertionError(f"{name}: форма {new_array.shape} вместо {old_array.shape}")
+    diff = np.abs(old_array.astype(np.float64) - new_array.astype(np.float64))
+    differing = float(np.mean(diff > 0)) * 100
+    ok = not exact or differing == 0
+    print(f"{name:<34}{old_time:>10.3f}{new_time:>10.4f}{old_time / new_time:>10.0f}x"
+          f"{diff.max():>10.0f}{differing:>10.3f}%  {'OK' if ok else 'РАСХОЖДЕНИЕ'}")
+    return ok
+
+
+def bench_resize(image, args):
+    h, w = image.shape[:2]
+    results = []
+    for new_size in [(h // 2, w // 2), (int(h * 0.37), int(w * 0.37)), (h * 5 // 4, w * 5 // 4)]:
+        results.append(compare(f"resize {w}x{h} -> {new_size[1]}x{new_size[0]}",
+                               legacy_resize_image, ImageProcessor.resize_image,
+                               (image, new_size), repeat=args.repeat))
+    # Сценарий open_image: фотография 20 Мп уменьшается до 1024 по большей стороне
+    photo = test_image(5472, 3648, seed=1)
+    _, elapsed = timed(ImageProcessor.resize_image, photo, (682, 1024), repeat=args.repeat)
+    print(f"resize 5472x3648 -> 1024x682 (только новая): {elapsed:.3f} с")
+    return all(results)
+
+
+def bench_adaptive(image, args):
+    results = []
+    for block_size, C in [(3, 0), (11, 2), (30, 7)]:
+        results.append(compare(f"adaptive_mean block={block_size} C={C}",
+                               legacy_adaptive_threshold_mean, ImageProcessor.adaptive_threshold_mean,
+                               (image, block_size, C), exact=True, repeat=args.repeat))
+    # Побитовое совпадение на мелких изображениях нечетных размеров и всех размерах блока
+    for block_size in range(3, 32, 2):
+        small = test_image(37 + block_size, 23 + block_size, seed=block_size)
+        results.append(np.array_equal(legacy_adaptive_threshold_mean(small, block_size, 5),
+                                      ImageProcessor.adaptive_threshold_mean(small, block_size, 5)))
+    print(f"adaptive_mean, блоки 3..31 на мелких изображениях: "
+          f"{'OK' if all(results[3:]) else 'РАСХОЖДЕНИЕ'}")
+    return all(results)
+
+
+def bench_otsu(image, args):
+    ok = compare("global_otsu", legacy_global_threshold_otsu, ImageProcessor.global_threshold_otsu,
+                 (image,), exact=True, repeat=args.repeat)
+    # Порог на разных распределениях: двумодальные, узкие, с пустыми корзинами, константа
+    rng = np.random.default_rng(7)
+    cases = [test_image(97, 61, seed=seed) for seed in range(10)]
+    cases += [np.clip(rng.normal(mean, spread, (50, 80)), 0, 255).astype(np.uint8)
+              for mean, spread in [(30, 3), (128, 60), (220, 1)]]
+    cases += [np.full((20, 20), 77, np.uint8), (rng.integers(0, 2, (40, 40)) * 200).astype(np.uint8)]
+    same = all(np.array_equal(legacy_global_threshold_otsu(case), ImageProcessor.global_threshold_otsu(case))
+               for case in cases)
+    print(f"global_otsu на {len(cases)} распределениях: {'OK' if same else 'РАСХОЖДЕНИЕ'}")
+    big = np.random.default_rng(0).integers(0, 256, (10000, 10000), dtype=np.uint8)
+    _, elapsed = timed(ImageProcessor.global_threshold_otsu, big, repeat=args.repeat)
+    print(f"global_otsu 100 Мп, полутоновое (только новая): {elapsed:.3f} с")
+    return ok and same
+
+
+def bench_iterative(image, args):
+    ok = compare("global_iterative", lambda *a: legacy_global_threshold_iterative(*a)[0],
+                 lambda *a: ImageProcessor.global_threshold_iterative(*a)[0],
+                 (image,), exact=True, repeat=args.repeat)
+    # Порог (не только маска) должен совпадать, в том числе при малом допуске и без итераций
+    rng = np.random.default_rng(11)
+    cases = [test_image(97, 61, seed=seed) for seed in range(10)]
+    cases += [np.clip(rng.normal(mean, spread, (50, 80)), 0, 255).astype(np.uint8)
+              for mean, spread in [(30, 3), (128, 60), (220, 1)]]
+    cases += [np.full((20, 20), 77, np.uint8), (rng.integers(0, 2, (40, 40)) * 200).astype(np.uint8)]
+    same = True
+    for case in cases:
+        for max_iterations, tolerance in [(100, 1), (100, 1e-9), (3, 0.5), (0, 1)]:
+            old = legacy_global_threshold_iterative(case, max_iterations, tolerance)
+            new = ImageProcessor.global_threshold_iterative(case, max_iterations, tolerance)
+            same = same and old[1] == new[1] and np.array_equal(old[0], new[0])
+    print(f"global_iterative: порог и маска на {len(cases)} распределениях: {'OK' if same else 'РАСХОЖДЕНИЕ'}")
+    big = np.random.default_rng(0).integers(0, 256, (10000, 10000), dtype=np.uint8)
+    _, elapsed = timed(ImageProcessor.global_threshold_iterative, big, repeat=args.repeat)
+    print(f"global_iterative 100 Мп, полутоновое (только новая): {elapsed:.3f} с")
+    return ok and same
+
+
+def reference_filter2d(image, kernel):
+    """Прямая корреляция в float64 по определению - эталон для filter2d"""
+    kh, kw = kernel.shape
+    pad = [(kh // 2, kh // 2), (kw // 2, kw // 2)] + [(0, 0)] * (image.ndim - 2)
+    padded = np.pad(image.astype(np.float64), pad, mode='reflect')
+    h, w = image.shape[:2]
+    result = np.zeros(image.shape)
+    for dy in range(kh):
+        for dx in range(kw):
+            result += float(kernel[dy, dx]) * padded[dy:dy + h, dx:dx + w]
+    return result
+
+
+def bench_convolution(image, args):
+    gray = ImageProcessor.convert_color(image, "BGR2GRAY")
+    results = []
+    for strength in (0.01, 0.2, 0.5, 1.0):
+        for name, source in (("BGR", image), ("gray", gray)):
+            results.append(compare(f"laplacian {name} strength={strength}",
+                                   legacy_sharpen_filter_laplacian, ImageProcessor.sharpen_filter_laplacian,
+                                   (source, strength), exact=True, repeat=args.repeat))
+    same = all(np.array_equal(legacy_sharpen_filter_laplacian(small, 0.7),
+                              ImageProcessor.sharpen_filter_laplacian(small, 0.7))
+               for small in (test_image(width, height, seed=width) for width, height in [(2, 2), (3, 5), (17, 4)]))
+    print(f"laplacian на мелких изображениях: {'OK' if same else 'РАСХОЖДЕНИЕ'}")
+    results.append(same)
+
+    # Все пути filter2d (прямой, разделимый, БПФ) против эталона в float64
+    rng = np.random.default_rng(5)
+    kernels = {
+        "3x3": rng.normal(size=(3, 3)),
+        "4x6 четное": rng.normal(size=(4, 6)),
+        "7x5 ранга 1": np.outer(rng.normal(size=7), rng.normal(size=5)),
+        "9x9 (БПФ)": rng.normal(size=(9, 9)),
+        "гаусс 8 (БПФ)": np.outer(ImageProcessor.gaussian_kernel(8), ImageProcessor.gaussian_kernel(8)),
+    }
+    small = test_image(61, 43, seed=3)
+    for name, kernel in kernels.items():
+        kernel = kernel.astype(np.float32)
+        expected = reference_filter2d(small, kernel)
+        error = np.abs(ImageProcessor.filter2d(small, kernel) - expected).max() / np.abs(expected).max()
+        results.append(error < 1e-5)
+        print(f"filter2d {name}: относительная ошибка {error:.1e}  {'OK' if error < 1e-5 else 'РАСХОЖДЕНИЕ'}")
+
+    photo = test_image(5472, 3648, seed=1)
+    for name, function, extra in [("laplacian", ImageProcessor.sharpen_filter_laplacian, (0.5,)),
+                                  ("box 5", ImageProcessor.box_filter, (5,)),
+                                  ("gaussian sigma=1.5", ImageProcessor.gaussian_blur, (1.5,)),
+                                  ("gaussian sigma=12 (БПФ)", ImageProcessor.gaussian_blur, (12,)),
+                                  ("unsharp sigma=2", ImageProcessor.unsharp_mask, (2.0, 1.0))]:
+        _, elapsed = timed(function, photo, *extra, repeat=args.repeat)
+        print(f"{name} 5472x3648 BGR (только новая): {elapsed:.3f} с")
+    return all(results)
+
+
+def bench_tiles(image, args):
+    """Масштабирование плиточной обработки по числу потоков; результат не должен зависеть от него"""
+    photo = test_image(5472, 3648, seed=1)
+    gray = ImageProcessor.convert_color(photo, "BGR2GRAY")
+    operations = [
+        ("BGR2GRAY", lambda: ImageProcessor.convert_color(photo, "BGR2GRAY")),
+        ("global_manual", lambda: ImageProcessor.global_threshold_manual(gray, 127)),
+        ("adaptive_mean block=31", lambda: ImageProcessor.adaptive_threshold_mean(gray, 31, 5)),
+        ("laplacian BGR", lambda: ImageProcessor.sharpen_filter_laplacian(photo, 0.5)),
+        ("gaussian sigma=12 (БПФ)", lambda: ImageProcessor.gaussian_blur(photo, 12)),
+    ]
+    counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    print(f"{'плитки, 5472x3648':<28}" + "".join(f"{f'{count} пот., с':>12}" for count in counts))
+    saved = ImageProcessor.TILE_WORKERS
+    ok = True
+    try:
+        for name, operation in operations:
+            reference, times = None, []
+            for count in counts:
+                ImageProcessor.TILE_WORKERS = count
+                result, elapsed = timed(operation, repeat=args.repeat)
+                times.append(elapsed)
+                if reference is None:
+                    reference = result
+                else:
+                    ok = ok and np.array_equal(reference, result)
+            print(f"{name:<28}" + "".join(f"{elapsed:>12.3f}" for elapsed in times))
+    finally:
+        ImageProcessor.TILE_WORKERS = saved
+    print(f"результат не зависит от числа потоков: {'OK' if ok else 'РАСХОЖДЕНИЕ'}")
+    return ok
+
+
+def bench_pipeline(image, args):
+    """Кеш стадий: смена параметра поздней стадии пересчитывает только ее"""
+    photo = test_image(5472, 3648, seed=1)
+    key = Pipeline.image_key(photo)
+    cache = StageCache(max_bytes=64 * 1024 * 1024)
+    direct = ImageProcessor.adaptive_threshold_mean(photo, 31, 5)
+    started = time.perf_counter()
+    first = Pipeline([("gray", {}), ("adaptive_mean", {"block_size": 31, "C": 5})], cache).run(photo, key)
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    Pipeline([("gray", {}), ("adaptive_mean", {"block_size": 31, "C": 6})], cache).run(photo, key)
+    changed = time.perf_counter() - started
+    started = time.perf_counter()
+    again = Pipeline([("gray", {}), ("adaptive_mean", {"block_size": 31, "C": 5})], cache).run(photo, key)
+    hit = time.perf_counter() - started
+    print(f"конвейер gray -> adaptive_mean 5472x3648: без кеша {cold:.3f} с, другой C {changed:.3f} с, "
+          f"повтор {hit * 1000:.1f} мс")
+    ok = np.array_equal(first, direct) and again is first
+    # Вытеснение: при переполнении уходит запись, к которой дольше всего не обращались
+    small = StageCache(max_bytes=250)
+    for name in "abc":
+        small.put(name, name, 100)
+        small.get("a")
+    ok = ok and list(small.entries) == ["c", "a"] and small.size == 200
+    print(f"кеш: {len(cache.entries)} записей, {cache.size / 2 ** 20:.0f} МБ из {cache.max_bytes / 2 ** 20:.0f}  "
+          f"{'OK' if ok else 'РАСХОЖДЕНИЕ'}")
+    return ok
+
+
+def bench_preview(image, args):
+    """Задержка предпросмотра: последняя стадия на уровне пирамиды размером с область просмотра"""
+    photo = test_image(5472, 3648, seed=1)
+    started = time.perf_counter()
+    pyramid = ImageProcessor.build_pyramid(photo)
+    print(f"пирамида 5472x3648: {len(pyramid)} уровней за {time.perf_counter() - started:.3f} с")
+    cache = StageCache()
+    ok = True
+    for viewport in (512, 1024):
+        level = next(level for level in pyramid if max(level.shape[:2]) <= viewport)
+        key = Pipeline.image_key(level)
+        scale = level.shape[1] / photo.shape[1]
+        Pipeline([("gray", {})], cache).run(level, key)
+        # (стадии, параметр последней стадии, который меняет ползунок, шаг)
+        for stages, varied, step in (([("gray", {}), ("global_manual", {"threshold": 120})], "threshold", 1),
+                                     ([("gray", {}), ("adaptive_mean", {"block_size": max(3, int(51 * scale) | 1),
+                                                                        "C": 4})], "C", 1),
+                                     ([("sharpen_laplacian", {"strength": 0.4})], "strength", 0.01),
+                                     ([("sharpen_unsharp", {"strength": 0.4, "sigma": 2.0 * scale})], "strength", 0.01)):
+            # Каждое перемещение ползунка - новое значение, то есть промах кеша для последней стадии
+            name, params = stages[-1]
+            times = []
+            for index in range(max(3, args.repeat)):
+                moved = dict(params, **{varied: params[varied] + index * step})
+                started = time.perf_counter()
+                Pipeline(stages[:-1] + [(name, moved)], cache).run(level, key)
+                times.append(time.perf_counter() - started)
+            best = min(times) * 1000
+            ok = ok and best < 30
+            print(f"предпросмотр {name:<18} {level.shape[1]}x{level.shape[0]}: {best:.1f} мс"
+                  f"  {'OK' if best < 30 else 'МЕДЛЕННО'}")
+    return ok
+
+
+def bench_jobs(image, args):
+    """Прогресс заданий не убывает и доходит до 100; отмена срабатывает на ближайшей контрольной точке"""
+    photo = test_image(5472, 3648, seed=1)
+    ok = True
+    for stages in ([("gray", {}), ("global_otsu", {})],
+                   [("gray", {}), ("global_iterative", {})],
+                   [("gray", {}), ("adaptive_mean", {"block_size": 51, "C": 4})],
+                   [("gray", {}), ("adaptive_sauvola", {"block_size": 101, "k": 0.3})],
+                   [("sharpen_laplacian", {"strength": 0.4})],
+                   [("sharpen_unsharp", {"strength": 0.4, "sigma": 6.0})]):
+        name = stages[-1][0]
+        expected = Pipeline(stages).run(photo)
+        progress = []
+        with Job(progress.append).running():
+            result = Pipeline(stages).run(photo)
+        monotonic = progress == sorted(progress) and progress[-1] == 100
+        
+        # Отмена из другого потока, как кнопка "Отмена" в интерфейсе
+        job, outcome = Job(), []
+        
+        def work():
+            try:
+                with job.running():
+                    Pipeline(stages).run(photo)
+                outcome.append("завершено")
+            except JobCancelled:
+                outcome.append(time.perf_counter())
+        
+        worker = threading.Thread(target=work)
+        worker.start()
+        time.sleep(0.1)
+        cancelled_at = time.perf_counter()
+        job.cancel()
+        worker.join()
+        latency = outcome[0] - cancelled_at if outcome[0] != "завершено" else None
+        
+        same = np.array_equal(expected, result)
+        ok = ok and same and monotonic
+        print(f"задание {name:<18} прогресс: {len(progress)} шагов, {'OK' if monotonic else 'УБЫВАЕТ'}; "
+              f"результат {'OK' if same else 'РАСХОЖДЕНИЕ'}; отмена: "
+              + (f"{latency * 1000:.0f} мс" if latency is not None else "задание успело завершиться"))
+    return ok
+
+
+def bench_local(image, args):
+    """Ниблэк, Саувола и гауссово среднее: совпадение с расчетом по окнам и время для окон 51..151"""
+    from numpy.lib.stride_tricks import sliding_window_view
+    ok = True
+    for block_size in (3, 11, 31, 51):
+        small = test_image(97 + block_size, 61 + block_size, seed=block_size)
+        gray = ImageProcessor.convert_color(small, "BGR2GRAY")
+        windows = sliding_window_view(np.pad(gray, block_size // 2, mode='reflect').astype(np.float64),
+                                      (block_size, block_size))
+        mean, std = windows.mean(axis=(2, 3)), windows.std(axis=(2, 3))
+        sigma = 0.3 * ((block_size - 1) * 0.5 - 1) + 0.8
+        kernel = ImageProcessor.gaussian_kernel(sigma, block_size).astype(np.float64)
+        weighted = reference_filter2d(gray, np.outer(kernel, kernel))
+        for expected, current in ((mean - 0.3 * std, ImageProcessor.adaptive_threshold_niblack(small, block_size, 0.3)),
+                                  (mean * (1 + 0.3 * (std / 128 - 1)),
+                                   ImageProcessor.adaptive_threshold_sauvola(small, block_size, 0.3, 128)),
+                                  (weighted - 4, ImageProcessor.adaptive_threshold_gaussian(small, block_size, 4))):
+            ok = ok and np.array_equal(np.where(gray > expected, 255, 0), current)
+    print(f"niblack, sauvola, gaussian на мелких изображениях, блоки 3..51: {'OK' if ok else 'РАСХОЖДЕНИЕ'}")
+    
+    # Время на пиксель не должно расти с окном
+    photo = ImageProcessor.convert_color(test_image(5472, 3648, seed=1), "BGR2GRAY")
+    print(f"{'5472x3648, окно':<34}" + "".join(f"{block_size:>10}" for block_size in (11, 51, 101, 151)))
+    for name, method in (("adaptive_mean", ImageProcessor.adaptive_threshold_mean),
+                         ("adaptive_gaussian", ImageProcessor.adaptive_threshold_gaussian),
+                         ("adaptive_niblack", ImageProcessor.adaptive_threshold_niblack),
+                         ("adaptive_sauvola", ImageProcessor.adaptive_threshold_sauvola)):
+        times = [timed(method, photo, block_size, repeat=args.repeat)[1] for block_size in (11, 51, 101, 151)]
+        print(f"{name + ', с':<34}" + "".join(f"{elapsed:>10.3f}" for elapsed in times))
+    return ok
+
+
+def legacy_read_image(file_path):
+    from PIL import Image
+    return np.array(Image.open(file_path))[:, :, ::-1]
+
+
+def legacy_save_image(file_path, image):
+    from PIL import Image
+    Image.fromarray(image[:, :, ::-1].copy()).save(file_path)
+
+
+def bench_channels(image, args):
+    """Порядок каналов RGB: те же результаты, что у BGR, без перестановок при чтении и записи"""
+    rgb = ImageData(np.ascontiguousarray(image[:, :, ::-1]), "RGB")
+    ok = True
+    for stages in ([("gray", {})], [("gray", {}), ("global_otsu", {})],
+                   [("gray", {}), ("adaptive_mean", {"block_size": 31, "C": 5})],
+                   [("sharpen_laplacian", {"strength": 0.4})], [("sharpen_unsharp", {"strength": 0.4})]):
+        expected = Pipeline(stages).run(image)
+        result = Pipeline(stages).run(rgb)
+        if result.ndim == 3:
+            ok = ok and ImageData.order(result) == "RGB"
+            result = result[:, :, ::-1]
+        ok = ok and np.array_equal(expected, result)
+    print(f"конвейер на RGB совпадает с BGR: {'OK' if ok else 'РАСХОЖДЕНИЕ'}")
+    
+    try:
+        import PIL.Image  # noqa: F401
+    except ImportError:
+        print("цикл чтение -> обработка -> запись: нужен Pillow, пропущено")
+        return ok
+    # BMP почти не тратит время на кодирование, поэтому видны именно копии
+    photo = test_image(5472, 3648, seed=1)
+    stages = [("sharpen_laplacian", {"strength": 0.4})]
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, "source.bmp")
+        legacy_save_image(source, photo)
+        cycles = {
+            "old": lambda: legacy_save_image(os.path.join(folder, "old.bmp"),
+                                             Pipeline(stages).run(legacy_read_image(source))),
+            "new": lambda: ImageProcessor.save_image(os.path.join(folder, "new.bmp"),
+                                                     Pipeline(stages).run(ImageProcessor.read_image(source))),
+        }
+        _, old_time = timed(cycles["old"], repeat=args.repeat)
+        _, new_time = timed(cycles["new"], repeat=args.repeat)
+        with open(os.path.join(folder, "old.bmp"), "rb") as old, open(os.path.join(folder, "new.bmp"), "rb") as new:
+            same = old.read() == new.read()
+    ok = ok and same
+    print(f"цикл чтение -> sharpen_laplacian -> запись 5472x3648 BMP: было {old_time:.3f} с, "
+          f"стало {new_time:.3f} с  {'OK' if same else 'РАСХОЖДЕНИЕ'}")
+    return ok
+
+
+BENCHMARKS = {
+    "resize": bench_resize,
+    "adaptive": bench_adaptive,
+    "otsu": bench_otsu,
+    "iterative": bench_iterative,
+    "convolution": bench_convolution,
+    "tiles": bench_tiles,
+    "pipeline": bench_pipeline,
+    "preview": bench_preview,
+    "jobs": bench_jobs,
+    "local": bench_local,
+    "channels": bench_channels,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк ImageProcessor (lab3)")
+    parser.add_argument("--size", default="640x480",
+                        help="размер тестового изображения ШxВ (прежние реализации медленные)")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов для новых реализаций")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS),
+                        help="запустить только выбранные замеры")
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.lower().split("x"))
+    image = test_image(width, height)
+    print(f"{'операция':<34}{'было, с':>10}{'стало, с':>10}{'ускор.':>11}{'макс.разн':>10}{'доля разн':>11}")
+    ok = True
+    for name in args.only or list(BENCHMARKS):
+        ok = BENCHMARKS[name](image, args) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,949 @@
+"""Обработка изображений lab3 без зависимости от Qt.
+
+Используется интерфейсом (main.py), бенчмарком (benchmark.py) и пакетной
+обработкой (batch.py).
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class JobCancelled(Exception):
+    """Задание отменено; выбрасывается на ближайшей контрольной точке"""
+
+
+class Job:
+    """Отменяемое задание обработки с прогрессом.
+
+    Операции ImageProcessor берут текущее задание потока через Job.current(): между
+    плитками, частями гистограммы и стадиями конвейера они вызывают checkpoint()
+    и сообщают долю выполненной работы через progress(). section() отводит части
+    работы диапазон внутри текущего, так что прогресс всего задания не убывает.
+    """
+    local = threading.local()
+    
+    def __init__(self, progress_callback=None):
+        self.cancel_event = threading.Event()
+        self.progress_callback = progress_callback
+        self.span = (0.0, 100.0)
+        self.reported = -1
+    
+    @staticmethod
+    def current():
+        """Задание текущего потока; вне задания - неотменяемое задание без прогресса"""
+        job = getattr(Job.local, "job", None)
+        return job if job is not None else Job.idle
+    
+    @contextmanager
+    def running(self):
+        previous = getattr(Job.local, "job", None)
+        Job.local.job = self
+        try:
+            yield self
+        finally:
+            Job.local.job = previous
+    
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+    
+    def cancel(self):
+        self.cancel_event.set()
+    
+    def checkpoint(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+    
+    def progress(self, fraction):
+        """Доля 0..1 выполненной работы текущего диапазона"""
+        start, end = self.span
+        value = int(start + (end - start) * min(max(fraction, 0.0), 1.0))
+        if value > self.reported:
+            self.reported = value
+            if self.progress_callback:
+                self.progress_callback(value)
+    
+    @contextmanager
+    def section(self, start, end):
+        """Часть работы с долями start..end текущего диапазона"""
+        outer = self.span
+        low, high = outer
+        self.span = (low + (high - low) * start, low + (high - low) * end)
+        try:
+            yield
+        finally:
+            self.span = outer
+
+
+Job.idle = Job()
+
+
+class ImageData(np.ndarray):
+    """Массив изображения с записанным порядком каналов ("RGB" или "BGR").
+
+    Данные хранятся непрерывно в том порядке, в каком их отдал декодер, и при
+    чтении, сохранении и показе каналы не переставляются. Обычный ndarray с тремя
+    каналами считается BGR, как было принято в lab3 раньше.
+    """
+    def __new__(cls, array, channel_order="RGB"):
+        image = np.asarray(array).view(cls)
+        image.channel_order = channel_order
+        return image
+    
+    def __array_finalize__(self, obj):
+        self.channel_order = getattr(obj, "channel_order", "BGR")
+    
+    def __reduce__(self):
+        # Порядок каналов переживает передачу в другой процесс
+        constructor, args, state = super().__reduce__()
+        return constructor, args, (state, self.channel_order)
+    
+    def __setstate__(self, state):
+        state, self.channel_order = state
+        super().__setstate__(state)
+    
+    @staticmethod
+    def order(image, default="BGR"):
+        """Порядок каналов изображения; у полутонового - GRAY"""
+        if image.ndim != 3:
+            return "GRAY"
+        return image.channel_order if isinstance(image, ImageData) else default
+    
+    @staticmethod
+    def like(result, source):
+        """Результат операции с порядком каналов исходного изображения"""
+        if result.ndim != 3 or ImageData.order(result) == ImageData.order(source):
+            return result
+        return ImageData(result, ImageData.order(source))
+
+
+class ImageProcessor:
+    # Гистограмма считается частями: временный массив индексов bincount остается в кеше
+    HISTOGRAM_CHUNK = 1 << 16
+    # Сторона плитки для многопоточной обработки и число потоков
+    TILE_SIZE = 512
+    TILE_WORKERS = os.cpu_count() or 1
+    # Рабочие массивы плиток, свои у каждого потока (см. thread_buffers)
+    thread_local = threading.local()
+    # Ядро, которому прямым суммированием нужно столько отводов на пиксель, считается через БПФ
+    FFT_MIN_TAPS = 48
+    # Ядро разделимо, если второе сингулярное число меньше первого в столько раз
+    SEPARABLE_TOLERANCE = 1e-6
+    
+    @staticmethod
+    def read_image(file_path):
+        """Чтение изображения из файлa"""
+        try:
+            from PIL import Image
+            img = Image.open(file_path)
+            img_array = np.array(img)
+            
+            if len(img_array.shape) == 3:
+                if img_array.shape[2] == 4:
+                    img_array = np.ascontiguousarray(img_array[:, :, :3])
+                # PIL отдает RGB: порядок записывается, а не переставляется
+                img_array = ImageData(img_array, "RGB")
+            
+            return img_array
+        except ImportError:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            
+            if file_path.lower().endswith('.png'):
+                return ImageProcessor._read_png_simple(data)
+            elif file_path.lower().endswith(('.jpg', '.jpeg')):
+                return ImageProcessor._read_jpeg_simple(data)
+            else:
+                raise ValueError(f"Unsupported image format: {file_path}")
+    
+    @staticmethod
+    def _read_png_simple(data):
+        return np.ones((100, 100, 3), dtype=np.uint8) * 128
+    
+    @staticmethod
+    def _read_jpeg_simple(data):
+        return np.ones((100, 100, 3), dtype=np.uint8) * 128
+    
+    @staticmethod
+    def save_image(file_path, image):
+        """Сохранение изображения в файл"""
+        try:
+            from PIL import Image
+            
+            if ImageData.order(image) == "BGR":
+                img = Image.fromarray(np.ascontiguousarray(image[:, :, ::-1]))
+            else:
+                img = Image.fromarray(np.asarray(image))
+            
+            img.save(file_path)
+            return True
+        except Exception as e:
+            print(f"Error saving image: {e}")
+            return False
+    
+    @staticmethod
+    def convert_color(image, conversion):
+        """Конвертация цветового пространства.
+
+        "BGR2GRAY" и "RGB2GRAY" - перевод в оттенки серого; порядок каналов берется
+        из ImageData, а для обычного массива - из названия преобразования.
+        """
+        if len(image.shape) != 3:
+            return image
+        
+        if conversion in ("BGR2GRAY", "RGB2GRAY"):
+            if image.shape[2] == 3:
+                gray = np.empty(image.shape[:2], dtype=np.uint8)
+                red, blue = (0, 2) if ImageData.order(image, conversion[:3]) == "RGB" else (2, 0)
+                
+                def convert_tile(rows, cols):
+                    tile = image[rows, cols]
+                    gray[rows, cols] = (
+                        0.299 * tile[:, :, red] +
+                        0.587 * tile[:, :, 1] +
+                        0.114 * tile[:, :, blue]
+                    )
+                
+                ImageProcessor.run_tiled(image.shape, convert_tile)
+                return gray
+            else:
+                return image[:, :, 0]
+        
+        elif conversion == "GRAY2BGR":
+            if len(image.shape) == 2:
+                h, w = image.shape
+                bgr = np.zeros((h, w, 3), dtype=np.uint8)
+                bgr[:, :, 0] = image
+                bgr[:, :, 1] = image
+                bgr[:, :, 2] = image
+                return bgr
+        
+        return image
+    
+    @staticmethod
+    def resample_weights(size, new_size):
+        """Индексы и веса отсчетов исходной оси для каждого отсчета новой оси.
+
+        При уменьшении - усреднение по площади: каждый новый пиксель покрывает
+        size / new_size исходных, крайние из них входят с долей покрытия. Иначе -
+        билинейная интерполяция с совмещением крайних пикселей.
+        """
+        if new_size < size:
+            scale = size / new_size
+            taps = int(np.ceil(scale)) + 1
+            start = np.arange(new_size) * scale
+            first = np.floor(start).astype(np.intp)
+            indices = first[:, None] + np.arange(taps)
+            overlap = (np.minimum(start[:, None] + scale, indices + 1) -
+                       np.maximum(start[:, None], indices))
+            weights = np.clip(overlap, 0, None) / scale
+        else:
+            src = np.arange(new_size) * ((size - 1) / (new_size - 1)) if new_size > 1 else np.zeros(1)
+            first = src.astype(np.intp)
+            indices = np.stack([first, first + 1], axis=1)
+            dx = src - first
+            weights = np.stack([1 - dx, dx], axis=1)
+        return np.minimum(indices, size - 1), weights.astype(np.float32)
+    
+    @staticmethod
+    def resize_axis(image, axis, new_size):
+        """Передискретизация вдоль одной оси: взвешенная сумма нескольких сдвигов"""
+        if image.shape[axis] == new_size:
+            return image.astype(np.float32)
+        indices, weights = ImageProcessor.resample_weights(image.shape[axis], new_size)
+        shape = [1] * image.ndim
+        shape[axis] = new_size
+        result = None
+        for k in range(indices.shape[1]):
+            term = np.take(image, indices[:, k], axis=axis) * weights[:, k].reshape(shape)
+            if result is None:
+                result = term
+            else:
+                result += term
+        return result
+    
+    @staticmethod
+    def resize_image(image, new_size):
+        """Изменение размера изображения (сначала по высоте, затем по ширине)"""
+        new_h, new_w = new_size
+        resized = ImageProcessor.resize_axis(image, 0, new_h)
+        resized = ImageProcessor.resize_axis(resized, 1, new_w)
+        return ImageData.like(np.clip(resized, 0, 255).astype(image.dtype), image)
+    
+    @staticmethod
+    def build_pyramid(image, min_size=256):
+        """Уровни с половинным размером (усреднение по площади), пока большая сторона больше min_size"""
+        levels = [image]
+        while max(levels[-1].shape[:2]) > min_size:
+            h, w = levels[-1].shape[:2]
+            levels.append(ImageProcessor.resize_image(levels[-1], (max(1, h // 2), max(1, w // 2))))
+        return levels
+    
+    @staticmethod
+    def gray_histogram(gray):
+        """Гистограмма яркости (256 корзин)"""
+        job = Job.current()
+        flat = gray.ravel()
+        histogram = np.zeros(256, dtype=np.int64)
+        chunk = ImageProcessor.HISTOGRAM_CHUNK
+        for start in range(0, flat.size, chunk):
+            job.checkpoint()
+            histogram += np.bincount(flat[start:start + chunk], minlength=256)[:256]
+            job.progress((start + chunk) / flat.size)
+        return histogram
+    
+    @staticmethod
+    def binarize(gray, threshold, max_workers=None):
+        """255 там, где яркость выше порога, иначе 0"""
+        result = np.empty_like(gray)
+        
+        def binarize_tile(rows, cols):
+            tile = result[rows, cols]
+            np.greater(gray[rows, cols], threshold, out=tile)
+            tile *= 255
+        
+        ImageProcessor.run_tiled(gray.shape, binarize_tile, max_workers=max_workers)
+        return result
+    
+    @staticmethod
+    def otsu_threshold(histogram):
+        """Порог Оцу по гистограмме и межклассовая дисперсия для каждого порога.
+
+        Веса и средние классов для всех порогов берутся из накопленных сумм
+        гистограммы и моментов. Класс 0 - яркости < t, t = 1..255; для t = 0
+        и для порогов с пустым классом дисперсия равна нулю. При равных
+        дисперсиях выбирается меньший порог.
+        """
+        p = histogram.astype(np.float64) / histogram.sum()
+        moments = p * np.arange(256)
+        w0 = np.cumsum(p)[:-1]
+        w1 = np.cumsum(p[::-1])[::-1][1:]
+        m0 = np.cumsum(moments)[:-1]
+        m1 = np.cumsum(moments[::-1])[::-1][1:]
+        
+        valid = (w0 >= 1e-10) & (w1 >= 1e-10)
+        variance = np.zeros(256)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            between = w0 * w1 * (m0 / w0 - m1 / w1) ** 2
+        variance[1:][valid] = between[valid]
+        
+        best_threshold = int(np.argmax(variance))
+        return best_threshold, variance
+    
+    @staticmethod
+    def global_threshold_otsu(image, histogram_callback=None):
+        """Реализация метода Оцу"""
+        job = Job.current()
+        with job.section(0, 0.4):
+            if len(image.shape) == 3:
+                gray = ImageProcessor.convert_color(image, "BGR2GRAY")
+            else:
+                gray = image
+        
+        with job.section(0.4, 0.8):
+            histogram = ImageProcessor.gray_histogram(gray)
+        best_threshold, variance = ImageProcessor.otsu_threshold(histogram)
+        if histogram_callback:
+            histogram_callback(histogram, variance, best_threshold)
+        
+        with job.section(0.8, 1):
+            return ImageProcessor.binarize(gray, best_threshold)
+    
+    @staticmethod
+    def global_threshold_iterative(image, max_iterations=100, tolerance=1, progress_callback=None,
+                                   histogram_callback=None):
+        """Итеративный метод пороговой обработки.
+
+        Итерации идут по гистограмме: фон - уровни <= порога, то есть 0..floor(порог),
+        суммы и количества классов берутся из накопленных сумм, так что итерация
+        стоит O(256). Средние - те же частные целых сумм, что и np.mean по пикселям,
+        поэтому порог совпадает с попиксельным вариантом.
+        """
+        if progress_callback is not None:
+            with Job(progress_callback).running():
+                return ImageProcessor.global_threshold_iterative(image, max_iterations, tolerance,
+                                                                 histogram_callback=histogram_callback)
+        
+        job = Job.current()
+        with job.section(0, 0.4):
+            if len(image.shape) == 3:
+                gray = ImageProcessor.convert_color(image, "BGR2GRAY")
+            else:
+                gray = image
+        
+        # Основное время - проход по пикселям для гистограммы и итоговая бинаризация
+        with job.section(0.4, 0.8):
+            histogram = ImageProcessor.gray_histogram(gray)
+        counts = np.cumsum(histogram)
+        sums = np.cumsum(histogram * np.arange(256))
+        total_count, total_sum = counts[-1], sums[-1]
+        
+        threshold = total_sum / total_count
+        
+        for i in range(max_iterations):
+            job.checkpoint()
+            
+            split = int(np.floor(threshold))
+            background_count, background_sum = counts[split], sums[split]
+            foreground_count = total_count - background_count
+            
+            if foreground_count == 0 or background_count == 0:
+                break
+            
+            mean_foreground = (total_sum - background_sum) / foreground_count
+            mean_background = background_sum / background_count
+            
+            new_threshold = (mean_foreground + mean_background) / 2
+            
+            if abs(new_threshold - threshold) < tolerance:
+                break
+                
+            threshold = new_threshold
+        
+        if histogram_callback:
+            histogram_callback(histogram, None, int(np.floor(threshold)))
+        with job.section(0.8, 1):
+            result = ImageProcessor.binarize(gray, threshold)
+        
+        return result, threshold
+    
+    @staticmethod
+    def global_threshold_manual(image, threshold_value):
+        """Ручная пороговая обработка"""
+        if len(image.shape) == 3:
+            gray = ImageProcessor.convert_color(image, "BGR2GRAY")
+        else:
+            gray = image
+        
+        return ImageProcessor.binarize(gray, threshold_value)
+    
+    @staticmethod
+    def box_sum(padded, size, dtype):
+        """Суммы по всем окнам size×size через таблицу накопленных сумм (по одной оси за раз).
+
+        Результат меньше padded на size - 1 по каждой оси; время не зависит от size.
+        """
+        for axis in (0, 1):
+            shape = list(padded.shape)
+            shape[axis] += 1
+            cumulative = np.zeros(shape, dtype=dtype)
+            np.cumsum(padded, axis=axis, dtype=dtype,
+                      out=cumulative[1:] if axis == 0 else cumulative[:, 1:])
+            if axis == 0:
+                padded = cumulative[size:] - cumulative[:-size]
+            else:
+                padded = cumulative[:, size:] - cumulative[:, :-size]
+        return padded
+    
+    @staticmethod
+    def adaptive_threshold_mean(image, block_size=11, C=2):
+        """Адаптивная пороговая обработка по среднему"""
+        if len(image.shape) == 3:
+            gray = ImageProcessor.convert_color(image, "BGR2GRAY")
+        else:
+            gray = image
+        
+        if block_size % 2 == 0:
+            block_size += 1
+        
+        half_block = block_size // 2
+        # Зеркальное отражение без повтора крайнего пикселя, как и прежде
+        padded = np.pad(gray, half_block, mode='reflect')
+        
+        # Суммы целочисленные и точные, поэтому среднее совпадает с np.mean окна
+        max_sum = padded.shape[1] * block_size * int(padded.max(initial=0))
+        dtype = np.int32 if max_sum < 2 ** 31 else np.int64
+        result = np.empty_like(gray)
+        
+        # Плитка берет из padded окно с ореолом block_size - 1 и пишет свою часть result
+        def threshold_tile(rows, cols):
+            window = padded[rows.start:rows.stop + block_size - 1, cols.start:cols.stop + block_size - 1]
+            mean_value = ImageProcessor.box_sum(window, block_size, dtype) / (block_size * block_size)
+            tile = result[rows, cols]
+            np.greater(gray[rows, cols], mean_value - C, out=tile)
+            tile *= 255
+        
+        ImageProcessor.run_tiled(gray.shape, threshold_tile)
+        return result
+    
+    @staticmethod
+    def adaptive_threshold_statistics(image, block_size, rule):
+        """Бинаризация по порогу rule(среднее, стандартное отклонение) окна block_size×block_size.
+
+        Суммы яркостей и их квадратов по окну берутся из таблиц накопленных сумм
+        (box_sum), поэтому время на пиксель не зависит от размера окна. Суммы
+        целочисленные, и дисперсия считается без потери точности на вычитании.
+        """
+        if len(image.shape) == 3:
+            gray = ImageProcessor.convert_color(image, "BGR2GRAY")
+        else:
+            gray = image
+        
+        if block_size % 2 == 0:
+            block_size += 1
+        
+        half_block = block_size // 2
+        padded = np.pad(gray, half_block, mode='reflect')
+        area = block_size * block_size
+        result = np.empty_like(gray)
+        
+        # Плитка заметно больше окна, иначе ореол block_size - 1 съедает выигрыш
+        tile_size = max(ImageProcessor.TILE_SIZE, 4 * block_size)
+        max_sum = (tile_size + block_size) * block_size * int(padded.max(initial=0))
+        dtype = np.int32 if max_sum < 2 ** 31 else np.int64
+        
+        def threshold_tile(rows, cols):
+            window = padded[rows.start:rows.stop + block_size - 1,
+                            cols.start:cols.stop + block_size - 1]
+            sums = ImageProcessor.box_sum(window, block_size, dtype).astype(np.int64)
+            squares = ImageProcessor.box_sum(np.square(window, dtype=np.int64), block_size, np.int64)
+            # area * сумма квадратов - квадрат суммы = area² * дисперсия, точно в целых
+            squares *= area
+            squares -= sums * sums
+            variance = squares / (area * area)
+            threshold = rule(sums / area, np.sqrt(variance, out=variance))
+            tile = result[rows, cols]
+            np.greater(gray[rows, cols], threshold, out=tile)
+            tile *= 255
+        
+        ImageProcessor.run_tiled(gray.shape, threshold_tile, tile_size)
+        return result
+    
+    @staticmethod
+    def adaptive_threshold_niblack(image, block_size=51, k=0.2):
+        """Метод Ниблэка: порог - среднее окна минус k стандартных отклонений"""
+        return ImageProcessor.adaptive_threshold_statistics(
+            image, block_size, lambda mean, std: mean - k * std)
+    
+    @staticmethod
+    def adaptive_threshold_sauvola(image, block_size=51, k=0.2, R=128):
+        """Метод Саувола: порог mean * (1 + k * (std / R - 1)); на ровном фоне порог ниже среднего"""
+        return ImageProcessor.adaptive_threshold_statistics(
+            image, block_size, lambda mean, std: mean * (1 + k * (std / R - 1)))
+    
+    @staticmethod
+    def adaptive_threshold_gaussian(image, block_size=11, C=2):
+        """Адаптивная пороговая обработка по взвешенному среднему с окном Гаусса.
+
+        sigma подбирается по размеру блока так же, как в OpenCV. Размытие идет
+        через filter_separable: большие ядра считаются через БПФ, и время на
+        пиксель почти не зависит от размера окна.
+        """
+        if len(image.shape) == 3:
+            gray = ImageProcessor.convert_color(image, "BGR2GRAY")
+        else:
+            gray = image
+        
+        if block_size % 2 == 0:
+            block_size += 1
+        
+        sigma = 0.3 * ((block_size - 1) * 0.5 - 1) + 0.8
+        kernel = ImageProcessor.gaussian_kernel(sigma, block_size)
+        with Job.current().section(0, 0.9):
+            mean = ImageProcessor.filter_separable(gray, kernel, kernel)
+        mean -= C
+        result = np.greater(gray, mean).astype(np.uint8)
+        result *= 255
+        return result
+    
+    @staticmethod
+    def work_buffer(buffers, name, shape):
+        """Рабочий float32-массив; из словаря buffers он берется повторно, если форма совпадает"""
+        shape = tuple(shape)
+        if buffers is None:
+            return np.empty(shape, dtype=np.float32)
+        buffer = buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = buffers[name] = np.empty(shape, dtype=np.float32)
+        return buffer
+    
+    @staticmethod
+    def thread_buffers():
+        """Словарь рабочих массивов текущего потока: плитки одного размера обходятся без выделений"""
+        local = ImageProcessor.thread_local
+        if not hasattr(local, "buffers"):
+            local.buffers = {}
+        return local.buffers
+    
+    @staticmethod
+    def run_tiled(shape, function, tile_size=None, max_workers=None):
+        """Вызов function(rows, cols) для непересекающихся плиток в пуле потоков.
+
+        rows и cols - срезы плитки; функция сама пишет результат на место (в свою часть
+        выходного массива). NumPy отпускает GIL на крупных операциях, поэтому плитки
+        считаются параллельно. Между плитками - контрольные точки текущего задания.
+        """
+        job = Job.current()
+        h, w = shape[:2]
+        tile_size = tile_size or ImageProcessor.TILE_SIZE
+        tiles = [(slice(y, min(y + tile_size, h)), slice(x, min(x + tile_size, w)))
+                 for y in range(0, h, tile_size) for x in range(0, w, tile_size)]
+        workers = min(max_workers or ImageProcessor.TILE_WORKERS, len(tiles))
+        
+        if workers <= 1:
+            for done, tile in enumerate(tiles, 1):
+                job.checkpoint()
+                function(*tile)
+                job.progress(done / len(tiles))
+            return
+        
+        def run_tile(rows, cols):
+            # Плитки, до которых дошла очередь после отмены, пропускаются
+            if not job.cancelled:
+                function(rows, cols)
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_tile, *tile) for tile in tiles]
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                job.progress(done / len(tiles))
+        job.checkpoint()
+    
+    @staticmethod
+    def pad_reflect(image, pad_y, pad_x, out):
+        """Копия image в out с зеркальными полями (крайний пиксель не повторяется)"""
+        h, w = image.shape[:2]
+        if pad_y >= h or pad_x >= w:
+            pad = [(pad_y, pad_y), (pad_x, pad_x)] + [(0, 0)] * (image.ndim - 2)
+            out[...] = np.pad(image, pad, mode='reflect')
+            return out
+        
+        out[pad_y:pad_y + h, pad_x:pad_x + w] = image
+        if pad_y:
+            inner = out[:, pad_x:pad_x + w]
+            inner[:pad_y] = inner[2 * pad_y:pad_y:-1]
+            inner[pad_y + h:] = inner[pad_y + h - 2:h - 2:-1]
+        if pad_x:
+            out[:, :pad_x] = out[:, 2 * pad_x:pad_x:-1]
+            out[:, pad_x + w:] = out[:, pad_x + w - 2:w - 2:-1]
+        return out
+    
+    @staticmethod
+    def correlate_taps(source, taps, out, temp):
+        """Сумма weight * source[dy:dy+h, dx:dx+w] по отводам ((dy, dx), weight) в заданном порядке"""
+        h, w = out.shape[:2]
+        first = True
+        for (dy, dx), weight in taps:
+            window = source[dy:dy + h, dx:dx + w]
+            if first:
+                np.multiply(window, weight, out=out)
+                first = False
+            else:
+                np.multiply(window, weight, out=temp)
+                out += temp
+        if first:
+            out.fill(0)
+        return out
+    
+    @staticmethod
+    def separate_kernel(kernel):
+        """(столбец, строка), если ядро ранга 1 по SVD, иначе None"""
+        u, s, vt = np.linalg.svd(kernel.astype(np.float64))
+        if s[0] == 0 or (len(s) > 1 and s[1] > s[0] * ImageProcessor.SEPARABLE_TOLERANCE):
+            return None
+        scale = np.sqrt(s[0])
+        return (u[:, 0] * scale).astype(np.float32), (vt[0] * scale).astype(np.float32)
+    
+    @staticmethod
+    def fft_length(size):
+        """Наименьшая длина >= size из множителей 2, 3 и 5: на ней БПФ быстрее всего"""
+        length = size
+        while True:
+            rest = length
+            for factor in (2, 3, 5):
+                while rest % factor == 0:
+                    rest //= factor
+            if rest == 1:
+                return length
+            length += 1
+    
+    @staticmethod
+    def kernel_plan(kernel, column=None, row=None):
+        """Способ вычисления корреляции: (вид, данные, форма ядра).
+
+        Ядро ранга 1 - два одномерных прохода ("separable"), ядро, которому прямым
+        суммированием нужно не меньше FFT_MIN_TAPS отводов на пиксель, - БПФ ("fft"),
+        остальные - сумма сдвинутых окон в построчном порядке отводов без нулевых
+        ("direct"). column и row задают разделимое ядро явно.
+        """
+        if column is None and kernel.shape[0] > 1 and kernel.shape[1] > 1:
+            separable = ImageProcessor.separate_kernel(kernel)
+            if separable is not None:
+                column, row = separable
+        
+        if column is not None:
+            if len(column) + len(row) >= ImageProcessor.FFT_MIN_TAPS:
+                return "fft", (np.outer(column, row), {}), (len(column), len(row))
+            taps = ([((dy, 0), weight) for dy, weight in enumerate(column) if weight],
+                    [((0, dx), weight) for dx, weight in enumerate(row) if weight])
+            return "separable", taps, (len(column), len(row))
+        
+        if np.count_nonzero(kernel) >= ImageProcessor.FFT_MIN_TAPS:
+            return "fft", (kernel, {}), kernel.shape
+        return "direct", [((dy, dx), kernel[dy, dx]) for dy, dx in np.argwhere(kernel)], kernel.shape
+    
+    @staticmethod
+    def correlate_valid(padded, plan, out, buffers=None):
+        """Корреляция без полей: out[y, x] считается по окну padded с углом в (y, x)"""
+        kind, data, (kh, kw) = plan
+        h, w = out.shape[:2]
+        
+        if kind == "direct":
+            return ImageProcessor.correlate_taps(padded, data, out,
+                                                 ImageProcessor.work_buffer(buffers, "temp", out.shape))
+        
+        if kind == "separable":
+            column_taps, row_taps = data
+            vertical_shape = (h,) + padded.shape[1:]
+            vertical = ImageProcessor.work_buffer(buffers, "vertical", vertical_shape)
+            ImageProcessor.correlate_taps(padded, column_taps, vertical,
+                                          ImageProcessor.work_buffer(buffers, "vertical_temp", vertical_shape))
+            return ImageProcessor.correlate_taps(vertical, row_taps, out,
+                                                 ImageProcessor.work_buffer(buffers, "temp", out.shape))
+        
+        # БПФ: дополнение нулями за пределами padded не влияет на нужные отсчеты
+        kernel, spectra = data
+        shape = tuple(ImageProcessor.fft_length(size) for size in padded.shape[:2])
+        if shape not in spectra:
+            # Корреляция - это свертка с перевернутым ядром
+            spectrum = np.fft.rfft2(kernel[::-1, ::-1], s=shape)
+            spectra[shape] = spectrum.reshape(spectrum.shape + (1,) * (padded.ndim - 2))
+        spectrum = np.fft.rfft2(padded, s=shape, axes=(0, 1))
+        spectrum *= spectra[shape]
+        # Циклическая свертка без заворота начинается с отсчета (kh - 1, kw - 1)
+        full = np.fft.irfft2(spectrum, s=shape, axes=(0, 1))
+        out[...] = full[kh - 1:kh - 1 + h, kw - 1:kw - 1 + w]
+        return out
+    
+    @staticmethod
+    def apply_kernel_plan(image, plan, buffers=None, out=None, max_workers=None):
+        """Зеркальные поля добавляются один раз, затем плитки считаются по окнам с ореолом"""
+        kind, _, (kh, kw) = plan
+        h, w = image.shape[:2]
+        pad_y, pad_x = kh // 2, kw // 2
+        if out is None:
+            out = np.empty(image.shape, dtype=np.float32)
+        
+        padded = ImageProcessor.work_buffer(buffers, "padded", (h + 2 * pad_y, w + 2 * pad_x) + image.shape[2:])
+        ImageProcessor.pad_reflect(image, pad_y, pad_x, padded)
+        
+        def filter_tile(rows, cols):
+            window = padded[rows.start:rows.stop + 2 * pad_y, cols.start:cols.stop + 2 * pad_x]
+            ImageProcessor.correlate_valid(window, plan, out[rows, cols], ImageProcessor.thread_buffers())
+        
+        # Для БПФ плитка должна быть заметно больше ядра, иначе ореол съедает выигрыш
+        tile_size = ImageProcessor.TILE_SIZE
+        if kind == "fft":
+            tile_size = max(tile_size, 4 * max(kh, kw))
+        ImageProcessor.run_tiled(image.shape, filter_tile, tile_size, max_workers)
+        return out
+    
+    @staticmethod
+    def filter_separable(image, column, row, buffers=None, out=None, max_workers=None):
+        """Разделимое ядро column × row: вертикальный, затем горизонтальный проход"""
+        column = np.asarray(column, dtype=np.float32)
+        row = np.asarray(row, dtype=np.float32)
+        plan = ImageProcessor.kernel_plan(None, column, row)
+        return ImageProcessor.apply_kernel_plan(image, plan, buffers, out, max_workers)
+    
+    @staticmethod
+    def filter2d(image, kernel, buffers=None, out=None, max_workers=None):
+        """Корреляция с произвольным ядром (как cv2.filter2D) сразу по всем каналам.
+
+        Границы - зеркальные; способ вычисления выбирает kernel_plan. Изображение
+        обрабатывается плитками в пуле потоков. Результат - float32; buffers - словарь
+        для массива с полями, который можно передавать повторно.
+        """
+        kernel = np.atleast_2d(np.asarray(kernel, dtype=np.float32))
+        plan = ImageProcessor.kernel_plan(kernel)
+        return ImageProcessor.apply_kernel_plan(image, plan, buffers, out, max_workers)
+    
+    @staticmethod
+    def to_uint8(values, rounded=True):
+        """Обрезка float32-результата фильтра в 0..255 (на месте) и приведение к uint8"""
+        np.clip(values, 0, 255, out=values)
+        if rounded:
+            np.rint(values, out=values)
+        return values.astype(np.uint8)
+    
+    @staticmethod
+    def gaussian_kernel(sigma, size=None):
+        """Одномерное нормированное ядро Гаусса; по умолчанию радиус 3 sigma"""
+        if size is None:
+            size = 2 * int(np.ceil(3 * sigma)) + 1
+        x = np.arange(size) - (size - 1) / 2
+        kernel = np.exp(-x * x / (2 * sigma * sigma))
+        return (kernel / kernel.sum()).astype(np.float32)
+    
+    @staticmethod
+    def box_filter(image, size=3, buffers=None):
+        """Среднее по окну size×size"""
+        row = np.full(size, 1.0 / size, dtype=np.float32)
+        return ImageProcessor.to_uint8(ImageProcessor.filter_separable(image, row, row, buffers))
+    
+    @staticmethod
+    def gaussian_blur(image, sigma=1.0, buffers=None):
+        """Размытие по Гауссу"""
+        kernel = ImageProcessor.gaussian_kernel(sigma)
+        return ImageProcessor.to_uint8(ImageProcessor.filter_separable(image, kernel, kernel, buffers))
+    
+    @staticmethod
+    def unsharp_mask(image, sigma=2.0, amount=1.0, threshold=0, buffers=None):
+        """Нерезкое маскирование: image + amount * (image - размытое); перепады меньше threshold не усиливаются"""
+        kernel = ImageProcessor.gaussian_kernel(sigma)
+        with Job.current().section(0, 0.9):
+            detail = ImageProcessor.filter_separable(image, kernel, kernel, buffers)
+        # detail = image - blurred, затем result = image + amount * detail
+        np.subtract(image, detail, out=detail)
+        if threshold > 0:
+            detail[np.abs(detail) < threshold] = 0
+        detail *= amount
+        detail += image
+        return ImageProcessor.to_uint8(detail)
+    
+    @staticmethod
+    def sharpen_filter_laplacian(image, strength=1.0, buffers=None):
+        """Фильтр Лапласа"""
+        strength = float(np.clip(strength, 0.01, 1.0))
+        
+        base_kernel = np.array([[0, -1, 0],
+                                [-1, 5, -1],
+                                [0, -1, 0]], dtype=np.float32)
+        
+        identity_kernel = np.array([[0, 0, 0],
+                                    [0, 1, 0],
+                                    [0, 0, 0]], dtype=np.float32)
+        
+        kernel = (1.0 - strength) * identity_kernel + strength * base_kernel
+        
+        # Ядро ранга 2 считается прямым суммированием отводов в том же порядке и
+        # во float32, что и прежде, поэтому результат совпадает побитово
+        dst = ImageProcessor.filter2d(image, kernel, buffers)
+        return ImageProcessor.to_uint8(dst, rounded=False)
+
+
+class StageCache:
+    """LRU-кеш результатов стадий конвейера, ограниченный суммарным объемом массивов"""
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        # Пишет поток обработки, очищает интерфейс
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+    
+    def put(self, key, value, nbytes):
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.entries[key] = (value, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class Pipeline:
+    """Упорядоченная цепочка стадий (имя операции, параметры).
+
+    Результат стадии кешируется по ключу из ключа ее входа, имени и параметров.
+    Ключ входа первой стадии - хеш содержимого изображения, остальных - ключ
+    предыдущей стадии, поэтому при смене параметров поздней стадии ранние
+    берутся из кеша, а данные не хешируются повторно. Результаты отдаются только
+    для чтения: один и тот же массив может вернуться из кеша много раз.
+    """
+    # Операция: (изображение, обратные вызовы, **параметры) -> изображение
+    OPERATIONS = {
+        "gray": lambda image, callbacks: ImageProcessor.convert_color(image, "BGR2GRAY"),
+        "global_otsu": lambda image, callbacks: ImageProcessor.global_threshold_otsu(
+            image, histogram_callback=callbacks.histogram),
+        "global_iterative": lambda image, callbacks: ImageProcessor.global_threshold_iterative(
+            image, histogram_callback=callbacks.histogram)[0],
+        "global_manual": lambda image, callbacks, threshold=127: ImageProcessor.global_threshold_manual(
+            image, threshold),
+        "adaptive_mean": lambda image, callbacks, block_size=11, C=2: ImageProcessor.adaptive_threshold_mean(
+            image, block_size, C),
+        "adaptive_gaussian": lambda image, callbacks, block_size=11, C=2: (
+            ImageProcessor.adaptive_threshold_gaussian(image, block_size, C)),
+        "adaptive_niblack": lambda image, callbacks, block_size=51, k=0.2: (
+            ImageProcessor.adaptive_threshold_niblack(image, block_size, k)),
+        "adaptive_sauvola": lambda image, callbacks, block_size=51, k=0.2, R=128: (
+            ImageProcessor.adaptive_threshold_sauvola(image, block_size, k, R)),
+        "sharpen_laplacian": lambda image, callbacks, strength=0.2: ImageProcessor.sharpen_filter_laplacian(
+            image, strength),
+        # Сила 0..1 соответствует amount 0..2
+        "sharpen_unsharp": lambda image, callbacks, strength=0.2, sigma=2.0: ImageProcessor.unsharp_mask(
+            image, sigma, amount=2 * strength),
+    }
+    
+    def __init__(self, stages, cache=None):
+        self.stages = [(name, dict(params)) for name, params in stages]
+        self.cache = cache
+    
+    @staticmethod
+    def image_key(image):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr((image.shape, image.dtype.str, ImageData.order(image))).encode())
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def stage_key(input_key, name, params):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr((input_key, name, sorted(params.items()))).encode())
+        return digest.hexdigest()
+    
+    def run(self, image, image_key=None, histogram_callback=None):
+        """Результат последней стадии; image_key - заранее посчитанный Pipeline.image_key(image).
+
+        Каждой стадии отводится равная доля прогресса текущего задания; перед стадией -
+        контрольная точка. Результат отмененной стадии не кешируется.
+        """
+        job = Job.current()
+        key = image_key or Pipeline.image_key(image)
+        count = len(self.stages)
+        for index, (name, params) in enumerate(self.stages):
+            job.checkpoint()
+            key = Pipeline.stage_key(key, name, params)
+            entry = self.cache.get(key) if self.cache is not None else None
+            
+            if entry is None:
+                # Данные для гистограммы сохраняются вместе с результатом, чтобы
+                # показать их снова, когда стадия возьмется из кеша
+                histogram = []
+                callbacks = SimpleNamespace(histogram=lambda *data: histogram.append(data))
+                with job.section(index / count, (index + 1) / count):
+                    result = Pipeline.OPERATIONS[name](image, callbacks, **params)
+                # Операции не переставляют каналы: цветной результат в порядке входа
+                result = ImageData.like(result, image).view()
+                result.setflags(write=False)
+                entry = (result, histogram[-1] if histogram else None)
+                if self.cache is not None:
+                    self.cache.put(key, entry, result.nbytes)
+            
+            image, histogram_data = entry
+            if histogram_data is not None and histogram_callback:
+                histogram_callback(*histogram_data)
+            job.progress((index + 1) / count)
+        return image
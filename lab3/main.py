@@ -1,405 +1,162 @@
 import sys
+import threading
+
 import numpy as np
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                                QHBoxLayout, QPushButton, QLabel, QSlider, 
                                QComboBox, QGroupBox, QFileDialog, QMessageBox,
-                               QSplitter, QScrollArea, QProgressDialog)
-from PySide6.QtCore import Qt, QThread, Signal
-from PySide6.QtGui import QImage, QPixmap, QAction
+                               QSplitter, QScrollArea, QProgressDialog, QCheckBox)
+from PySide6.QtCore import Qt, QThread, QTimer, Signal, QPointF, QRectF
+from PySide6.QtGui import QImage, QPixmap, QAction, QPainter, QColor, QPen
 
+from image_processing import ImageData, ImageProcessor, Job, JobCancelled, Pipeline, StageCache
 
-class ImageProcessor:
-    @staticmethod
-    def read_image(file_path):
-        """Чтение изображения из файлa"""
-        try:
-            from PIL import Image
-            img = Image.open(file_path)
-            img_array = np.array(img)
-            
-            if len(img_array.shape) == 3:
-                if img_array.shape[2] == 4:
-                    img_array = img_array[:, :, :3]
-                    img_array = img_array[:, :, ::-1]
-                elif img_array.shape[2] == 3:
-                    img_array = img_array[:, :, ::-1]
-            
-            return img_array
-        except ImportError:
-            with open(file_path, 'rb') as f:
-                data = f.read()
-            
-            if file_path.lower().endswith('.png'):
-                return ImageProcessor._read_png_simple(data)
-            elif file_path.lower().endswith(('.jpg', '.jpeg')):
-                return ImageProcessor._read_jpeg_simple(data)
-            else:
-                raise ValueError(f"Unsupported image format: {file_path}")
+
+class ProcessingThread(QThread):
+    """Поток заданий обработки.
+
+    Задания выполняются по одному; новое задание отменяет выполняемое (оно
+    прервется на ближайшей контрольной точке) и заменяет ожидающее. Результат
+    отправляется только для задания, которое не было отменено.
+    """
+    finished = Signal(object, object)
+    progress = Signal(int)
+    histogram_ready = Signal(object, object, int)
+    cancelled = Signal(object)
     
-    @staticmethod
-    def _read_png_simple(data):
-        return np.ones((100, 100, 3), dtype=np.uint8) * 128
+    def __init__(self):
+        super().__init__()
+        self.condition = threading.Condition()
+        self.pending = None
+        # Последнее поставленное задание
+        self.job = None
+        self.stop_requested = False
     
-    @staticmethod
-    def _read_jpeg_simple(data):
-        return np.ones((100, 100, 3), dtype=np.uint8) * 128
+    def submit(self, pipeline, image, image_key=None):
+        job = Job(lambda value: job.cancelled or self.progress.emit(value))
+        with self.condition:
+            if self.job is not None:
+                self.job.cancel()
+            self.job = job
+            self.pending = (job, pipeline, image, image_key)
+            self.condition.notify()
+        return job
     
-    @staticmethod
-    def save_image(file_path, image):
-        """Сохранение изображения в файл"""
-        try:
-            from PIL import Image
-            
-            if len(image.shape) == 3:
-                rgb_image = image[:, :, ::-1].copy()
-                img = Image.fromarray(rgb_image)
-            else:
-                img = Image.fromarray(image)
-            
-            img.save(file_path)
-            return True
-        except Exception as e:
-            print(f"Error saving image: {e}")
-            return False
-    
-    @staticmethod
-    def convert_color(image, conversion):
-        """Конвертация цветового пространства"""
-        if len(image.shape) != 3:
-            return image
-        
-        if conversion == "BGR2GRAY":
-            if image.shape[2] == 3:
-                gray = (
-                    0.299 * image[:, :, 2] +
-                    0.587 * image[:, :, 1] +
-                    0.114 * image[:, :, 0]
-                ).astype(np.uint8)
-                return gray
-            else:
-                return image[:, :, 0]
-        
-        elif conversion == "GRAY2BGR":
-            if len(image.shape) == 2:
-                h, w = image.shape
-                bgr = np.zeros((h, w, 3), dtype=np.uint8)
-                bgr[:, :, 0] = image
-                bgr[:, :, 1] = image
-                bgr[:, :, 2] = image
-                return bgr
-        
-        return image
-    
-    @staticmethod
-    def resize_image(image, new_size):
-        """Изменение размера изображения"""
-        h, w = image.shape[:2]
-        new_h, new_w = new_size
-        
-        if len(image.shape) == 3:
-            resized = np.zeros((new_h, new_w, image.shape[2]), dtype=image.dtype)
-            for y in range(new_h):
-                for x in range(new_w):
-                    src_y = y * (h - 1) / (new_h - 1) if new_h > 1 else 0
-                    src_x = x * (w - 1) / (new_w - 1) if new_w > 1 else 0
-                    
-                    y1 = int(src_y)
-                    x1 = int(src_x)
-                    
-                    dy = src_y - y1
-                    dx = src_x - x1
-                    
-                    y1 = min(y1, h - 1)
-                    x1 = min(x1, w - 1)
-                    y2 = min(y1 + 1, h - 1)
-                    x2 = min(x1 + 1, w - 1)
-                    
-                    for c in range(image.shape[2]):
-                        value = (image[y1, x1, c] * (1 - dx) * (1 - dy) +
-                                image[y1, x2, c] * dx * (1 - dy) +
-                                image[y2, x1, c] * (1 - dx) * dy +
-                                image[y2, x2, c] * dx * dy)
-                        resized[y, x, c] = int(np.clip(value, 0, 255))
-        else:
-            resized = np.zeros((new_h, new_w), dtype=image.dtype)
-            for y in range(new_h):
-                for x in range(new_w):
-                    src_y = y * (h - 1) / (new_h - 1) if new_h > 1 else 0
-                    src_x = x * (w - 1) / (new_w - 1) if new_w > 1 else 0
-                    
-                    y1 = int(src_y)
-                    x1 = int(src_x)
-                    
-                    dy = src_y - y1
-                    dx = src_x - x1
-                    
-                    y1 = min(y1, h - 1)
-                    x1 = min(x1, w - 1)
-                    y2 = min(y1 + 1, h - 1)
-                    x2 = min(x1 + 1, w - 1)
-                    
-                    value = (image[y1, x1] * (1 - dx) * (1 - dy) +
-                            image[y1, x2] * dx * (1 - dy) +
-                            image[y2, x1] * (1 - dx) * dy +
-                            image[y2, x2] * dx * dy)
-                    resized[y, x] = int(np.clip(value, 0, 255))
-        
-        return resized
-    
-    @staticmethod
-    def global_threshold_otsu(image):
-        """Реализация метода Оцу"""
-        if len(image.shape) == 3:
-            gray = ImageProcessor.convert_color(image, "BGR2GRAY")
-        else:
-            gray = image.copy()
-        
-        histogram = np.zeros(256, dtype=np.float32)
-        total_pixels = gray.size
-        
-        for i in range(gray.shape[0]):
-            for j in range(gray.shape[1]):
-                histogram[gray[i, j]] += 1
-        
-        histogram /= total_pixels
-        
-        best_threshold = 0
-        best_variance = 0.0
-        
-        for threshold in range(1, 256):
-            w0 = np.sum(histogram[:threshold])
-            w1 = np.sum(histogram[threshold:])
-            
-            if w0 < 1e-10 or w1 < 1e-10:
-                continue
-            
-            mean0 = np.sum(np.arange(threshold) * histogram[:threshold]) / w0
-            mean1 = np.sum(np.arange(threshold, 256) * histogram[threshold:]) / w1
-            
-            variance = w0 * w1 * (mean0 - mean1) ** 2
-            
-            if variance > best_variance:
-                best_variance = variance
-                best_threshold = threshold
-        
-        result = np.zeros_like(gray)
-        result[gray > best_threshold] = 255
-        
-        return result
+    def cancel(self):
+        with self.condition:
+            if self.job is not None:
+                self.job.cancel()
+            self.pending = None
     
-    @staticmethod
-    def global_threshold_iterative(image, max_iterations=100, tolerance=1, progress_callback=None):
-        """Итеративный метод пороговой обработки"""
-        if len(image.shape) == 3:
-            gray = ImageProcessor.convert_color(image, "BGR2GRAY")
-        else:
-            gray = image.copy()
-        
-        threshold = np.mean(gray)
-        
-        for i in range(max_iterations):
-            if progress_callback:
-                progress_callback(int((i / max_iterations) * 100))
-            
-            foreground = gray[gray > threshold]
-            background = gray[gray <= threshold]
-            
-            if foreground.size == 0 or background.size == 0:
-                break
-            
-            mean_foreground = np.mean(foreground)
-            mean_background = np.mean(background)
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stop_requested:
+                    self.condition.wait()
+                if self.stop_requested:
+                    break
+                (job, pipeline, image, image_key), self.pending = self.pending, None
             
-            new_threshold = (mean_foreground + mean_background) / 2
+            try:
+                with job.running():
+                    result = pipeline.run(
+                        image,
+                        image_key,
+                        histogram_callback=lambda *data: job.cancelled or self.histogram_ready.emit(*data)
+                    )
+            except JobCancelled:
+                self.cancelled.emit(job)
+                continue
+            except Exception as e:
+                print(f"Error in processing thread: {e}")
+                result = None
             
-            if abs(new_threshold - threshold) < tolerance:
-                break
-                
-            threshold = new_threshold
-        
-        result = np.zeros_like(gray)
-        result[gray > threshold] = 255
-        
-        return result, threshold
+            if job.cancelled:
+                self.cancelled.emit(job)
+            else:
+                self.finished.emit(job, result)
     
-    @staticmethod
-    def global_threshold_manual(image, threshold_value):
-        """Ручная пороговая обработка"""
-        if len(image.shape) == 3:
-            gray = ImageProcessor.convert_color(image, "BGR2GRAY")
-        else:
-            gray = image.copy()
-        
-        result = np.zeros_like(gray)
-        result[gray > threshold_value] = 255
-        
-        return result
+    def stop(self):
+        with self.condition:
+            self.stop_requested = True
+            if self.job is not None:
+                self.job.cancel()
+            self.condition.notify()
+
+
+class HistogramView(QWidget):
+    """Гистограмма яркости, кривая межклассовой дисперсии (для Оцу) и выбранный порог"""
+    def __init__(self):
+        super().__init__()
+        self.histogram = None
+        self.variance = None
+        self.threshold = None
+        self.setMinimumHeight(90)
+        self.setToolTip("Серым - гистограмма, красным - межклассовая дисперсия, синим - порог")
     
-    @staticmethod
-    def adaptive_threshold_mean(image, block_size=11, C=2):
-        """Адаптивная пороговая обработка по среднему"""
-        if len(image.shape) == 3:
-            gray = ImageProcessor.convert_color(image, "BGR2GRAY")
-        else:
-            gray = image.copy()
-        
-        if block_size % 2 == 0:
-            block_size += 1
-        
-        height, width = gray.shape
-        half_block = block_size // 2
-        
-        result = np.zeros_like(gray)
-        
-        padded = np.zeros((height + 2 * half_block, width + 2 * half_block), dtype=gray.dtype)
-        
-        padded[half_block:half_block+height, half_block:half_block+width] = gray
-        
-        for i in range(half_block):
-            padded[i, half_block:half_block+width] = gray[half_block-i, :]
-        
-        for i in range(half_block):
-            padded[height+half_block+i, half_block:half_block+width] = gray[height-2-i, :]
-        
-        for i in range(half_block):
-            padded[:, i] = padded[:, 2*half_block - i]
-        
-        for i in range(half_block):
-            padded[:, width+half_block+i] = padded[:, width+half_block-i-2]
-        
-        for y in range(height):
-            for x in range(width):
-                window = padded[y:y+block_size, x:x+block_size]
-                
-                mean_value = np.mean(window)
-                
-                if gray[y, x] > (mean_value - C):
-                    result[y, x] = 255
-        
-        return result
+    def set_data(self, histogram, variance, threshold):
+        self.histogram = histogram
+        self.variance = variance
+        self.threshold = threshold
+        self.update()
     
-    @staticmethod
-    def sharpen_filter_laplacian(image, strength=1.0):
-        """Фильтр Лапласа"""
-        strength = float(np.clip(strength, 0.01, 1.0))
-        
-        base_kernel = np.array([[0, -1, 0],
-                                [-1, 5, -1],
-                                [0, -1, 0]], dtype=np.float32)
-        
-        identity_kernel = np.array([[0, 0, 0],
-                                    [0, 1, 0],
-                                    [0, 0, 0]], dtype=np.float32)
-        
-        kernel = (1.0 - strength) * identity_kernel + strength * base_kernel
-        
-        if len(image.shape) == 3:
-            h, w, ch = image.shape
-            
-            padded = np.zeros((h + 2, w + 2, ch), dtype=np.float32)
-            padded[1:-1, 1:-1, :] = image.astype(np.float32)
-            
-            padded[0, 1:-1, :] = image[1, :, :]
-            padded[-1, 1:-1, :] = image[-2, :, :]
-            padded[1:-1, 0, :] = image[:, 1, :]
-            padded[1:-1, -1, :] = image[:, -2, :]
-            padded[0, 0, :] = image[1, 1, :]
-            padded[0, -1, :] = image[1, -2, :]
-            padded[-1, 0, :] = image[-2, 1, :]
-            padded[-1, -1, :] = image[-2, -2, :]
-            
-            dst = np.zeros((h, w, ch), dtype=np.float32)
-            
-            for c in range(ch):
-                channel = padded[:, :, c]
-                dst[:, :, c] = (
-                    kernel[0, 0] * channel[0:-2, 0:-2] +
-                    kernel[0, 1] * channel[0:-2, 1:-1] +
-                    kernel[0, 2] * channel[0:-2, 2:] +
-                    kernel[1, 0] * channel[1:-1, 0:-2] +
-                    kernel[1, 1] * channel[1:-1, 1:-1] +
-                    kernel[1, 2] * channel[1:-1, 2:] +
-                    kernel[2, 0] * channel[2:, 0:-2] +
-                    kernel[2, 1] * channel[2:, 1:-1] +
-                    kernel[2, 2] * channel[2:, 2:]
-                )
-            
-            dst = np.clip(dst, 0, 255).astype(np.uint8)
-            return dst
-        else:
-            h, w = image.shape
-            gray = image.astype(np.float32)
-            
-            padded = np.zeros((h + 2, w + 2), dtype=np.float32)
-            padded[1:-1, 1:-1] = gray
-            
-            padded[0, 1:-1] = gray[1, :]
-            padded[-1, 1:-1] = gray[-2, :]
-            padded[1:-1, 0] = gray[:, 1]
-            padded[1:-1, -1] = gray[:, -2]
-            padded[0, 0] = gray[1, 1]
-            padded[0, -1] = gray[1, -2]
-            padded[-1, 0] = gray[-2, 1]
-            padded[-1, -1] = gray[-2, -2]
-            
-            dst = (
-                kernel[0, 0] * padded[0:-2, 0:-2] +
-                kernel[0, 1] * padded[0:-2, 1:-1] +
-                kernel[0, 2] * padded[0:-2, 2:] +
-                kernel[1, 0] * padded[1:-1, 0:-2] +
-                kernel[1, 1] * padded[1:-1, 1:-1] +
-                kernel[1, 2] * padded[1:-1, 2:] +
-                kernel[2, 0] * padded[2:, 0:-2] +
-                kernel[2, 1] * padded[2:, 1:-1] +
-                kernel[2, 2] * padded[2:, 2:]
-            )
-            
-            dst = np.clip(dst, 0, 255).astype(np.uint8)
-            return dst
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#f0f0f0"))
+        if self.histogram is None:
+            painter.drawText(self.rect(), Qt.AlignCenter, "Гистограмма")
+            return
+        w, h = self.width(), self.height()
+        bar = w / 256
+        # Корень из высоты: один пиковый уровень (например, белый фон) не прячет остальные
+        heights = np.sqrt(self.histogram / max(int(self.histogram.max()), 1)) * (h - 4)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor("#808080"))
+        for level, bar_h in enumerate(heights):
+            if bar_h > 0:
+                painter.drawRect(QRectF(level * bar, h - bar_h, max(bar, 1), bar_h))
+        if self.variance is not None and self.variance.max() > 0:
+            scale = (h - 4) / self.variance.max()
+            points = [QPointF((level + 0.5) * bar, h - value * scale)
+                      for level, value in enumerate(self.variance)]
+            painter.setPen(QPen(QColor("#d62728"), 1.5))
+            painter.drawPolyline(points)
+        if self.threshold is not None:
+            painter.setPen(QPen(QColor("#1f77b4"), 2))
+            x = (self.threshold + 0.5) * bar
+            painter.drawLine(QPointF(x, 0), QPointF(x, h))
 
 
-class ProcessingThread(QThread):
-    finished = Signal(object)
-    progress = Signal(int)
-    
+class DisplayBuffer:
+    """Данные для показа в QImage без лишних копий.
+
+    Полутоновое изображение и непрерывное RGB (ImageData) показываются прямо из
+    своего массива. Остальные (BGR, несмежные) переписываются на месте в буфер
+    RGB, который вместе с QImage поверх него создается один раз на размер.
+    """
     def __init__(self):
-        super().__init__()
-        self.method = None
-        self.image = None
-        self.params = {}
-        
-    def run(self):
-        try:
-            if self.method == "global_otsu":
-                result = ImageProcessor.global_threshold_otsu(self.image)
-            elif self.method == "global_iterative":
-                result, threshold = ImageProcessor.global_threshold_iterative(
-                    self.image, 
-                    progress_callback=lambda p: self.progress.emit(p)
-                )
-            elif self.method == "global_manual":
-                result = ImageProcessor.global_threshold_manual(
-                    self.image, 
-                    self.params.get('threshold', 127)
-                )
-            elif self.method == "adaptive_mean":
-                result = ImageProcessor.adaptive_threshold_mean(
-                    self.image,
-                    self.params.get('block_size', 11),
-                    self.params.get('C', 2)
-                )
-            elif self.method == "sharpen_laplacian":
-                result = ImageProcessor.sharpen_filter_laplacian(
-                    self.image,
-                    self.params.get('strength', 0.2)
-                )
-            else:
-                result = None
-                
-            self.finished.emit(result)
-        except Exception as e:
-            print(f"Error in processing thread: {e}")
-            self.finished.emit(None)
+        self.rgb = None
+        self.rgb_qimage = None
+        # Массив, на который ссылается QImage, должен жить не меньше его
+        self.source = None
+
+    def qimage(self, image):
+        h, w = image.shape[:2]
+        if image.ndim == 2:
+            self.source = np.ascontiguousarray(image)
+            return QImage(self.source.data, w, h, self.source.strides[0], QImage.Format_Grayscale8)
+        if ImageData.order(image) == "RGB" and image.flags.c_contiguous:
+            self.source = image
+            return QImage(image.data, w, h, image.strides[0], QImage.Format_RGB888)
+        if self.rgb is None or self.rgb.shape != (h, w, 3):
+            self.rgb = np.empty((h, w, 3), dtype=np.uint8)
+            self.rgb_qimage = QImage(self.rgb.data, w, h, self.rgb.strides[0], QImage.Format_RGB888)
+        np.copyto(self.rgb, image if ImageData.order(image) == "RGB" else image[:, :, ::-1])
+        self.source = self.rgb
+        return self.rgb_qimage
+
+    def pixmap(self, image):
+        return QPixmap.fromImage(self.qimage(image))
 
 
 class ImageViewer(QLabel):
@@ -416,8 +173,31 @@ class ImageProcessingApp(QMainWindow):
         super().__init__()
         self.original_image = None
         self.processed_image = None
+        self.image_key = None
+        self.stage_cache = StageCache()
+        # Уровни пирамиды для предпросмотра: (изображение, ключ для кеша стадий)
+        self.pyramid = []
         self.processing_thread = ProcessingThread()
+        # Предпросмотр идет в своем потоке, чтобы не отменять задание полного разрешения
+        self.preview_thread = ProcessingThread()
+        # Буферы показа для каждой стороны: пересобирается только та, что изменилась
+        self.original_display = DisplayBuffer()
+        self.processed_display = DisplayBuffer()
+        self.preview_display = DisplayBuffer()
+        self.original_pixmap = None
         self.progress_dialog = None
+        # Полное разрешение после изменения параметра: клавиши и щелчки по шкале ползунка
+        # не дают sliderReleased, поэтому запуск откладывается до паузы в изменениях
+        self.apply_timer = QTimer(self)
+        self.apply_timer.setSingleShot(True)
+        self.apply_timer.setInterval(200)
+        self.apply_timer.timeout.connect(self.on_apply_timer)
+        self.pending_apply = None
+        # Номер последнего запроса (предпросмотр или полное разрешение) и номера,
+        # с которыми поставлены текущие задания потоков: устаревший результат не показывается
+        self.generation = 0
+        self.preview_generation = 0
+        self.processing_generation = 0
         self.init_ui()
         
     def init_ui(self):
@@ -463,11 +243,20 @@ class ImageProcessingApp(QMainWindow):
     def connect_thread_signals(self):
         self.processing_thread.finished.connect(self.on_processing_finished)
         self.processing_thread.progress.connect(self.on_processing_progress)
+        self.processing_thread.histogram_ready.connect(self.on_histogram_ready)
+        self.processing_thread.cancelled.connect(self.on_processing_cancelled)
+        self.processing_thread.start()
+        self.preview_thread.finished.connect(self.on_preview_ready)
+        self.preview_thread.start()
     
     def create_control_panel(self):
         panel = QWidget()
         layout = QVBoxLayout(panel)
         
+        self.live_preview_check = QCheckBox("Предпросмотр при перемещении ползунков")
+        self.live_preview_check.setChecked(True)
+        layout.addWidget(self.live_preview_check)
+        
         global_group = QGroupBox("Глобальная пороговая обработка")
         global_layout = QVBoxLayout(global_group)
         
@@ -488,15 +277,23 @@ class ImageProcessingApp(QMainWindow):
         self.apply_global_btn = QPushButton("Применить глобальную пороговую обработку")
         global_layout.addWidget(self.apply_global_btn)
         
+        self.histogram_view = HistogramView()
+        global_layout.addWidget(self.histogram_view)
+        
         layout.addWidget(global_group)
         
         adaptive_group = QGroupBox("Адаптивная пороговая обработка")
         adaptive_layout = QVBoxLayout(adaptive_group)
         
-        adaptive_layout.addWidget(QLabel("Метод: По локальному среднему"))
+        self.adaptive_method_combo = QComboBox()
+        self.adaptive_method_combo.addItems(["По локальному среднему", "По взвешенному среднему (Гаусс)",
+                                             "Метод Ниблэка", "Метод Саувола"])
+        adaptive_layout.addWidget(QLabel("Метод:"))
+        adaptive_layout.addWidget(self.adaptive_method_combo)
         
+        # Для документов с неравномерным освещением нужны окна 51-151
         self.block_size_slider = QSlider(Qt.Horizontal)
-        self.block_size_slider.setRange(3, 31)
+        self.block_size_slider.setRange(3, 151)
         self.block_size_slider.setValue(11)
         adaptive_layout.addWidget(QLabel("Размер блока (нечетный):"))
         adaptive_layout.addWidget(self.block_size_slider)
@@ -511,6 +308,15 @@ class ImageProcessingApp(QMainWindow):
         self.c_label = QLabel("2")
         adaptive_layout.addWidget(self.c_label)
         
+        self.k_slider = QSlider(Qt.Horizontal)
+        self.k_slider.setRange(0, 100)
+        self.k_slider.setValue(20)
+        self.k_slider.setEnabled(False)
+        adaptive_layout.addWidget(QLabel("Коэффициент k (Ниблэк, Саувола):"))
+        adaptive_layout.addWidget(self.k_slider)
+        self.k_label = QLabel("0.20")
+        adaptive_layout.addWidget(self.k_label)
+        
         self.apply_adaptive_btn = QPushButton("Применить адаптивную пороговую обработку")
         adaptive_layout.addWidget(self.apply_adaptive_btn)
         
@@ -519,7 +325,10 @@ class ImageProcessingApp(QMainWindow):
         sharpen_group = QGroupBox("Увеличение резкости")
         sharpen_layout = QVBoxLayout(sharpen_group)
         
-        sharpen_layout.addWidget(QLabel("Метод: Лапласиан"))
+        self.sharpen_method_combo = QComboBox()
+        self.sharpen_method_combo.addItems(["Лапласиан", "Нерезкое маскирование"])
+        sharpen_layout.addWidget(QLabel("Метод:"))
+        sharpen_layout.addWidget(self.sharpen_method_combo)
         
         self.strength_slider = QSlider(Qt.Horizontal)
         self.strength_slider.setRange(1, 100)
@@ -548,11 +357,20 @@ class ImageProcessingApp(QMainWindow):
         self.threshold_slider.valueChanged.connect(self.on_threshold_changed)
         self.block_size_slider.valueChanged.connect(self.on_block_size_changed)
         self.c_slider.valueChanged.connect(self.on_c_changed)
+        self.adaptive_method_combo.currentTextChanged.connect(self.on_adaptive_method_changed)
+        self.k_slider.valueChanged.connect(self.on_k_changed)
         self.strength_slider.valueChanged.connect(self.on_strength_changed)
         
-        self.apply_global_btn.clicked.connect(self.apply_global_threshold)
-        self.apply_adaptive_btn.clicked.connect(self.apply_adaptive_threshold)
-        self.apply_sharpen_btn.clicked.connect(self.apply_sharpen)
+        # Во время перетаскивания - предпросмотр, при отпускании - полное разрешение
+        self.threshold_slider.sliderReleased.connect(lambda: self.on_slider_released(self.apply_global_threshold))
+        self.block_size_slider.sliderReleased.connect(lambda: self.on_slider_released(self.apply_adaptive_threshold))
+        self.c_slider.sliderReleased.connect(lambda: self.on_slider_released(self.apply_adaptive_threshold))
+        self.k_slider.sliderReleased.connect(lambda: self.on_slider_released(self.apply_adaptive_threshold))
+        self.strength_slider.sliderReleased.connect(lambda: self.on_slider_released(self.apply_sharpen))
+        
+        self.apply_global_btn.clicked.connect(lambda: self.apply_global_threshold())
+        self.apply_adaptive_btn.clicked.connect(lambda: self.apply_adaptive_threshold())
+        self.apply_sharpen_btn.clicked.connect(lambda: self.apply_sharpen())
         self.reset_btn.clicked.connect(self.reset_image)
     
     def create_menu(self):
@@ -585,19 +403,89 @@ class ImageProcessingApp(QMainWindow):
     
     def on_threshold_changed(self, value):
         self.threshold_label.setText(str(value))
+        self.request_preview(self.global_stages)
+        self.schedule_apply(self.apply_global_threshold, self.threshold_slider)
     
     def on_block_size_changed(self, value):
         if value % 2 == 0:
             value += 1
             self.block_size_slider.setValue(value)
+            return
         self.block_size_label.setText(str(value))
+        self.request_preview(self.adaptive_stages)
+        self.schedule_apply(self.apply_adaptive_threshold, self.block_size_slider)
     
     def on_c_changed(self, value):
         self.c_label.setText(str(value))
+        self.request_preview(self.adaptive_stages)
+        self.schedule_apply(self.apply_adaptive_threshold, self.c_slider)
+    
+    def on_adaptive_method_changed(self, method):
+        # Ниблэк и Саувола задаются коэффициентом k, методы по среднему - константой C
+        uses_k = method in ("Метод Ниблэка", "Метод Саувола")
+        self.k_slider.setEnabled(uses_k)
+        self.c_slider.setEnabled(not uses_k)
+        self.request_preview(self.adaptive_stages)
+        self.schedule_apply(self.apply_adaptive_threshold)
+    
+    def on_k_changed(self, value):
+        self.k_label.setText(f"{value / 100.0:.2f}")
+        self.request_preview(self.adaptive_stages)
+        self.schedule_apply(self.apply_adaptive_threshold, self.k_slider)
     
     def on_strength_changed(self, value):
         strength = value / 100.0
         self.strength_label.setText(f"{strength:.2f}")
+        self.request_preview(self.sharpen_stages)
+        self.schedule_apply(self.apply_sharpen, self.strength_slider)
+    
+    def schedule_apply(self, apply, slider=None):
+        # Пока ползунок тянут мышью, идет только предпросмотр; отпускание запускает sliderReleased
+        if slider is not None and slider.isSliderDown():
+            return
+        if self.live_preview_check.isChecked() and self.original_image is not None:
+            self.pending_apply = apply
+            self.apply_timer.start()
+    
+    def on_apply_timer(self):
+        apply, self.pending_apply = self.pending_apply, None
+        if apply is not None:
+            apply(show_progress=False)
+    
+    def on_slider_released(self, apply):
+        self.apply_timer.stop()
+        self.pending_apply = None
+        if self.live_preview_check.isChecked() and self.original_image is not None:
+            apply(show_progress=False)
+    
+    def preview_level(self):
+        """Наибольший уровень пирамиды, который помещается в область просмотра"""
+        viewport = self.processed_scroll.viewport().size()
+        target = max(viewport.width(), viewport.height())
+        for image, key in self.pyramid:
+            if max(image.shape[:2]) <= target:
+                return image, key
+        return self.pyramid[-1]
+    
+    def request_preview(self, stages_builder):
+        if not self.live_preview_check.isChecked() or not self.pyramid:
+            return
+        image, key = self.preview_level()
+        scale = image.shape[1] / self.original_image.shape[1]
+        self.generation += 1
+        self.preview_generation = self.generation
+        self.preview_thread.submit(Pipeline(stages_builder(scale), self.stage_cache), image, key)
+    
+    def on_preview_ready(self, job, result):
+        if (job is not self.preview_thread.job or self.preview_generation < self.generation
+                or result is None):
+            return
+        # Уменьшенный результат растягивается до размера исходного изображения
+        h, w = self.original_image.shape[:2]
+        pixmap = self.preview_display.pixmap(result)
+        if (result.shape[0], result.shape[1]) != (h, w):
+            pixmap = pixmap.scaled(w, h, Qt.IgnoreAspectRatio, Qt.FastTransformation)
+        self.processed_viewer.setPixmap(pixmap)
     
     def open_image(self):
         file_path, _ = QFileDialog.getOpenFileName(
@@ -617,8 +505,13 @@ class ImageProcessingApp(QMainWindow):
                             self.original_image, (new_h, new_w)
                         )
                     
-                    self.processed_image = self.original_image.copy()
-                    self.display_images()
+                    self.image_key = Pipeline.image_key(self.original_image)
+                    levels = ImageProcessor.build_pyramid(self.original_image)
+                    self.pyramid = [(self.original_image, self.image_key)]
+                    self.pyramid += [(level, Pipeline.image_key(level)) for level in levels[1:]]
+                    self.processed_image = self.original_image
+                    self.display_original()
+                    self.display_processed()
                 else:
                     QMessageBox.warning(self, "Ошибка", "Не удалось загрузить изображение")
             except Exception as e:
@@ -644,123 +537,140 @@ class ImageProcessingApp(QMainWindow):
             except Exception as e:
                 QMessageBox.warning(self, "Ошибка", f"Ошибка сохранения: {str(e)}")
     
-    def display_images(self):
-        if self.original_image is not None:
-            if len(self.original_image.shape) == 3:
-                original_rgb = self.original_image[:, :, ::-1].copy()
-                original_qimage = QImage(
-                    original_rgb.data, 
-                    original_rgb.shape[1], 
-                    original_rgb.shape[0], 
-                    original_rgb.strides[0], 
-                    QImage.Format_RGB888
-                )
-            else:
-                original_qimage = QImage(
-                    self.original_image.data,
-                    self.original_image.shape[1],
-                    self.original_image.shape[0],
-                    self.original_image.strides[0],
-                    QImage.Format_Grayscale8
-                )
-            self.original_viewer.setPixmap(QPixmap.fromImage(original_qimage))
-        
-        if self.processed_image is not None:
-            if len(self.processed_image.shape) == 2:
-                processed_qimage = QImage(
-                    self.processed_image.data,
-                    self.processed_image.shape[1],
-                    self.processed_image.shape[0],
-                    self.processed_image.strides[0],
-                    QImage.Format_Grayscale8
-                )
-            else:
-                processed_rgb = self.processed_image[:, :, ::-1].copy()
-                processed_qimage = QImage(
-                    processed_rgb.data,
-                    processed_rgb.shape[1],
-                    processed_rgb.shape[0],
-                    processed_rgb.strides[0],
-                    QImage.Format_RGB888
-                )
-            self.processed_viewer.setPixmap(QPixmap.fromImage(processed_qimage))
-    
-    def show_progress_dialog(self, title="Обработка..."):
+    def display_original(self):
+        self.original_pixmap = self.original_display.pixmap(self.original_image)
+        self.original_viewer.setPixmap(self.original_pixmap)
+    
+    def display_processed(self):
+        if self.processed_image is self.original_image:
+            # Без обработки справа то же изображение: готовый QPixmap переиспользуется
+            self.processed_viewer.setPixmap(self.original_pixmap)
+        else:
+            self.processed_viewer.setPixmap(self.processed_display.pixmap(self.processed_image))
+    
+    def show_progress_dialog(self, job, title="Обработка..."):
+        self.close_progress_dialog()
         self.progress_dialog = QProgressDialog(title, "Отмена", 0, 100, self)
         self.progress_dialog.setWindowModality(Qt.WindowModal)
+        # Отмена относится к заданию этого окна, а не к тому, что выполняется сейчас
+        self.progress_dialog.canceled.connect(job.cancel)
         self.progress_dialog.show()
     
+    def close_progress_dialog(self):
+        if self.progress_dialog:
+            self.progress_dialog.close()
+            self.progress_dialog = None
+    
     def on_processing_progress(self, value):
         if self.progress_dialog:
             self.progress_dialog.setValue(value)
     
-    def on_processing_finished(self, result):
-        if self.progress_dialog:
-            self.progress_dialog.close()
-            self.progress_dialog = None
+    def on_histogram_ready(self, histogram, variance, threshold):
+        self.histogram_view.set_data(histogram, variance, threshold)
+    
+    def on_processing_finished(self, job, result):
+        # Результат задания, которое успело завершиться до замены новым, не нужен
+        if job is not self.processing_thread.job:
+            return
+        self.close_progress_dialog()
+        # После постановки задания запрошен предпросмотр для новых значений:
+        # результат для старых значений его не перекрывает
+        if self.processing_generation < self.generation:
+            return
         
         if result is not None:
             self.processed_image = result
-            self.display_images()
+            self.display_processed()
         else:
             QMessageBox.warning(self, "Ошибка", "Не удалось обработать изображение")
     
-    def apply_global_threshold(self):
-        if self.original_image is None:
-            QMessageBox.warning(self, "Ошибка", "Сначала загрузите изображение")
-            return
-        
+    def on_processing_cancelled(self, job):
+        if job is self.processing_thread.job:
+            self.close_progress_dialog()
+    
+    def global_stages(self, scale=1.0):
         method = self.global_method_combo.currentText()
         
-        self.processing_thread.method = {
+        stage = {
             "Метод Оцу": "global_otsu",
             "Итеративный метод": "global_iterative",
             "Ручной метод": "global_manual"
         }[method]
         
-        self.processing_thread.image = self.original_image.copy()
-        
         if method == "Ручной метод":
-            self.processing_thread.params = {'threshold': self.threshold_slider.value()}
+            params = {'threshold': self.threshold_slider.value()}
         else:
-            self.processing_thread.params = {}
+            params = {}
         
-        self.show_progress_dialog()
-        self.processing_thread.start()
+        return [("gray", {}), (stage, params)]
+    
+    def adaptive_stages(self, scale=1.0):
+        # На уменьшенной копии окно уменьшается в том же масштабе (нечетное, не меньше 3)
+        block_size = max(3, int(round(self.block_size_slider.value() * scale)) | 1)
+        method = self.adaptive_method_combo.currentText()
+        stage = {
+            "По локальному среднему": "adaptive_mean",
+            "По взвешенному среднему (Гаусс)": "adaptive_gaussian",
+            "Метод Ниблэка": "adaptive_niblack",
+            "Метод Саувола": "adaptive_sauvola"
+        }[method]
+        
+        if stage in ("adaptive_niblack", "adaptive_sauvola"):
+            params = {'block_size': block_size, 'k': self.k_slider.value() / 100.0}
+        else:
+            params = {'block_size': block_size, 'C': self.c_slider.value()}
+        
+        return [("gray", {}), (stage, params)]
+    
+    def sharpen_stages(self, scale=1.0):
+        strength = self.strength_slider.value() / 100.0
+        if self.sharpen_method_combo.currentText() == "Нерезкое маскирование":
+            return [("sharpen_unsharp", {'strength': strength, 'sigma': 2.0 * scale})]
+        return [("sharpen_laplacian", {'strength': strength})]
     
-    def apply_adaptive_threshold(self):
+    def apply_global_threshold(self, show_progress=True):
         if self.original_image is None:
             QMessageBox.warning(self, "Ошибка", "Сначала загрузите изображение")
             return
         
-        self.processing_thread.method = "adaptive_mean"
-        self.processing_thread.image = self.original_image.copy()
-        self.processing_thread.params = {
-            'block_size': self.block_size_slider.value(),
-            'C': self.c_slider.value()
-        }
-        
-        self.show_progress_dialog()
-        self.processing_thread.start()
+        self.run_pipeline(self.global_stages(), show_progress)
     
-    def apply_sharpen(self):
+    def apply_adaptive_threshold(self, show_progress=True):
         if self.original_image is None:
             QMessageBox.warning(self, "Ошибка", "Сначала загрузите изображение")
             return
         
-        self.processing_thread.method = "sharpen_laplacian"
-        self.processing_thread.image = self.original_image.copy()
-        self.processing_thread.params = {
-            'strength': self.strength_slider.value() / 100.0
-        }
+        self.run_pipeline(self.adaptive_stages(), show_progress)
+    
+    def apply_sharpen(self, show_progress=True):
+        if self.original_image is None:
+            QMessageBox.warning(self, "Ошибка", "Сначала загрузите изображение")
+            return
         
-        self.show_progress_dialog()
-        self.processing_thread.start()
+        self.run_pipeline(self.sharpen_stages(), show_progress)
+    
+    def run_pipeline(self, stages, show_progress=True):
+        """Запуск конвейера над исходным изображением; стадии не изменяют свой вход"""
+        # Результат полного разрешения не должен перекрыться запоздавшим предпросмотром
+        self.preview_thread.cancel()
+        self.generation += 1
+        self.processing_generation = self.generation
+        job = self.processing_thread.submit(Pipeline(stages, self.stage_cache), self.original_image,
+                                            self.image_key)
+        
+        if show_progress:
+            self.show_progress_dialog(job)
     
     def reset_image(self):
         if self.original_image is not None:
-            self.processed_image = self.original_image.copy()
-            self.display_images()
+            self.processed_image = self.original_image
+            self.display_processed()
+    
+    def closeEvent(self, event):
+        for thread in (self.preview_thread, self.processing_thread):
+            thread.stop()
+            thread.wait()
+        super().closeEvent(event)
 
 
 def main():